@@ -0,0 +1,134 @@
+"""API key authentication as a pure ASGI middleware.
+
+Keys come from API_KEYS, a comma-separated list of `name:key:scope|scope` entries, e.g.
+
+    API_KEYS=frontend:3f9c...:quiz|chat,ops:a71d...:admin
+
+plus the legacy single API_KEY, which is kept working as the key "default" with the quiz and chat scopes;
+admin access needs a key in API_KEYS.
+Scopes by path:
+- admin: /admin/* and /metrics
+- chat:  /quiz/chat and /chat
+- quiz:  every other /quiz/* path
+
+Tokens are checked with hmac.compare_digest against every configured key (no early exit), so response
+time does not reveal which key or how much of it matched. On success the key name is stored in
+scope["api_key_name"] for later middlewares and handlers. With no keys configured, requests pass through
+(development mode; a warning is logged at startup).
+"""
+import hmac
+import logging
+import os
+
+from fastapi.responses import JSONResponse
+
+SCOPES = ("quiz", "chat", "admin")
+
+
+class APIKey:
+    __slots__ = ("name", "secret", "scopes")
+
+    def __init__(self, name, secret, scopes):
+        self.name = name
+        self.secret = secret.encode("utf-8")
+        self.scopes = frozenset(scopes)
+
+
+def parse_api_keys(text):
+    """Parse API_KEYS ('name:key:scope|scope,...'); entries without scopes get every scope."""
+    keys = []
+    for entry in (text or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = entry.split(":")
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            logging.warning("API_KEYS: ignoring malformed entry (expected name:key:scopes)")
+            continue
+        name, secret = parts[0].strip(), parts[1].strip()
+        scopes = [s.strip() for s in ":".join(parts[2:]).split("|") if s.strip()] or list(SCOPES)
+        unknown = set(scopes) - set(SCOPES)
+        if unknown:
+            logging.warning("API_KEYS: key %s has unknown scope(s) %s", name, ", ".join(sorted(unknown)))
+        keys.append(APIKey(name, secret, scopes))
+    return keys
+
+
+def load_keys():
+    keys = parse_api_keys(os.getenv("API_KEYS"))
+    legacy = os.getenv("API_KEY")
+    if legacy:
+        keys.append(APIKey("default", legacy, ("quiz", "chat")))
+    return KeyRing(keys)
+
+
+class KeyRing:
+    def __init__(self, keys):
+        self.keys = list(keys)
+
+    def __bool__(self):
+        return bool(self.keys)
+
+    def match(self, token):
+        """The APIKey whose secret equals `token`, or None; always compares against every key."""
+        if isinstance(token, str):
+            token = token.encode("utf-8")
+        found = None
+        for key in self.keys:
+            if hmac.compare_digest(token, key.secret):
+                found = key
+        return found
+
+    def allows(self, token, scope_name):
+        key = self.match(token)
+        return key is not None and scope_name in key.scopes
+
+
+def required_scope(path):
+    """Scope needed for `path`, or None for public paths (health checks, docs)."""
+    if path == "/metrics" or path.startswith("/admin"):
+        return "admin"
+    if path.startswith("/quiz/chat") or path.startswith("/chat"):
+        return "chat"
+    if path.startswith("/quiz"):
+        return "quiz"
+    return None
+
+
+def _bearer_token(scope):
+    for name, value in scope.get("headers") or []:
+        if name == b"authorization":
+            if value[:7].lower() == b"bearer ":
+                return value[7:].strip()
+            return None
+    return None
+
+
+class APIKeyMiddleware:
+    """Pure ASGI middleware enforcing the scope of the path (see module docstring)."""
+
+    def __init__(self, app, keys):
+        self.app = app
+        self.keys = keys
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.keys or scope.get("method") == "OPTIONS":
+            return await self.app(scope, receive, send)
+        needed = required_scope(scope.get("path") or "")
+        if needed is None:
+            return await self.app(scope, receive, send)
+
+        token = _bearer_token(scope)
+        if not token:
+            return await self._reject(scope, receive, send, 401, "Missing or invalid Authorization header")
+        key = self.keys.match(token)
+        if key is None:
+            return await self._reject(scope, receive, send, 401, "Unauthorized")
+        if needed not in key.scopes:
+            return await self._reject(scope, receive, send, 403, f"API key lacks the '{needed}' scope")
+        scope["api_key_name"] = key.name
+        await self.app(scope, receive, send)
+
+    async def _reject(self, scope, receive, send, status, detail):
+        headers = {"WWW-Authenticate": "Bearer"} if status == 401 else None
+        await JSONResponse(status_code=status, content={"detail": detail}, headers=headers)(scope, receive, send)
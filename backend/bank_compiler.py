@@ -0,0 +1,365 @@
+"""Compile soal/*.json into one binary file that workers mmap read-only, and read it back.
+
+    python bank_compiler.py                 # soal/*.json -> soal/bank.qmb
+    python bank_compiler.py --check         # print what an existing bank.qmb contains
+    python bank_compiler.py --duplicates    # list near-duplicate questions in soal/*.json for editors
+
+Run it after editing the banks (the deploy does it before starting uvicorn). Every worker maps the same file,
+so N workers share one copy in the page cache, nothing is parsed at startup and question text is sliced
+straight out of the mapping. A level whose JSON file changed after compiling (different mtime or size) is
+ignored and served from the JSON file instead, so a forgotten rebuild never serves stale questions.
+
+Near-duplicate questions (same canonical text, or MinHash similarity >= BANK_DUPLICATE_SIMILARITY) are
+clustered once here / at load time; the sampler never puts two questions of one cluster in the same set.
+
+Layout (little-endian, all offsets absolute, sections 4-byte aligned):
+
+    header      magic "QMB1", version, level count, string count, offsets of the sections below
+    strings     per string: (json_off, json_len, raw_off, raw_len); json = the JSON literal, raw = UTF-8 text
+    levels      per level: name, source mtime_ns and size, question count, records offset,
+                offset/length of the four answer buckets
+    records     per question, fixed 24 bytes: text string id, choice count, answer index (-1 = unknown),
+                near-duplicate cluster id (per level), four choice string ids
+    buckets     per level and answer index, u32 question indexes (original answer 0..3; unknown -> 0)
+    blobs       the JSON literals, then the raw UTF-8 strings
+"""
+import argparse
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+
+from fast_json import encode_str
+from text_similarity import cluster_near_duplicates
+
+MAGIC = b"QMB1"
+FORMAT_VERSION = 2
+MAX_CHOICES = 4
+LEVELS = ("mudah", "sedang", "sulit")
+SOAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "soal")
+COMPILED_PATH = os.getenv("BANK_COMPILED_PATH") or os.path.join(SOAL_DIR, "bank.qmb")
+BANK_DUPLICATE_SIMILARITY = float(os.getenv("BANK_DUPLICATE_SIMILARITY", "0.8"))
+
+_HEADER = struct.Struct("<4sHHIIIIII")  # magic, version, nlevels, nstrings, strings, levels, records, json blob, raw blob
+_STRING = struct.Struct("<IIII")
+_LEVEL = struct.Struct("<8sqqII4I4I")
+_RECORD = struct.Struct("<IBbH4I")
+_CLUSTER = struct.Struct("<H")  # the record's cluster id, at offset 6
+
+
+def question_id(text, choices=None, answer=None):
+    """Stable id of a question, the same in every worker and deploy.
+
+    Bank questions hash their text, choices (file order) and answer index: the banks hold questions with the
+    same text but different choices or answers (e.g. two "BPUPKI dibentuk..." items keyed 1944 and 1945),
+    and each needs its own statistics and grading. Without choices only the stripped text is hashed, for
+    questions that don't come from the bank.
+    """
+    parts = [text.strip()]
+    if choices is not None:
+        parts += [str(c) for c in choices] + ["" if answer is None else str(answer)]
+    return hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def normalize_questions(items):
+    """(text, choices, answer) for each usable bank item; answer is None when the index is out of range.
+
+    Mirrors how the sampler has always read the files: a missing or non-numeric answer counts as 0.
+    """
+    out = []
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        choices = [str(c) for c in item.get("choices") or []]
+        raw = item.get("answer", 0)
+        try:
+            answer = int(raw) if isinstance(raw, int) or str(raw).isdigit() else 0
+        except Exception:
+            answer = 0
+        out.append((str(item.get("question", "")), choices, answer if 0 <= answer < len(choices) else None))
+    return out
+
+
+def cluster_ids(questions, threshold=BANK_DUPLICATE_SIMILARITY):
+    """Near-duplicate cluster id of each normalized question (text, choices, answer) of one level."""
+    return cluster_near_duplicates([text for text, _, _ in questions], threshold)
+
+
+def validate_questions(items):
+    """Problems that make a level file unusable as a whole (empty list when it is fine)."""
+    if not isinstance(items, list) or not items:
+        return ["no non-empty 'questions' list"]
+    problems = []
+    for n, item in enumerate(items):
+        if not isinstance(item, dict):
+            problems.append(f"#{n}: not an object")
+            continue
+        text, choices, answer = item.get("question"), item.get("choices"), item.get("answer", 0)
+        if not isinstance(text, str) or not text.strip():
+            problems.append(f"#{n}: empty question")
+        if not isinstance(choices, list) or not 2 <= len(choices) <= MAX_CHOICES:
+            problems.append(f"#{n}: needs 2-{MAX_CHOICES} choices")
+        elif not isinstance(answer, int) or isinstance(answer, bool) or not 0 <= answer < len(choices):
+            problems.append(f"#{n}: answer {answer!r} is not a choice index")
+    return problems
+
+
+def load_level_file(path, validate=False):
+    """Parse one soal/<level>.json file into normalized questions (raises on unreadable JSON).
+
+    With validate=True a file with any invalid question raises ValueError instead of being read leniently.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        j = json.load(f)
+    items = j.get("questions") if isinstance(j, dict) else None
+    if validate:
+        problems = validate_questions(items)
+        if problems:
+            more = f" (+{len(problems) - 5} more)" if len(problems) > 5 else ""
+            raise ValueError(f"{os.path.basename(path)}: " + "; ".join(problems[:5]) + more)
+    return normalize_questions(items)
+
+
+def _align(buf):
+    buf.extend(b"\0" * (-len(buf) % 4))
+
+
+def compile_bank(soal_dir=SOAL_DIR, out_path=COMPILED_PATH):
+    """Write the compiled bank; returns {level: question count}.
+
+    Raises ValueError when a level file is invalid, leaving any existing compiled bank in place.
+    """
+    strings = {}
+    order = []
+
+    def sid(text):
+        i = strings.get(text)
+        if i is None:
+            i = strings[text] = len(order)
+            order.append(text)
+        return i
+
+    levels = []
+    for name in LEVELS:
+        path = os.path.join(soal_dir, f"{name}.json")
+        if not os.path.exists(path):
+            continue
+        st = os.stat(path)
+        questions = load_level_file(path, validate=True)
+        records = []
+        for (text, choices, answer), cluster in zip(questions, cluster_ids(questions)):
+            ids = [sid(c) for c in choices] + [0] * (MAX_CHOICES - len(choices))
+            records.append((sid(text), len(choices), -1 if answer is None else answer, cluster, ids))
+        levels.append((name, st.st_mtime_ns, st.st_size, records))
+
+    json_blob = bytearray()
+    raw_blob = bytearray()
+    spans = []
+    for text in order:
+        encoded, raw = encode_str(text), text.encode("utf-8")
+        spans.append((len(json_blob), len(encoded), len(raw_blob), len(raw)))
+        json_blob += encoded
+        raw_blob += raw
+
+    body = bytearray()
+    strings_off = _HEADER.size
+    levels_off = strings_off + _STRING.size * len(order)
+    records_off = levels_off + _LEVEL.size * len(levels)
+    level_entries = []
+    for name, mtime_ns, size, records in levels:
+        start = records_off + len(body)
+        for text_id, nchoices, answer, cluster, ids in records:
+            body += _RECORD.pack(text_id, nchoices, answer, cluster, *ids)
+        bucket_offs, bucket_lens = [], []
+        for idx in range(4):
+            members = [i for i, r in enumerate(records) if (r[2] if r[2] in (0, 1, 2, 3) else 0) == idx]
+            _align(body)
+            bucket_offs.append(records_off + len(body))
+            bucket_lens.append(len(members))
+            body += struct.pack(f"<{len(members)}I", *members)
+        level_entries.append(_LEVEL.pack(name.encode(), mtime_ns, size, len(records), start, *bucket_offs, *bucket_lens))
+    _align(body)
+    json_off = records_off + len(body)
+    raw_off = json_off + len(json_blob)
+
+    out = bytearray(_HEADER.pack(MAGIC, FORMAT_VERSION, len(levels), len(order), strings_off, levels_off,
+                                 records_off, json_off, raw_off))
+    for jo, jl, ro, rl in spans:
+        out += _STRING.pack(json_off + jo, jl, raw_off + ro, rl)
+    for entry in level_entries:
+        out += entry
+    out += body + json_blob + raw_blob
+
+    tmp = f"{out_path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(out)
+    os.replace(tmp, out_path)
+    return {name: len(records) for name, _, _, records in levels}
+
+
+class CompiledQuestion:
+    """One question read from the mapping; same attributes as question_bank.BankQuestion."""
+    __slots__ = ("qid", "text", "choices", "answer", "text_json", "choices_json")
+
+
+class CompiledLevel:
+    def __init__(self, bank, name, mtime_ns, size, count, records_off, bucket_offs, bucket_lens):
+        self.bank = bank
+        self.name = name
+        self.source_mtime_ns = mtime_ns
+        self.source_size = size
+        self.count = count
+        self.records_off = records_off
+        view = memoryview(bank.mm)
+        # u32 question indexes per original answer index, read in place
+        self.buckets = tuple(view[o:o + 4 * n].cast("I") for o, n in zip(bucket_offs, bucket_lens))
+        self._qids = None
+        self._clusters = None
+
+    def __len__(self):
+        return self.count
+
+    def matches_source(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return st.st_mtime_ns == self.source_mtime_ns and st.st_size == self.source_size
+
+    def text(self, i):
+        return self.bank.raw(_RECORD.unpack_from(self.bank.mm, self.records_off + i * _RECORD.size)[0])
+
+    def qid(self, i):
+        if self._qids is None:
+            # hashed once per mapping, on first use
+            self._qids = [self._question_id(n) for n in range(self.count)]
+        return self._qids[i]
+
+    def _question_id(self, i):
+        text_id, nchoices, answer, _, *ids = _RECORD.unpack_from(self.bank.mm, self.records_off + i * _RECORD.size)
+        return question_id(self.bank.raw(text_id), [self.bank.raw(c) for c in ids[:nchoices]],
+                           None if answer < 0 else answer)
+
+    def cluster(self, i):
+        if self._clusters is None:
+            self._clusters = [_CLUSTER.unpack_from(self.bank.mm, self.records_off + n * _RECORD.size + 6)[0]
+                              for n in range(self.count)]
+        return self._clusters[i]
+
+    def question(self, i):
+        text_id, nchoices, answer, _, *ids = _RECORD.unpack_from(self.bank.mm, self.records_off + i * _RECORD.size)
+        ids = ids[:nchoices]
+        q = CompiledQuestion()
+        q.qid = self.qid(i)
+        q.text = self.bank.raw(text_id)
+        q.choices = [self.bank.raw(c) for c in ids]
+        q.answer = None if answer < 0 else answer
+        q.text_json = self.bank.json(text_id)
+        q.choices_json = [self.bank.json(c) for c in ids]
+        return q
+
+
+class CompiledBank:
+    """Read-only view of a compiled bank file."""
+
+    def __init__(self, path=COMPILED_PATH):
+        if sys.byteorder != "little":
+            raise ValueError("compiled banks are little-endian; use the JSON files on this platform")
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, nlevels, nstrings, strings_off, levels_off, _, _, _ = _HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.mm.close()
+            raise ValueError(f"{path}: not a compiled bank (version {FORMAT_VERSION})")
+        self._view = memoryview(self.mm)
+        self.nstrings = nstrings
+        self._strings_off = strings_off
+        self.levels = {}
+        for i in range(nlevels):
+            name, mtime_ns, size, count, records_off, *rest = _LEVEL.unpack_from(self.mm, levels_off + i * _LEVEL.size)
+            name = name.rstrip(b"\0").decode()
+            self.levels[name] = CompiledLevel(self, name, mtime_ns, size, count, records_off, rest[:4], rest[4:])
+
+    def json(self, string_id):
+        """The string's JSON literal as a zero-copy slice of the mapping."""
+        jo, jl, _, _ = _STRING.unpack_from(self.mm, self._strings_off + string_id * _STRING.size)
+        return self._view[jo:jo + jl]
+
+    def raw(self, string_id):
+        _, _, ro, rl = _STRING.unpack_from(self.mm, self._strings_off + string_id * _STRING.size)
+        return str(self._view[ro:ro + rl], "utf-8")
+
+
+def duplicate_report(soal_dir=SOAL_DIR, threshold=BANK_DUPLICATE_SIMILARITY):
+    """Near-duplicate clusters for editors: {level: [[(index, text, correct choice), ...], ...]}.
+
+    Only clusters with more than one question are listed; "*" collects clusters that span several levels.
+    """
+    report = {}
+    everything = []
+    for name in LEVELS:
+        path = os.path.join(soal_dir, f"{name}.json")
+        if not os.path.exists(path):
+            continue
+        questions = load_level_file(path)
+        entries = [(n, text, None if answer is None else choices[answer])
+                   for n, (text, choices, answer) in enumerate(questions)]
+        report[name] = _multi_clusters(entries, cluster_ids(questions, threshold))
+        everything.extend((f"{name}#{n}", text, correct) for n, text, correct in entries)
+    spanning = _multi_clusters(everything, cluster_near_duplicates([e[1] for e in everything], threshold))
+    report["*"] = [c for c in spanning if len({e[0].split("#")[0] for e in c}) > 1]
+    return report
+
+
+def _multi_clusters(entries, clusters):
+    groups = {}
+    for entry, cluster in zip(entries, clusters):
+        groups.setdefault(cluster, []).append(entry)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _print_duplicates(report):
+    for name, clusters in report.items():
+        title = "across levels" if name == "*" else name
+        print(f"{title}: {len(clusters)} clusters, {sum(len(c) for c in clusters)} questions")
+        for members in clusters:
+            conflict = len({correct for _, _, correct in members}) > 1
+            print(f"  - {len(members)} questions{'  CONFLICTING ANSWERS' if conflict else ''}")
+            for where, text, correct in members:
+                print(f"      #{where}: {text}  [{correct}]")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile soal/*.json into a memory-mappable bank.")
+    parser.add_argument("--soal-dir", default=SOAL_DIR)
+    parser.add_argument("--out", default=COMPILED_PATH)
+    parser.add_argument("--check", action="store_true", help="describe an existing compiled bank instead")
+    parser.add_argument("--duplicates", action="store_true", help="list near-duplicate questions instead")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    if args.duplicates:
+        _print_duplicates(duplicate_report(args.soal_dir))
+        return
+    if args.check:
+        bank = CompiledBank(args.out)
+        print(f"{args.out}: {bank.nstrings} strings, {os.path.getsize(args.out)} bytes")
+        for name, level in bank.levels.items():
+            fresh = level.matches_source(os.path.join(args.soal_dir, f"{name}.json"))
+            clusters = len({level.cluster(i) for i in range(len(level))})
+            print(f"  {name}: {len(level)} questions ({clusters} distinct), buckets {[len(b) for b in level.buckets]}, "
+                  f"{'up to date' if fresh else 'STALE (JSON changed since compiling)'}")
+        return
+    try:
+        counts = compile_bank(args.soal_dir, args.out)
+    except ValueError as e:
+        sys.exit(f"not compiled: {e}")
+    print(f"wrote {args.out} ({os.path.getsize(args.out)} bytes): " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Start the FastAPI app for benchmarks, optionally against an in-memory MongoDB.
+
+    python -m bench.app_server --port 8101 --mongo memory
+
+`--mongo memory` needs the optional `mongomock` package (pip install mongomock). Any other value is used as
+MONGODB_URI; omit it to run without persistence. Provider URLs and keys come from the environment
+(`bench.run` sets them to point at `bench.stubs`).
+"""
+import argparse
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the quiz backend for benchmarking.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--mongo", default=None, help="'memory' (mongomock) or a MongoDB URI")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if args.mongo and args.mongo != "memory":
+        os.environ["MONGODB_URI"] = args.mongo
+    elif args.mongo == "memory":
+        try:
+            import mongomock
+        except ImportError:
+            parser.error("--mongo memory needs the optional 'mongomock' package")
+        # explain() is not implemented by mongomock
+        os.environ.setdefault("MONGO_INDEX_SELF_CHECK", "0")
+        os.environ["MONGODB_URI"] = "mongodb://in-memory"
+        if args.workers != 1:
+            parser.error("--mongo memory keeps data per process; use --workers 1")
+
+    import uvicorn
+
+    if args.workers > 1:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+        return
+
+    import main as app_module
+    if args.mongo == "memory":
+        shared = mongomock.MongoClient()
+        app_module._mongo_open = lambda: shared
+    uvicorn.run(app_module.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
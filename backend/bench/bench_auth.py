@@ -0,0 +1,142 @@
+"""Throughput of the API key check: the old @app.middleware("http") version vs auth.APIKeyMiddleware.
+
+From the backend folder:
+
+    python -m bench.bench_auth
+    python -m bench.bench_auth --requests 20000 --concurrency 64
+
+Each variant wraps the same trivial app (one JSON route and one streamed route). Requests are driven
+in-process straight through the ASGI interface, so the numbers show middleware overhead without network
+or server noise. Variants: no auth, the previous BaseHTTPMiddleware check against one key, and the
+pure ASGI middleware with several scoped keys.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import JSONResponse, StreamingResponse  # noqa: E402
+
+import auth  # noqa: E402
+
+TOKEN = "bench-key-0000000000000000"
+
+
+def _base_app():
+    app = FastAPI()
+
+    @app.get("/quiz/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/quiz/stream")
+    async def stream():
+        async def _chunks():
+            for i in range(10):
+                yield b'{"n":%d}\n' % i
+        return StreamingResponse(_chunks(), media_type="application/x-ndjson")
+
+    return app
+
+
+def app_without_auth():
+    return _base_app()
+
+
+def app_with_http_middleware():
+    """The check as it was in main.py before moving to auth.py."""
+    app = _base_app()
+
+    @app.middleware("http")
+    async def require_api_key(request, call_next):
+        path = request.url.path or ""
+        if path.startswith("/quiz") or path.startswith("/chat"):
+            auth_header = request.headers.get('authorization') or request.headers.get('Authorization')
+            if not auth_header or not auth_header.lower().startswith('bearer '):
+                return JSONResponse(status_code=401, content={"detail": "Missing or invalid Authorization header"})
+            token = auth_header.split(None, 1)[1].strip()
+            if token != TOKEN:
+                return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
+        return await call_next(request)
+
+    return app
+
+
+def app_with_asgi_middleware():
+    app = _base_app()
+    keys = auth.KeyRing([
+        auth.APIKey("frontend", TOKEN, ("quiz", "chat")),
+        auth.APIKey("ops", "ops-key-1111111111111111", ("admin",)),
+        auth.APIKey("partner", "partner-key-22222222222", ("quiz",)),
+    ])
+    app.add_middleware(auth.APIKeyMiddleware, keys=keys)
+    return app
+
+
+async def _call(app, path):
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"authorization", b"Bearer " + TOKEN.encode())],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)  # no disconnect while the response is produced
+        sent = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    status = [0]
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status[0] = message["status"]
+
+    await app(scope, receive, send)
+    return status[0]
+
+
+async def _drive(app, path, total, concurrency):
+    remaining = [total]
+
+    async def _worker():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            status = await _call(app, path)
+            if status != 200:
+                raise RuntimeError(f"{path} returned {status}")
+
+    await _call(app, path)  # build the middleware stack outside the timing
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - t0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare auth middleware overhead.")
+    parser.add_argument("--requests", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    variants = (("no auth", app_without_auth), ("http middleware (before)", app_with_http_middleware),
+                ("ASGI middleware (after)", app_with_asgi_middleware))
+    print(f"requests/s over {args.requests} in-process requests, concurrency {args.concurrency}")
+    # warm up imports and code paths so the first variant is not penalised
+    asyncio.run(_drive(app_without_auth(), "/quiz/ping", min(args.requests, 2000), args.concurrency))
+    print(f"{'variant':<28}{'/quiz/ping':>14}{'/quiz/stream':>14}")
+    for name, factory in variants:
+        app = factory()
+        ping = asyncio.run(_drive(app, "/quiz/ping", args.requests, args.concurrency))
+        stream = asyncio.run(_drive(app, "/quiz/stream", args.requests, args.concurrency))
+        print(f"{name:<28}{ping:>14.0f}{stream:>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Microbenchmark of response serialization per endpoint: FastAPI's default path vs the fast path.
+
+From the backend folder:
+
+    python -m bench.bench_serialization
+    python -m bench.bench_serialization --leaderboard-size 2000 --number 2000
+
+For each payload it times, per response:
+- default:  jsonable_encoder + starlette JSONResponse (stdlib json), what FastAPI does for a returned dict
+- fast:     FastJSONResponse returned directly (orjson when installed, no jsonable_encoder pass)
+- spliced:  bank question sets rendered from pre-encoded fragments (question_bank.render_set)
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+import fast_json  # noqa: E402
+import question_bank  # noqa: E402
+
+
+def _leaderboard(n):
+    return [{
+        "rank": i + 1,
+        "name": f"Peserta {i}",
+        "email": f"peserta{i}@example.com",
+        "score": random.randint(0, 20),
+        "percentage": random.randint(0, 100),
+        "totalQuestions": 20,
+        "difficulty": random.choice(("Mudah", "Sedang", "Sulit")),
+        "timeSpent": random.randint(30, 900),
+        "date": "17/08/2025 10:00:00",
+    } for i in range(n)]
+
+
+def _time(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e6
+
+
+def run(leaderboard_size=500, number=1000):
+    bank = question_bank.QuestionBank()
+    rows = []
+
+    board = _leaderboard(leaderboard_size)
+    rows.append((f"GET /quiz/leaderboard ({leaderboard_size})",
+                 _time(lambda: JSONResponse(jsonable_encoder(board)).body, number),
+                 _time(lambda: fast_json.FastJSONResponse(board).body, number),
+                 None))
+
+    for diff, count, minutes in (("mudah", 10, 5), ("sedang", 15, 8), ("sulit", 20, 12)):
+        def _dicts():
+            return {"total_questions": count, "time_minutes": minutes,
+                    "questions": [p.as_dict() for p in bank.sample(diff, count)]}
+
+        def _spliced():
+            return fast_json.RawJSONResponse(question_bank.render_set(bank.sample(diff, count), count, minutes)).body
+
+        rows.append((f"POST /quiz/questions ({diff}, {count})",
+                     _time(lambda: JSONResponse(jsonable_encoder(_dicts())).body, number),
+                     _time(lambda: fast_json.FastJSONResponse(_dicts()).body, number),
+                     _time(_spliced, number)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare response serialization paths.")
+    parser.add_argument("--leaderboard-size", type=int, default=500)
+    parser.add_argument("--number", type=int, default=1000, help="responses per timing run")
+    args = parser.parse_args(argv)
+
+    print(f"encoder: {'orjson' if fast_json.orjson is not None else 'stdlib json (pip install orjson)'}; microseconds per response")
+    print(f"{'endpoint':<36}{'default':>10}{'fast':>10}{'spliced':>10}{'speedup':>10}")
+    for name, default, fast, spliced in run(args.leaderboard_size, args.number):
+        best = min(v for v in (fast, spliced) if v is not None)
+        spliced_text = f"{spliced:.1f}" if spliced is not None else "-"
+        print(f"{name:<36}{default:>10.1f}{fast:>10.1f}{spliced_text:>10}{default / best:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Replay traffic captured by traffic_capture.py against a target instance and compare latencies and shapes.
+
+From the backend folder:
+
+    python -m bench.replay capture.ndjson --target http://127.0.0.1:8001 --api-key $API_KEY            # 1x
+    python -m bench.replay capture.ndjson --target http://staging:8001 --speed 5 --json replay-5x.json    # 5x
+    python -m bench.replay capture.ndjson --target http://staging:8001 --speed max --concurrency 128
+
+Requests are sent at their original offsets divided by --speed (or as fast as --concurrency allows with
+`max`). The report compares captured server-side durations with replayed client-side latencies per route and
+counts responses whose status or JSON shape differs from the capture.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.run import print_report, summarize  # noqa: E402
+from traffic_capture import response_shape  # noqa: E402
+
+_OBJECT_ID = re.compile(r"/[0-9a-fA-F]{24}(?=/|$)")
+
+
+def route_key(method, path):
+    """Group paths by route so /quiz/submission/<id> lines up across requests."""
+    return f"{method} {_OBJECT_ID.sub('/{id}', path)}"
+
+
+def load_capture(path):
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except Exception:
+                continue
+    records.sort(key=lambda r: r.get("t", 0))
+    return records
+
+
+def replay(records, target, speed, concurrency, api_key=None, timeout=60):
+    """Send every record; returns list of (record, latency_seconds, status, shape_or_None, error)."""
+    local = threading.local()
+    results = []
+    lock = threading.Lock()
+
+    def _session():
+        s = getattr(local, "session", None)
+        if s is None:
+            s = local.session = requests.Session()
+            if api_key:
+                s.headers["Authorization"] = f"Bearer {api_key}"
+        return s
+
+    def _send(rec):
+        url = f"{target}{rec['p']}" + (f"?{rec['q']}" if rec.get("q") else "")
+        t0 = time.perf_counter()
+        status, shape, error = None, None, None
+        try:
+            resp = _session().request(rec["m"], url, json=rec.get("b"), timeout=timeout)
+            body = resp.content
+            status = resp.status_code
+            if resp.headers.get("content-type", "").startswith("application/json"):
+                shape = response_shape(json.loads(body))
+            elif resp.headers.get("content-type", "").startswith("application/x-ndjson"):
+                shape = "ndjson"
+        except Exception as e:
+            error = str(e)
+        latency = time.perf_counter() - t0
+        with lock:
+            results.append((rec, latency, status, shape, error))
+
+    if not records:
+        return results
+    t_first = records[0].get("t", 0)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.monotonic()
+        for rec in records:
+            if speed is not None:
+                due = start + (rec.get("t", t_first) - t_first) / speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(_send, rec)
+    return results
+
+
+def compare(results, elapsed):
+    by_route = {}
+    for rec, latency, status, shape, error in results:
+        entry = by_route.setdefault(route_key(rec["m"], rec["p"]), {
+            "captured": [], "replayed": [], "errors": 0, "status_mismatch": 0, "shape_mismatch": 0})
+        entry["captured"].append((rec.get("d") or 0) / 1000.0)
+        entry["replayed"].append(latency)
+        if error is not None or (status is not None and status >= 500):
+            entry["errors"] += 1
+        if status is not None and rec.get("s") is not None and status != rec["s"]:
+            entry["status_mismatch"] += 1
+        if rec.get("shape") is not None and shape is not None and shape != rec["shape"]:
+            entry["shape_mismatch"] += 1
+    report = {}
+    for key, e in sorted(by_route.items()):
+        report[key] = {
+            "captured": summarize(e["captured"], 0, elapsed),
+            "replayed": summarize(e["replayed"], e["errors"], elapsed),
+            "status_mismatch": e["status_mismatch"],
+            "shape_mismatch": e["shape_mismatch"],
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay captured traffic against a target instance.")
+    parser.add_argument("capture", help="NDJSON file written with CAPTURE_FILE")
+    parser.add_argument("--target", required=True, help="base URL, e.g. http://127.0.0.1:8001")
+    parser.add_argument("--api-key", default=None)
+    parser.add_argument("--speed", default="1", help="time compression factor (1, 5, ...) or 'max'")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--limit", type=int, default=None, help="replay only the first N records")
+    parser.add_argument("--json", default=None, help="write the comparison to this file")
+    args = parser.parse_args(argv)
+
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        parser.error("--speed must be > 0 or 'max'")
+    records = load_capture(args.capture)
+    if args.limit:
+        records = records[:args.limit]
+    span = (records[-1]["t"] - records[0]["t"]) if len(records) > 1 else 0.0
+    print(f"replaying {len(records)} requests spanning {span:.1f}s at speed={args.speed} against {args.target}")
+
+    t0 = time.monotonic()
+    results = replay(records, args.target.rstrip("/"), speed, args.concurrency, api_key=args.api_key)
+    elapsed = time.monotonic() - t0
+    report = compare(results, elapsed)
+
+    print_report({k: v["captured"] for k, v in report.items()}, title="captured (server-side duration)")
+    print_report({k: v["replayed"] for k, v in report.items()}, title=f"replayed ({elapsed:.1f}s wall)")
+    print("\nmismatches (status / shape)")
+    for key, v in report.items():
+        print(f"{key:<40}{v['status_mismatch']:>8}{v['shape_mismatch']:>8}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "elapsed": elapsed, "routes": report}, f, indent=1)
+    return report
+
+
+if __name__ == "__main__":
+    main()
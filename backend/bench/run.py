@@ -0,0 +1,281 @@
+"""Load-test the quiz backend against local stand-ins for its upstreams and report latency percentiles.
+
+From the backend folder:
+
+    python -m bench.run --duration 30 --concurrency 32
+    python -m bench.run --mix questions=5,submit=2,explain=2,leaderboard=1 --stub-latency-ms 400 --stub-error-rate 0.05
+    python -m bench.run --mongo memory --json results/before.json
+    python -m bench.run --target http://127.0.0.1:8001 --api-key $API_KEY   # drive an already running instance
+
+Unless --target is given this starts `bench.stubs` (fake unli.dev / lunos.tech / Mailry) and `bench.app_server`
+(the real app, wired to the stubs) as subprocesses, drives a weighted mix of requests from a thread pool,
+and prints throughput plus p50/p95/p99 per endpoint. Use --json to keep results for before/after comparisons.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MIX = "questions=4,submit=2,explain=3,leaderboard=1"
+DIFFICULTIES = ("Mudah", "Sedang", "Sulit")
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list (0 for an empty list)."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies, errors, elapsed):
+    """Summary dict for one endpoint: latencies in seconds, errors = count of non-2xx/failed requests."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(values[-1] * 1000, 2) if values else 0.0,
+    }
+
+
+def print_report(results, title="results"):
+    width = max([16] + [len(n) + 2 for n in results])
+    print(f"\n{title}")
+    print(f"{'endpoint':<{width}}{'requests':>10}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<{width}}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip():
+            mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(SCENARIOS)
+    if unknown:
+        raise ValueError(f"unknown scenario(s): {', '.join(sorted(unknown))}; known: {', '.join(SCENARIOS)}")
+    return mix
+
+
+def _load_bank_sample():
+    out = []
+    for name in ("mudah", "sedang", "sulit"):
+        try:
+            with open(os.path.join(BACKEND_DIR, "soal", f"{name}.json"), "r", encoding="utf-8") as f:
+                out.extend(json.load(f).get("questions") or [])
+        except Exception:
+            pass
+    return out or [{"question": "Siapa proklamator kemerdekaan Indonesia?", "choices": ["Sukarno & Hatta", "Sutan Sjahrir", "Tan Malaka", "Sudirman"], "answer": 0}]
+
+
+_BANK = _load_bank_sample()
+
+
+def _questions(session, base):
+    return session.post(f"{base}/quiz/questions", json={"name": "Bench", "difficulty": random.choice(DIFFICULTIES)}, timeout=60)
+
+
+def _submit(session, base):
+    total = random.choice((10, 15, 20))
+    payload = {
+        "name": "Bench User",
+        "email": f"bench-{uuid.uuid4().hex[:10]}@example.invalid",
+        "question": "Quiz Kemerdekaan Indonesia",
+        "answer": 0,
+        "age_group": "remaja",
+        "totalQuestions": total,
+        "percentage": random.randint(0, 100),
+        "timeSpent": random.randint(30, 600),
+        "difficulty": random.choice(DIFFICULTIES),
+    }
+    return session.post(f"{base}/quiz/submit", json=payload, timeout=60)
+
+
+def _explain(session, base):
+    q = random.choice(_BANK)
+    return session.post(f"{base}/quiz/explain", json={"question": q["question"], "choices": q["choices"], "correct_index": q.get("answer", 0)}, timeout=60)
+
+
+def _leaderboard(session, base):
+    return session.get(f"{base}/quiz/leaderboard", timeout=60)
+
+
+def _chat(session, base):
+    q = random.choice(("Siapa proklamator Indonesia?", "Kapan Sumpah Pemuda?", "Siapa Cut Nyak Dien?", "Apa itu KMB?"))
+    return session.post(f"{base}/quiz/chat", json={"question": q}, timeout=60)
+
+
+def _fakta(session, base):
+    return session.get(f"{base}/quiz/fakta", timeout=60)
+
+
+SCENARIOS = {
+    "questions": _questions,
+    "submit": _submit,
+    "explain": _explain,
+    "leaderboard": _leaderboard,
+    "chat": _chat,
+    "fakta": _fakta,
+}
+
+
+def drive(base, mix, duration, concurrency, api_key=None, warmup=2.0):
+    """Run the weighted mix for `duration` seconds from `concurrency` threads; returns {scenario: summary}."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    lock = threading.Lock()
+    samples = {n: [] for n in names}
+    errors = {n: 0 for n in names}
+    start_at = time.monotonic() + warmup
+    stop_at = start_at + duration
+
+    def _worker():
+        session = requests.Session()
+        if api_key:
+            session.headers["Authorization"] = f"Bearer {api_key}"
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                return
+            name = random.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            ok = False
+            try:
+                resp = SCENARIOS[name](session, base)
+                resp.content  # read the full body, including streamed responses
+                ok = resp.ok
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - t0
+            if now < start_at:
+                continue  # warm-up request, not recorded
+            with lock:
+                samples[name].append(elapsed)
+                if not ok:
+                    errors[name] += 1
+
+    threads = [threading.Thread(target=_worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    results = {n: summarize(samples[n], errors[n], duration) for n in names}
+    all_lat = [v for n in names for v in samples[n]]
+    results["total"] = summarize(all_lat, sum(errors.values()), duration)
+    return results
+
+
+def wait_until_up(url, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def start_local_stack(args):
+    """Start stubs and app subprocesses; returns (base_url, api_key, [processes])."""
+    procs = []
+    stub_base = f"http://127.0.0.1:{args.stub_port}"
+    stub_cmd = [sys.executable, "-m", "bench.stubs", "--port", str(args.stub_port),
+                "--latency-ms", str(args.stub_latency_ms), "--jitter-ms", str(args.stub_jitter_ms),
+                "--error-rate", str(args.stub_error_rate)]
+    if args.llm_latency_ms is not None:
+        stub_cmd += ["--llm-latency-ms", str(args.llm_latency_ms)]
+    procs.append(subprocess.Popen(stub_cmd, cwd=BACKEND_DIR))
+    if not wait_until_up(f"{stub_base}/_stats"):
+        raise RuntimeError("stub server did not start")
+
+    api_key = "bench-api-key"
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "bench-unli-key",
+        "LUNOS_API_KEY": "bench-lunos-key",
+        "UNLI_API_BASE": stub_base,
+        "LUNOS_API_BASE": stub_base,
+        "MAILRY_API_URL": f"{stub_base}/ext/inbox/send",
+        "MAILRY_API_KEY": "bench-mailry-key",
+        "MAILRY_EMAIL_ID": "00000000-0000-4000-8000-000000000000",
+        "API_KEY": api_key,
+        # every questions request should reach the (stub) completion, not a reused set
+        "AI_SET_CACHE_SECONDS": "0",
+    })
+    if not args.rate_limits:
+        # every simulated user comes from 127.0.0.1, i.e. one rate-limit client: lift the per-client limits
+        env.update({"RATE_LIMIT_PER_MINUTE": "1000000000", "RATE_LIMIT_BURST": "1000000000"})
+    if not args.mongo:
+        env.pop("MONGODB_URI", None)
+    app_cmd = [sys.executable, "-m", "bench.app_server", "--port", str(args.app_port), "--workers", str(args.workers)]
+    if args.mongo:
+        app_cmd += ["--mongo", args.mongo]
+    procs.append(subprocess.Popen(app_cmd, cwd=BACKEND_DIR, env=env))
+    base = f"http://127.0.0.1:{args.app_port}"
+    if not wait_until_up(f"{base}/health/ready"):
+        raise RuntimeError("app server did not start")
+    return base, api_key, procs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the quiz backend.")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds (after warm-up)")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weighted scenarios (default {DEFAULT_MIX}); also: chat, fakta")
+    parser.add_argument("--target", default=None, help="benchmark an existing instance instead of starting one")
+    parser.add_argument("--api-key", default=None, help="bearer token for --target")
+    parser.add_argument("--app-port", type=int, default=8101)
+    parser.add_argument("--stub-port", type=int, default=8199)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--mongo", default=None, help="'memory' (needs mongomock) or a MongoDB URI; default: none")
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0)
+    parser.add_argument("--stub-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=None, help="latency of question-set completions")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="keep the RATE_LIMIT_* settings from the environment (default: lifted, all load is one client)")
+    parser.add_argument("--json", default=None, help="write results to this file")
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    procs = []
+    try:
+        if args.target:
+            base, api_key = args.target.rstrip("/"), args.api_key
+        else:
+            base, api_key, procs = start_local_stack(args)
+        results = drive(base, mix, args.duration, args.concurrency, api_key=api_key, warmup=args.warmup)
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            try:
+                p.wait(timeout=5)
+            except Exception:
+                p.kill()
+
+    print_report(results, title=f"{base}  concurrency={args.concurrency}  duration={args.duration}s  mix={args.mix}")
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": results}, f, indent=1)
+    return results
+
+
+if __name__ == "__main__":
+    main()
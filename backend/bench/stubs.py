@@ -0,0 +1,139 @@
+"""Local stand-ins for unli.dev, lunos.tech and Mailry with configurable latency and error injection.
+
+Run standalone (from the backend folder):
+
+    python -m bench.stubs --port 8199 --latency-ms 300 --jitter-ms 100 --error-rate 0.02
+
+or let `bench.run` start it. Point the app at it with UNLI_API_BASE / LUNOS_API_BASE / MAILRY_API_URL.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+_COUNT = re.compile(r"Buatkan (\d+) soal")
+
+
+class StubConfig:
+    def __init__(self, latency_ms=200.0, jitter_ms=50.0, error_rate=0.0, llm_latency_ms=None, stream_chunk_ms=20.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        # question-set completions are much slower than short answers in production
+        self.llm_latency_ms = llm_latency_ms if llm_latency_ms is not None else latency_ms * 5
+        self.stream_chunk_ms = stream_chunk_ms
+
+
+def _fake_questions(n):
+    return {
+        "total_questions": n,
+        "time_minutes": 5,
+        "questions": [
+            {
+                "question": f"Soal uji nomor {i + 1} tentang sejarah Indonesia?",
+                "choices": [f"Pilihan A{i}", f"Pilihan B{i}", f"Pilihan C{i}", f"Pilihan D{i}"],
+                "answer": i % 4,
+            }
+            for i in range(n)
+        ],
+    }
+
+
+def create_app(config=None):
+    config = config or StubConfig()
+    app = FastAPI()
+    app.state.config = config
+    app.state.calls = {}
+
+    async def _delay(base_ms):
+        jitter = random.uniform(-config.jitter_ms, config.jitter_ms) if config.jitter_ms else 0.0
+        await asyncio.sleep(max(0.0, base_ms + jitter) / 1000.0)
+
+    def _failed(name):
+        app.state.calls[name] = app.state.calls.get(name, 0) + 1
+        return config.error_rate > 0 and random.random() < config.error_rate
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = ((body.get("messages") or [{}])[-1]).get("content") or ""
+        m = _COUNT.search(prompt)
+        if _failed("chat_completions"):
+            await _delay(config.latency_ms)
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+        content = json.dumps(_fake_questions(int(m.group(1)))) if m else "Jawaban uji dari stub LLM tentang sejarah Indonesia."
+        if body.get("stream"):
+            async def _events():
+                await _delay(config.latency_ms)
+                for i in range(0, len(content), 40):
+                    chunk = {"choices": [{"delta": {"content": content[i:i + 40]}}]}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(config.stream_chunk_ms / 1000.0)
+                yield "data: [DONE]\n\n"
+            return StreamingResponse(_events(), media_type="text/event-stream")
+        await _delay(config.llm_latency_ms if m else config.latency_ms)
+        return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+    @app.post("/evaluate")
+    async def evaluate():
+        await _delay(config.latency_ms)
+        if _failed("evaluate"):
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+        return {"score": random.randint(0, 10), "feedback": "Jawaban uji dinilai oleh stub."}
+
+    @app.get("/fakta")
+    async def fakta():
+        await _delay(config.latency_ms)
+        if _failed("fakta"):
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+        return {"fakta": "Fakta uji: proklamasi dibacakan pada 17 Agustus 1945."}
+
+    @app.post("/explain")
+    async def explain():
+        await _delay(config.latency_ms)
+        if _failed("explain"):
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+        return {"explanation": "Penjelasan uji dari stub lunos."}
+
+    @app.post("/chat")
+    async def chat():
+        await _delay(config.latency_ms)
+        if _failed("chat"):
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+        return {"answer": "Jawaban uji dari stub lunos."}
+
+    @app.post("/ext/inbox/send")
+    async def mailry_send():
+        await _delay(config.latency_ms)
+        if _failed("mailry"):
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+        return {"ok": True, "id": "stub-message"}
+
+    @app.get("/_stats")
+    async def stats():
+        return app.state.calls
+
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run stub upstream servers for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8199)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+    config = StubConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.llm_latency_ms)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Answer cache for /quiz/chat keyed on normalized question text, with a MinHash/LSH near-duplicate layer."""
+import threading
+import time
+
+from text_similarity import LSHIndex, markers, minhash_signature, normalize_text
+from ttl_cache import TTLCache
+
+
+class ChatAnswerCache:
+    """Bounded LRU+TTL cache of chat answers.
+
+    Lookup order:
+    1. exact match on the normalized question (case, punctuation and stopwords removed)
+    2. near-duplicate match through LSH candidates whose estimated Jaccard similarity >= `similarity`.
+       Candidates must have exactly the same markers (numbers, roman numerals, negations; see
+       text_similarity.markers) so "tahun 1945" never answers "tahun 1949", nor "perang dunia i" "perang dunia ii".
+    """
+
+    def __init__(self, maxsize=1000, ttl=24 * 3600, similarity=0.85, max_answer_chars=4000):
+        self.similarity = similarity
+        self.max_answer_chars = max_answer_chars
+        self._lsh = LSHIndex()
+        self._lsh_lock = threading.Lock()
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._on_evict)
+        self.hits_exact = 0
+        self.hits_fuzzy = 0
+        self.misses = 0
+
+    def _on_evict(self, key, entry):
+        with self._lsh_lock:
+            self._lsh.remove(key)
+
+    def lookup(self, question):
+        """Return (answer, match) where match is 'exact' or 'fuzzy', or None on a miss."""
+        key = normalize_text(question)
+        if not key:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry["hits"] += 1
+            self.hits_exact += 1
+            return entry["answer"], "exact"
+
+        signature = minhash_signature(key)
+        with self._lsh_lock:
+            best = self._lsh.query(signature, self.similarity)
+        if best is not None:
+            entry = self._entries.get(best[0])
+            if entry is not None and markers(entry["key"]) == markers(key):
+                entry["hits"] += 1
+                self.hits_fuzzy += 1
+                return entry["answer"], "fuzzy"
+        self.misses += 1
+        return None
+
+    def store(self, question, answer):
+        key = normalize_text(question)
+        if not key or not answer or len(answer) > self.max_answer_chars:
+            return False
+        entry = {
+            "key": key,
+            "question": question,
+            "answer": answer,
+            "hits": 0,
+            "created_at": time.time(),
+        }
+        self._entries.set(key, entry)
+        with self._lsh_lock:
+            self._lsh.add(key, minhash_signature(key))
+        return True
+
+    def purge(self, question=None):
+        """Remove the entry for `question` (normalized) or everything when omitted; returns the count removed."""
+        if question is None:
+            return self._entries.clear()
+        key = normalize_text(question)
+        return 1 if self._entries.pop(key) is not None else 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._entries.maxsize,
+            "ttl_seconds": self._entries.ttl,
+            "similarity": self.similarity,
+            "hits_exact": self.hits_exact,
+            "hits_fuzzy": self.hits_fuzzy,
+            "misses": self.misses,
+        }
+
+    def entries(self, limit=50):
+        """Most recently used entries first, without signatures."""
+        items = self._entries.items()[::-1][:max(0, int(limit))]
+        return [
+            {
+                "key": e["key"],
+                "question": e["question"],
+                "answer": e["answer"],
+                "hits": e["hits"],
+                "created_at": e["created_at"],
+            }
+            for _, e in items
+        ]
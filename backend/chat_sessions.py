@@ -0,0 +1,157 @@
+"""Server-side /quiz/chat sessions: bounded history with a token budget, so follow-ups keep their context.
+
+A session holds the recent turns that fit in CHAT_CONTEXT_TOKENS plus a running summary of the turns that
+no longer fit. The summary is extractive: each folded turn becomes one line made of the question and the
+first sentence of its answer, clipped, and only the newest lines within CHAT_SUMMARY_TOKENS are kept.
+It costs no upstream call, and the prompt sent upstream stays the same size however long the conversation
+runs. Tokens are estimated from characters (about 4 per token for Indonesian text); no tokenizer is needed
+for a budget.
+
+Memory is capped three ways: every stored question / answer is clipped (CHAT_MAX_QUESTION_CHARS /
+CHAT_MAX_ANSWER_CHARS), a session never holds more than its two budgets, and the store keeps at most
+CHAT_SESSION_MAX sessions and CHAT_SESSIONS_MAX_CHARS characters overall, evicting the least recently
+used sessions first. Sessions idle for CHAT_SESSION_IDLE_SECONDS expire. Sessions live in the worker that
+created them; with several workers, use sticky routing or accept that a follow-up may start a new session.
+"""
+import os
+import re
+import secrets
+import threading
+from collections import deque
+
+from ttl_cache import TTLCache
+
+CHAT_SESSION_MAX = int(os.getenv("CHAT_SESSION_MAX", "10000"))
+CHAT_SESSION_IDLE_SECONDS = float(os.getenv("CHAT_SESSION_IDLE_SECONDS", "1800"))
+CHAT_SESSIONS_MAX_CHARS = int(os.getenv("CHAT_SESSIONS_MAX_CHARS", str(32 * 1024 * 1024)))
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "600"))
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "200"))
+CHAT_MAX_QUESTION_CHARS = int(os.getenv("CHAT_MAX_QUESTION_CHARS", "1000"))
+CHAT_MAX_ANSWER_CHARS = int(os.getenv("CHAT_MAX_ANSWER_CHARS", "2000"))
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+
+def estimate_tokens(text):
+    return (len(text) + 3) // 4
+
+
+def _clip(text, limit):
+    text = (text or "").strip()
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def summary_line(question, answer):
+    """One extractive summary line for a folded turn: the question and the first sentence of the answer."""
+    first = _SENTENCE_END.split(answer.strip(), 1)[0]
+    return f"- {_clip(question, 120)} → {_clip(first, 160)}"
+
+
+class ChatSession:
+    __slots__ = ("id", "turns", "summary", "turn_tokens", "chars", "count")
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.turns = deque()  # (question, answer) pairs inside the context budget
+        self.summary = deque()  # summary lines of older turns, oldest first
+        self.turn_tokens = 0
+        self.chars = 0
+        self.count = 0  # turns ever added
+
+    @property
+    def is_new(self):
+        return self.count == 0
+
+    def _recount(self):
+        self.chars = sum(len(q) + len(a) for q, a in self.turns) + sum(len(line) for line in self.summary)
+
+    def add_turn(self, question, answer, context_tokens=CHAT_CONTEXT_TOKENS, summary_tokens=CHAT_SUMMARY_TOKENS):
+        """Append a turn, folding the oldest turns into the summary until the window fits its budget."""
+        question = _clip(question, CHAT_MAX_QUESTION_CHARS)
+        answer = _clip(answer, CHAT_MAX_ANSWER_CHARS)
+        self.turns.append((question, answer))
+        self.turn_tokens += estimate_tokens(question) + estimate_tokens(answer)
+        self.count += 1
+        while self.turns and self.turn_tokens > context_tokens:
+            q, a = self.turns.popleft()
+            self.turn_tokens -= estimate_tokens(q) + estimate_tokens(a)
+            self.summary.append(summary_line(q, a))
+        budget = summary_tokens
+        kept = 0
+        for line in reversed(self.summary):
+            budget -= estimate_tokens(line)
+            if budget < 0:
+                break
+            kept += 1
+        while len(self.summary) > kept:
+            self.summary.popleft()
+        self._recount()
+
+    def messages(self, system_prompt):
+        """Chat-completion messages for the next question: instructions + summary, then the window."""
+        system = system_prompt
+        if self.summary:
+            system += "\n\nRingkasan percakapan sebelumnya:\n" + "\n".join(self.summary)
+        out = [{"role": "system", "content": system}]
+        for q, a in self.turns:
+            out.append({"role": "user", "content": q})
+            out.append({"role": "assistant", "content": a})
+        return out
+
+    def context_text(self):
+        """The same context as plain text, for upstreams that only take a single question string."""
+        lines = list(self.summary)
+        lines.extend(f"- {_clip(q, 120)} → {_clip(a, 200)}" for q, a in self.turns)
+        return "\n".join(lines)
+
+
+class ChatSessionStore:
+    def __init__(self, max_sessions=CHAT_SESSION_MAX, idle_seconds=CHAT_SESSION_IDLE_SECONDS,
+                 max_chars=CHAT_SESSIONS_MAX_CHARS):
+        self.max_chars = max_chars
+        self._sessions = TTLCache(maxsize=max_sessions, ttl=idle_seconds, touch_on_get=True, on_evict=self._on_evict)
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def _on_evict(self, key, session):
+        with self._lock:
+            self._chars -= session.chars
+            self.evicted += 1
+
+    def get_or_create(self, session_id=None):
+        """The live session for `session_id`, or a new session (unknown, expired or missing ids)."""
+        if isinstance(session_id, str) and _SESSION_ID.match(session_id):
+            session = self._sessions.get(session_id)
+            if session is not None:
+                return session
+        session = ChatSession(secrets.token_urlsafe(16))
+        self._sessions.set(session.id, session)
+        self.created += 1
+        if self.created % 256 == 0:
+            self._sessions.purge_expired()
+        return session
+
+    def add_turn(self, session, question, answer):
+        if self._sessions.get(session.id) is not session:
+            # evicted while the answer was generated: nothing to account for, the session is gone
+            session.add_turn(question, answer)
+            return
+        before = session.chars
+        session.add_turn(question, answer)
+        with self._lock:
+            self._chars += session.chars - before
+            over = self._chars > self.max_chars
+        # global cap: drop the least recently used sessions (never the one just used, it is the most recent)
+        while over and len(self._sessions) > 1:
+            if self._sessions.pop_oldest() is None:
+                break
+            with self._lock:
+                over = self._chars > self.max_chars
+
+    def stats(self):
+        with self._lock:
+            chars = self._chars
+        return {"sessions": len(self._sessions), "chars": chars, "created": self.created, "evicted": self.evicted}
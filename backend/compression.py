@@ -0,0 +1,219 @@
+"""Negotiated gzip / brotli response compression.
+
+- CompressionMiddleware compresses JSON / text / NDJSON responses of at least COMPRESSION_MIN_BYTES for
+  clients that accept it. Brotli is used when the optional `brotli` package is installed
+  (pip install brotli) and the client prefers it, gzip otherwise. Streamed responses (the NDJSON question
+  stream) are compressed chunk by chunk with a flush after each chunk, so lines still arrive as produced.
+  Responses that already carry Content-Encoding are passed through untouched.
+- PrecompressedCache serves bodies that repeat between requests from a cache of already-compressed variants
+  keyed by a hash of the body. Bodies that change often (leaderboard, room rankings) are compressed inline at
+  the normal level, which costs well under a millisecond. With best=True (bodies that stay the same for
+  minutes: room question sets) the variant is compressed at the highest level on a worker thread, and until
+  it is ready the body is sent uncompressed for CompressionMiddleware to handle at the normal level, so the
+  event loop never runs a brotli-11 / gzip-9 pass.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import zlib
+
+from fastapi.responses import Response
+
+from ttl_cache import TTLCache
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "500"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_CACHE_ENTRIES = int(os.getenv("COMPRESSION_CACHE_ENTRIES", "256"))
+COMPRESSION_CACHE_TTL_SECONDS = float(os.getenv("COMPRESSION_CACHE_TTL_SECONDS", "600"))
+
+_COMPRESSIBLE = (b"application/json", b"application/x-ndjson", b"text/")
+
+
+def choose_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header value (bytes or str), honouring q-values."""
+    if isinstance(accept_encoding, bytes):
+        accept_encoding = accept_encoding.decode("latin-1")
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+    star = weights.get("*", 0.0)
+    best, best_q = None, 0.0
+    # brotli first so it wins ties
+    for name in (("br", "gzip") if brotli is not None else ("gzip",)):
+        q = weights.get(name, star)
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(data, encoding, best=False):
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else COMPRESSION_BROTLI_QUALITY)
+    c = zlib.compressobj(9 if best else COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+    return c.compress(data) + c.flush()
+
+
+class _StreamCompressor:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._c = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            self._c = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data):
+        if self.encoding == "br":
+            return self._c.process(data) + self._c.flush()
+        return self._c.compress(data) + self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._c.finish()
+        return self._c.flush()
+
+
+def _header(headers, name):
+    for k, v in headers:
+        if k == name:
+            return v
+    return None
+
+
+def _with_encoding(headers, encoding, length=None):
+    out = [(k, v) for k, v in headers if k not in (b"content-length", b"vary")]
+    vary = _header(headers, b"vary")
+    if not vary:
+        vary = b"Accept-Encoding"
+    elif b"accept-encoding" not in vary.lower():
+        vary += b", Accept-Encoding"
+    out.append((b"vary", vary))
+    out.append((b"content-encoding", encoding.encode()))
+    if length is not None:
+        out.append((b"content-length", str(length).encode()))
+    return out
+
+
+class CompressionMiddleware:
+    """Pure ASGI middleware; see module docstring."""
+
+    def __init__(self, app, min_size=COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = choose_encoding(_header(scope.get("headers") or [], b"accept-encoding"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def _send(message):
+            nonlocal start, compressor, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                headers = message.get("headers") or []
+                content_type = _header(headers, b"content-type") or b""
+                if _header(headers, b"content-encoding") is not None or not content_type.startswith(_COMPRESSIBLE):
+                    passthrough = True
+                    return await send(message)
+                start = message  # held until we know the body size
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body") or b""
+            more = message.get("more_body", False)
+            if compressor is None:
+                if not more:
+                    # whole body in one message
+                    passthrough = True
+                    if len(body) < self.min_size:
+                        await send(start)
+                        return await send(message)
+                    data = compress(body, encoding)
+                    await send({**start, "headers": _with_encoding(start["headers"], encoding, len(data))})
+                    return await send({"type": "http.response.body", "body": data, "more_body": False})
+                compressor = _StreamCompressor(encoding)
+                await send({**start, "headers": _with_encoding(start["headers"], encoding)})
+            data = compressor.chunk(body) if body else b""
+            if not more:
+                data += compressor.finish()
+            if data or not more:
+                await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, _send)
+
+
+class PrecompressedCache:
+    """Compressed variants of repeating response bodies, keyed by (body hash, encoding); see module docstring."""
+
+    def __init__(self, maxsize=COMPRESSION_CACHE_ENTRIES, ttl=COMPRESSION_CACHE_TTL_SECONDS, min_size=COMPRESSION_MIN_BYTES,
+                 best=False):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.min_size = min_size
+        self.best = best
+        self._pending = set()  # keys being compressed on a worker thread
+
+    def encoded(self, body, encoding):
+        """The compressed variant, or None while a best=True variant is still being compressed."""
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding)
+        data = self._cache.get(key)
+        if data is not None or key in self._pending:
+            return data
+        if not self.best:
+            data = compress(body, encoding)
+            self._cache.set(key, data)
+            return data
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:  # no event loop (CLI, tests): just compress
+            data = compress(body, encoding, best=True)
+            self._cache.set(key, data)
+            return data
+        self._pending.add(key)
+        future = loop.run_in_executor(None, compress, body, encoding, True)
+        future.add_done_callback(lambda f: self._compressed(key, f))
+        return None
+
+    def _compressed(self, key, future):
+        self._pending.discard(key)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            logging.warning("compression: precompressing a %s body failed: %s", key[1], future.exception())
+            return
+        self._cache.set(key, future.result())
+
+    def response(self, request, body, media_type="application/json"):
+        """Response for `body` (bytes), compressed from the cache when the client accepts an encoding."""
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+        data = self.encoded(body, encoding) if encoding is not None and len(body) >= self.min_size else None
+        if data is None:
+            return Response(body, media_type=media_type, headers={"Vary": "Accept-Encoding"})
+        return Response(data, media_type=media_type, headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+
+    def __len__(self):
+        return len(self._cache)
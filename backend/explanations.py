@@ -0,0 +1,247 @@
+"""Precomputed explanations for the static soal/*.json question bank.
+
+`/quiz/explain` serves bank questions from the sidecar file written here, so they cost no upstream call.
+Run the batch job from the backend folder:
+
+    python explanations.py                      # fill missing explanations, resume from existing sidecar
+    python explanations.py --concurrency 8 --rps 4 --limit 50
+    python explanations.py --force              # regenerate everything
+
+The job is safe to interrupt: progress is checkpointed to the sidecar file atomically.
+"""
+import argparse
+import asyncio
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+import requests
+from dotenv import load_dotenv
+
+SOAL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "soal")
+DEFAULT_SIDECAR = os.path.join(SOAL_DIR, "explanations.json")
+
+_SPACES = re.compile(r"\s+")
+
+
+def explanation_key(question, correct_choice):
+    """Stable key for (question text, correct choice text); independent of how choices were shuffled."""
+    q = _SPACES.sub(" ", str(question or "")).strip().casefold()
+    a = _SPACES.sub(" ", str(correct_choice or "")).strip().casefold()
+    return hashlib.sha1(f"{q}\x1f{a}".encode("utf-8")).hexdigest()[:20]
+
+
+def explanation_prompt(question, correct_choice):
+    return (
+        f"Jelaskan secara singkat (1-2 kalimat) mengapa jawaban '{correct_choice}' benar untuk pertanyaan berikut dalam bahasa Indonesia:\n\n"
+        f"{question}\n\nBerikan penjelasan faktual dan mudah dimengerti."
+    )
+
+
+def validate_explanation(text):
+    """Return the cleaned explanation when it looks like a short prose answer, else None."""
+    if not isinstance(text, str):
+        return None
+    text = text.strip()
+    if len(text) < 20 or len(text) > 800:
+        return None
+    if text.startswith("{") or "```" in text:
+        return None
+    return text
+
+
+def load_explanations(path=DEFAULT_SIDECAR):
+    """Load the sidecar as {key: explanation}. Missing or unreadable files yield an empty dict."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        entries = data.get("explanations") or {}
+        return {k: v["explanation"] for k, v in entries.items() if isinstance(v, dict) and v.get("explanation")}
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logging.error("explanations: failed to load %s: %s", path, e)
+        return {}
+
+
+def iter_bank_questions(soal_dir=SOAL_DIR):
+    """Yield (bank file name, question dict, correct choice text) for every usable bank question."""
+    for path in sorted(glob.glob(os.path.join(soal_dir, "*.json"))):
+        if os.path.basename(path) == os.path.basename(DEFAULT_SIDECAR):
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                bank = json.load(f)
+        except Exception as e:
+            logging.error("explanations: skipping unreadable bank %s: %s", path, e)
+            continue
+        for q in (bank.get("questions") if isinstance(bank, dict) else None) or []:
+            choices = q.get("choices") or []
+            try:
+                correct = choices[int(q.get("answer", 0))]
+            except Exception:
+                continue
+            if q.get("question") and correct:
+                yield os.path.basename(path), q, correct
+
+
+def _read_sidecar(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get("explanations"), dict):
+            return data
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logging.warning("explanations: ignoring unreadable sidecar %s: %s", path, e)
+    return {"version": 1, "explanations": {}}
+
+
+def _write_sidecar(path, data):
+    # write to a temp file and rename, so a crash never leaves a half-written sidecar behind
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _now_iso():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+class _RateLimiter:
+    """Spaces request starts at least 1/rps seconds apart across all workers."""
+
+    def __init__(self, rps):
+        self.interval = 1.0 / rps if rps and rps > 0 else 0.0
+        self._lock = asyncio.Lock()
+        self._next = 0.0
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _generate(api_key, question, correct, timeout):
+    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
+    body = {
+        "model": "auto",
+        "messages": [{"role": "user", "content": explanation_prompt(question, correct)}],
+        "max_tokens": 150,
+        "temperature": 0.3,
+    }
+    url = (os.getenv("UNLI_API_BASE") or "https://api.unli.dev").rstrip("/") + "/v1/chat/completions"
+    resp = requests.post(url, json=body, headers=headers, timeout=timeout)
+    if resp.status_code == 429 or resp.status_code >= 500:
+        raise RuntimeError(f"retryable status {resp.status_code}")
+    if not resp.ok:
+        return None
+    choices = resp.json().get("choices") or []
+    if not choices:
+        return None
+    msg = choices[0].get("message")
+    return msg.get("content") if isinstance(msg, dict) else choices[0].get("text")
+
+
+async def run_batch(api_key, sidecar_path=DEFAULT_SIDECAR, concurrency=4, rps=2.0, limit=None,
+                    force=False, retries=3, timeout=20, checkpoint_every=10):
+    data = _read_sidecar(sidecar_path)
+    entries = data["explanations"]
+
+    todo = []
+    seen = set()
+    for bank, q, correct in iter_bank_questions():
+        key = explanation_key(q["question"], correct)
+        if key in seen or (key in entries and not force):
+            continue
+        seen.add(key)
+        todo.append((key, bank, q["question"], correct))
+    if limit:
+        todo = todo[:limit]
+    logging.info("explanations: %s questions to process (%s already done)", len(todo), len(entries))
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+    limiter = _RateLimiter(rps)
+    counters = {"ok": 0, "invalid": 0, "failed": 0, "since_checkpoint": 0}
+    write_lock = asyncio.Lock()
+
+    async def _one(key, bank, question, correct):
+        async with sem:
+            text = None
+            for attempt in range(retries):
+                await limiter.wait()
+                try:
+                    text = await asyncio.to_thread(_generate, api_key, question, correct, timeout)
+                    break
+                except Exception as e:
+                    logging.warning("explanations: attempt %s failed for %s: %s", attempt + 1, key, e)
+                    if attempt + 1 < retries:
+                        await asyncio.sleep(2 ** attempt)
+            else:
+                counters["failed"] += 1
+                return
+            text = validate_explanation(text)
+            if text is None:
+                counters["invalid"] += 1
+                return
+            entries[key] = {
+                "bank": bank,
+                "question": question,
+                "answer": correct,
+                "explanation": text,
+                "generated_at": _now_iso(),
+            }
+            counters["ok"] += 1
+            counters["since_checkpoint"] += 1
+            if counters["since_checkpoint"] >= checkpoint_every:
+                async with write_lock:
+                    counters["since_checkpoint"] = 0
+                    # other tasks keep adding entries while the thread writes: hand it a snapshot
+                    snapshot = {**data, "explanations": dict(entries)}
+                    await asyncio.to_thread(_write_sidecar, sidecar_path, snapshot)
+                    logging.info("explanations: checkpoint (%s ok, %s invalid, %s failed)",
+                                 counters["ok"], counters["invalid"], counters["failed"])
+
+    try:
+        await asyncio.gather(*(_one(*item) for item in todo))
+    finally:
+        _write_sidecar(sidecar_path, data)
+    logging.info("explanations: done (%s ok, %s invalid, %s failed); sidecar has %s entries",
+                 counters["ok"], counters["invalid"], counters["failed"], len(entries))
+    counters.pop("since_checkpoint", None)
+    return counters
+
+
+def main(argv=None):
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    parser = argparse.ArgumentParser(description="Precompute explanations for every soal/*.json question.")
+    parser.add_argument("--out", default=DEFAULT_SIDECAR, help="sidecar file (default: soal/explanations.json)")
+    parser.add_argument("--concurrency", type=int, default=4, help="max in-flight upstream requests")
+    parser.add_argument("--rps", type=float, default=2.0, help="max request starts per second (0 = unlimited)")
+    parser.add_argument("--limit", type=int, default=None, help="process at most N questions this run")
+    parser.add_argument("--force", action="store_true", help="regenerate explanations that already exist")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=20)
+    args = parser.parse_args(argv)
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        parser.error("OPENAI_API_KEY is not set")
+    asyncio.run(run_batch(api_key, sidecar_path=args.out, concurrency=args.concurrency, rps=args.rps,
+                          limit=args.limit, force=args.force, retries=args.retries, timeout=args.timeout))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+"""Streaming export of the `submissions` collection as NDJSON or CSV (admin endpoint and CLI).
+
+    GET /admin/export/submissions?format=csv&week=2026-W42
+    python exports.py --format ndjson --start 2026-01-01 --end 2026-12-31 --out submissions-2026.ndjson
+
+Rows are read in `_id` order with keyset pagination: every batch is a fresh `find({_id > last}).limit(n)`
+run on a worker thread, so no server cursor has to survive a slow client, memory holds one batch at a time
+whatever the size of the export, and an interrupted export continues from the last exported id
+(`after=<id>`; the CLI does this by itself when --out already exists).
+
+Date filters use the insertion time encoded in `_id`, so they are ranges on the `_id` index too:
+`start` / `end` are dates (YYYY-MM-DD, both inclusive) or ISO datetimes; dates without a time zone are read
+in WIB (UTC+7). `week` (2026-W42) is a leaderboard week: the leaderboard resets every Sunday 00:00 WIB, so
+the filter runs from the Sunday before that ISO week's Monday to the reset on its own Sunday (for 2026-W42,
+Sun 11 Oct 00:00 to Sun 18 Oct 00:00 WIB). A week's submissions are exactly that leaderboard's history; the
+Sunday of the ISO week itself belongs to the next one.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import logging
+import os
+import re
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+from bson.objectid import ObjectId
+
+from fast_json import dumps as json_dumps
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+WIB = timezone(timedelta(hours=7))
+
+CSV_FIELDS = ("id", "created_at", "date", "name", "email", "age_group", "difficulty", "score", "percentage",
+              "totalQuestions", "timeSpent", "feedback", "outcomes")
+
+_WEEK = re.compile(r"^(\d{4})-?W(\d{1,2})$", re.IGNORECASE)
+
+
+def _parse_time(value, end=False):
+    """UTC datetime for a date or ISO datetime; a date-only `end` covers that whole day."""
+    value = value.strip()
+    if len(value) == 10:
+        day = datetime.combine(date.fromisoformat(value), datetime.min.time(), WIB)
+        return (day + timedelta(days=1) if end else day).astimezone(timezone.utc)
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=WIB)
+    return parsed.astimezone(timezone.utc)
+
+
+def week_range(week):
+    """(start, end) in UTC of the leaderboard week '2026-W42': the Sunday 00:00 WIB before that ISO week's
+    Monday up to the weekly reset at 00:00 WIB on its Sunday."""
+    m = _WEEK.match(week.strip())
+    if not m:
+        raise ValueError(f"week must look like 2026-W42, got {week!r}")
+    sunday = date.fromisocalendar(int(m.group(1)), int(m.group(2)), 1) - timedelta(days=1)
+    start = datetime.combine(sunday, datetime.min.time(), WIB).astimezone(timezone.utc)
+    return start, start + timedelta(days=7)
+
+
+def build_query(start=None, end=None, week=None, difficulty=None):
+    """Mongo filter for the export; raises ValueError on unparseable arguments."""
+    lower = upper = None
+    try:
+        if week:
+            lower, upper = week_range(week)
+        if start:
+            t = _parse_time(start)
+            lower = max(lower, t) if lower else t
+        if end:
+            t = _parse_time(end, end=True)
+            upper = min(upper, t) if upper else t
+    except ValueError as e:
+        raise ValueError(f"invalid date filter: {e}")
+    query = {}
+    id_range = {}
+    if lower:
+        id_range["$gte"] = ObjectId.from_datetime(lower)
+    if upper:
+        id_range["$lt"] = ObjectId.from_datetime(upper)
+    if id_range:
+        query["_id"] = id_range
+    if difficulty:
+        # difficulty is stored as the client sent it ("Mudah", "mudah", ...)
+        query["difficulty"] = {"$regex": f"^{re.escape(difficulty.strip())}$", "$options": "i"}
+    return query
+
+
+def fetch_batch(coll, query, after=None, batch_size=EXPORT_BATCH_SIZE):
+    """Next `batch_size` documents after the id `after` (blocking)."""
+    if after is not None:
+        query = {**query, "_id": {**query.get("_id", {}), "$gt": after}}
+    return list(coll.find(query).sort("_id", 1).limit(batch_size))
+
+
+def _row(doc):
+    out = {k: v for k, v in doc.items() if k != "_id"}
+    out["id"] = str(doc["_id"])
+    if "created_at" not in out:
+        out["created_at"] = doc["_id"].generation_time
+    return out
+
+
+def encode_ndjson(docs):
+    return b"".join(json_dumps(_row(d)) + b"\n" for d in docs)
+
+
+def csv_header():
+    buf = io.StringIO()
+    csv.writer(buf).writerow(CSV_FIELDS)
+    return buf.getvalue().encode("utf-8")
+
+
+def encode_csv(docs):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for d in docs:
+        row = _row(d)
+        created = row.get("created_at")
+        row["created_at"] = created.isoformat() if isinstance(created, datetime) else created
+        # per-question detail only exists in NDJSON; CSV gets the count
+        row["outcomes"] = len(row.get("outcomes") or []) or ""
+        writer.writerow(["" if row.get(f) is None else row.get(f) for f in CSV_FIELDS])
+    return buf.getvalue().encode("utf-8")
+
+
+def parse_after(value):
+    if not value:
+        return None
+    try:
+        return ObjectId(value)
+    except Exception:
+        raise ValueError(f"after must be a submission id, got {value!r}")
+
+
+class ExportInterrupted(Exception):
+    """The database failed mid-export; `after` is the last id that was sent (resume with after=<id>)."""
+
+    def __init__(self, message, after=None):
+        super().__init__(message)
+        self.after = after
+
+
+async def stream_export(get_collection, query, fmt="ndjson", after=None, limit=None, batch_size=EXPORT_BATCH_SIZE):
+    """Async byte chunks of the export, one per batch.
+
+    Raises ExportInterrupted if Mongo goes away mid-export, so the server aborts the response instead of ending
+    it cleanly and the client sees a failed download rather than a silently truncated file.
+    """
+    encode = encode_csv if fmt == "csv" else encode_ndjson
+    if fmt == "csv":
+        yield csv_header()
+    sent = 0
+    while limit is None or sent < limit:
+        coll = get_collection()
+        if coll is None:
+            logging.error("export: database went away after %s rows (resume with after=%s)", sent, after)
+            raise ExportInterrupted(f"database went away after {sent} rows", after)
+        size = batch_size if limit is None else min(batch_size, limit - sent)
+        try:
+            docs = await asyncio.to_thread(fetch_batch, coll, query, after, size)
+        except Exception as e:
+            logging.error("export: batch after %s failed after %s rows: %s", after, sent, e)
+            raise ExportInterrupted(f"batch failed after {sent} rows: {e}", after) from e
+        if not docs:
+            return
+        sent += len(docs)
+        after = docs[-1]["_id"]
+        yield encode(docs)
+        if len(docs) < size:
+            return
+
+
+_TAIL_BYTES = 65536
+
+
+def _quotes_before(f, offset, chunk_size=1 << 20):
+    """Number of '"' bytes in the first `offset` bytes of `f` (C-speed counting, even for big exports)."""
+    f.seek(0)
+    count = 0
+    while offset > 0:
+        chunk = f.read(min(chunk_size, offset))
+        if not chunk:
+            break
+        count += chunk.count(b'"')
+        offset -= len(chunk)
+    return count
+
+
+def _line_ends(data, terminator, base=0):
+    ends = []
+    i = data.find(terminator)
+    while i >= 0:
+        ends.append(base + i + len(terminator))
+        i = data.find(terminator, i + len(terminator))
+    return ends
+
+
+def _csv_row_ends(data, in_quotes):
+    """Offsets in `data` just past each CRLF that ends a CSV row, i.e. lies outside a quoted field.
+
+    csv.writer doubles quotes inside fields, so quote parity alone says whether a position is inside one;
+    `in_quotes` is the parity at the start of `data`.
+    """
+    ends = []
+    pos = 0
+    for n, segment in enumerate(data.split(b'"')):
+        if (n % 2 == 1) == in_quotes:  # outside quotes; CRLFs inside a quoted field are part of a value
+            ends.extend(_line_ends(segment, b"\r\n", pos))
+        pos += len(segment) + 1
+    return ends
+
+
+def _last_exported_id(path, fmt):
+    """(id of the last complete row or None, length of the file up to the end of its last complete row).
+
+    Only rows ending in their terminator count: LF for NDJSON, and for CSV a CRLF outside quoted fields (a
+    free-text field may itself contain CRLF). A row cut off by a crash mid-write is ignored, and the caller
+    truncates the file to the returned length before appending.
+    """
+    with open(path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        offset = max(0, size - _TAIL_BYTES)
+        if fmt == "csv":
+            in_quotes = _quotes_before(f, offset) % 2 == 1
+        f.seek(offset)
+        tail = f.read()
+    if fmt == "csv":
+        ends = _csv_row_ends(tail, in_quotes)
+        rows = [tail[a:b - 2] for a, b in zip([0] + ends, ends)]
+    else:
+        ends = _line_ends(tail, b"\n")
+        rows = [tail[a:b - 1] for a, b in zip([0] + ends, ends)]
+    if not ends:
+        if offset:
+            raise ValueError(f"{path}: no complete row in the last 64 KiB, not an export file?")
+        return None, 0
+    complete = offset + ends[-1]
+    if offset:
+        rows = rows[1:]  # the window may start mid-row
+    for row in reversed(rows):
+        if not row.strip() or row.startswith(b"id,"):
+            continue
+        m = re.search(rb'"id":"([0-9a-f]{24})"', row) if fmt == "ndjson" else re.match(rb"([0-9a-f]{24}),", row)
+        if m:
+            return m.group(1).decode(), complete
+    return None, complete
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Export quiz_merdeka.submissions as NDJSON or CSV.")
+    parser.add_argument("--format", choices=("ndjson", "csv"), default="ndjson")
+    parser.add_argument("--start", help="first day (YYYY-MM-DD, WIB) or ISO datetime")
+    parser.add_argument("--end", help="last day (inclusive) or ISO datetime")
+    parser.add_argument("--week", help="ISO week, e.g. 2026-W42")
+    parser.add_argument("--difficulty")
+    parser.add_argument("--after", help="resume after this submission id")
+    parser.add_argument("--out", help="output file; continued from its last row when it already exists")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGODB_URI"))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    if not args.mongo_uri:
+        sys.exit("MONGODB_URI is not set (or pass --mongo-uri)")
+
+    query = build_query(args.start, args.end, args.week, args.difficulty)
+    after = parse_after(args.after)
+    kept = 0
+    if args.out and os.path.exists(args.out):
+        last, kept = _last_exported_id(args.out, args.format)
+        if kept < os.path.getsize(args.out):
+            logging.warning("export: dropping an incomplete last row from %s", args.out)
+            os.truncate(args.out, kept)
+        if last and after is None:
+            after = ObjectId(last)
+            logging.info("export: %s exists, continuing after %s", args.out, last)
+
+    client = MongoClient(args.mongo_uri, serverSelectionTimeoutMS=5000)
+    coll = client["quiz_merdeka"]["submissions"]
+    out = open(args.out, "ab") if args.out else sys.stdout.buffer
+    rows = 0
+    try:
+        if args.format == "csv" and not kept:
+            out.write(csv_header())
+        encode = encode_csv if args.format == "csv" else encode_ndjson
+        while True:
+            docs = fetch_batch(coll, query, after, args.batch_size)
+            if not docs:
+                break
+            out.write(encode(docs))
+            out.flush()
+            rows += len(docs)
+            after = docs[-1]["_id"]
+        logging.info("export: wrote %s rows%s", rows, f" (last id {after})" if after else "")
+    finally:
+        if args.out:
+            out.close()
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
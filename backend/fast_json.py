@@ -0,0 +1,55 @@
+"""JSON encoding for responses: orjson when installed, stdlib json otherwise.
+
+`FastJSONResponse` is the app's default response class. Handlers on hot paths return one directly (skipping
+FastAPI's jsonable_encoder pass) when their content is already plain dicts/lists/str/numbers.
+`RawJSONResponse` sends bytes that are already JSON, e.g. bodies spliced together from pre-encoded fragments
+(see question_bank.py).
+"""
+import json
+from datetime import date, datetime
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+
+def _default(value):
+    # types that show up in Mongo documents; anything else is a bug in the caller
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if type(value).__name__ == "ObjectId":
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(content):
+        """Encode `content` as compact UTF-8 JSON bytes."""
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def encode_str(text):
+        """JSON string literal for `text`, as bytes (quotes included)."""
+        return orjson.dumps(text)
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def dumps(content):
+        return _encoder.encode(content).encode("utf-8")
+
+    def encode_str(text):
+        return _encoder.encode(text).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    """Response whose content is already-encoded JSON bytes."""
+    media_type = "application/json"
@@ -0,0 +1,251 @@
+"""Structured, off-thread logging for the API.
+
+`configure()` replaces the root handlers with a QueueHandler: request code renders the message (arguments
+truncated, emails redacted) and appends a copy of the LogRecord without its arguments or traceback object to
+an in-memory queue, so the record no longer refers to objects the caller may go on to change; a
+QueueListener thread does the JSON/text formatting and the writing to stderr. When the queue is full, records
+are dropped and counted rather than blocking the event loop.
+
+Environment:
+- LOG_LEVEL: default level (INFO)
+- LOG_FORMAT: `json` (one object per line, default) or `text`
+- LOG_ROUTE_LEVELS: per-path-prefix levels, e.g. `/quiz/submit=WARNING,/admin=DEBUG` (longest prefix wins)
+- LOG_MAX_ARG_CHARS / LOG_MAX_MESSAGE_CHARS: truncate long arguments (payloads, provider bodies) and messages
+- LOG_PAYLOAD_SAMPLE_RATE: share of requests whose payload is logged by `log_sampled` (default 0.01)
+- LOG_REDACT_EMAILS: replace email addresses with a keyed pseudonym, see pseudonyms.py (default 1)
+- LOG_QUEUE_SIZE: records buffered before dropping (default 10000)
+"""
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+
+import metrics
+from pseudonyms import pseudonym
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_ROUTE_LEVELS = os.getenv("LOG_ROUTE_LEVELS", "")
+LOG_MAX_ARG_CHARS = int(os.getenv("LOG_MAX_ARG_CHARS", "500"))
+LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+LOG_REDACT_EMAILS = os.getenv("LOG_REDACT_EMAILS", "1").lower() not in ("0", "false", "no")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_STD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "route"}
+
+# (path, effective level) of the request being handled; copied into to_thread workers with the context
+_request_route = contextvars.ContextVar("log_request_route", default=None)
+
+
+def parse_route_levels(text):
+    """'/quiz/submit=WARNING,/admin=DEBUG' -> [(prefix, levelno)] sorted longest prefix first."""
+    levels = []
+    for part in (text or "").split(","):
+        prefix, _, level = part.partition("=")
+        prefix, level = prefix.strip(), level.strip().upper()
+        if not prefix or not level:
+            continue
+        levelno = logging.getLevelName(level)
+        if isinstance(levelno, int):
+            levels.append((prefix, levelno))
+        else:
+            sys.stderr.write(f"logging_setup: ignoring unknown level {level!r} for {prefix}\n")
+    return sorted(levels, key=lambda item: len(item[0]), reverse=True)
+
+
+def redact(text):
+    """Replace email addresses with `<email:hash>` so lines stay correlatable without the address."""
+    return _EMAIL.sub(lambda m: "<email:%s>" % pseudonym(m.group(0), 8), text)
+
+
+def _clip(text, limit):
+    if limit and len(text) > limit:
+        return f"{text[:limit]}...[{len(text) - limit} chars truncated]"
+    return text
+
+
+def _clip_arg(value):
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    return _clip(str(value), LOG_MAX_ARG_CHARS)
+
+
+def render_message(record):
+    """record.getMessage() with every argument truncated first, then the whole message truncated and redacted."""
+    if getattr(record, "_rendered", False):
+        return str(record.msg)  # already done by DroppingQueueHandler.prepare
+    args = record.args
+    if args:
+        if isinstance(args, dict):
+            args = {k: _clip_arg(v) for k, v in args.items()}
+        else:
+            args = tuple(_clip_arg(a) for a in args)
+        try:
+            message = str(record.msg) % args
+        except Exception:
+            message = f"{record.msg} {args!r}"
+    else:
+        message = str(record.msg)
+    message = _clip(message, LOG_MAX_MESSAGE_CHARS)
+    return redact(message) if LOG_REDACT_EMAILS else message
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": render_message(record),
+        }
+        route = getattr(record, "route", None)
+        if route:
+            out["route"] = route
+        for key, value in record.__dict__.items():
+            if key not in _STD_ATTRS and not key.startswith("_"):
+                out[key] = value if isinstance(value, (int, float, bool)) or value is None else _clip(str(value), LOG_MAX_ARG_CHARS)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            out["exc"] = redact(record.exc_text) if LOG_REDACT_EMAILS else record.exc_text
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(message)s")
+
+    def formatMessage(self, record):
+        record.message = render_message(record)
+        return super().formatMessage(record)
+
+
+class RouteLevelFilter(logging.Filter):
+    """Applies the per-route level on the calling thread (cheap: one contextvar read and an int compare)."""
+
+    def __init__(self, default_level):
+        super().__init__()
+        self.default_level = default_level
+
+    def filter(self, record):
+        current = _request_route.get()
+        if current is None:
+            return record.levelno >= self.default_level
+        record.route = current[0]
+        return record.levelno >= current[1]
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks when the queue is full; the listener does the line formatting."""
+
+    _traceback = logging.Formatter()
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # like the stdlib version, render the message now and queue a copy without args and exc_info: the
+        # arguments may be mutated (or the traceback's frames released) before the listener gets to the record
+        message = render_message(record)
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = self._traceback.formatException(record.exc_info)
+        if exc_text and LOG_REDACT_EMAILS:
+            exc_text = redact(exc_text)
+        record = copy.copy(record)
+        record.message = record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        record._rendered = True
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.LOG_RECORDS_DROPPED.labels().inc()
+
+
+class LogContextMiddleware:
+    """Pure ASGI middleware binding the request path and its configured log level for the duration of a request."""
+
+    def __init__(self, app, route_levels=None, default_level=logging.INFO):
+        self.app = app
+        self.route_levels = route_levels or []
+        self.default_level = default_level
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope.get("path") or ""
+        level = self.default_level
+        for prefix, prefix_level in self.route_levels:
+            if path.startswith(prefix):
+                level = prefix_level
+                break
+        token = _request_route.set((path, level))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_route.reset(token)
+
+
+_handler = None
+_listener = None
+
+
+def configure():
+    """Install the queue handler and start the listener thread (idempotent); returns (default_level, route_levels)."""
+    global _handler, _listener
+    default_level = logging.getLevelName(LOG_LEVEL)
+    if not isinstance(default_level, int):
+        default_level = logging.INFO
+    route_levels = parse_route_levels(LOG_ROUTE_LEVELS)
+    if _listener is not None:
+        return default_level, route_levels
+
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+    _handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _handler.addFilter(RouteLevelFilter(default_level))
+    _listener = logging.handlers.QueueListener(_handler.queue, stream, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(_handler)
+    # the root level is the most verbose level any route asks for; RouteLevelFilter narrows it per request
+    root.setLevel(min([default_level] + [lvl for _, lvl in route_levels]))
+    return default_level, route_levels
+
+
+def shutdown():
+    """Flush queued records (call on application shutdown)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+
+def log_sampled(level, msg, *args, rate=None):
+    """Log only a sample of calls, for per-request payload dumps that are too heavy to log every time."""
+    rate = LOG_PAYLOAD_SAMPLE_RATE if rate is None else rate
+    if rate >= 1 or (rate > 0 and random.random() < rate):
+        logging.log(level, msg, *args)
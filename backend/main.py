@@ -1,9 +1,9 @@
 from fastapi import FastAPI, Request, HTTPException
+import hmac
 import logging
 from pydantic import BaseModel
 import json
 import random
-import copy
 import re
 import requests
 import os
@@ -11,9 +11,27 @@ from pymongo import MongoClient
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 import asyncio
 from datetime import datetime, timedelta, timezone
+from chat_cache import ChatAnswerCache
+from ttl_cache import TTLCache
+import chat_sessions
+import metrics
+import mongo_indexes
+import profiling
+import traffic_capture
+import logging_setup
+import auth
+import rate_limit
+import compression
+import question_bank
+import question_stats
+import exports
+import rooms
+from fast_json import FastJSONResponse, RawJSONResponse, dumps as json_dumps
+from explanations import explanation_key, explanation_prompt, load_explanations
+from question_stream import IncrementalQuestionParser, iter_stream_content, validate_question
 try:
     from zoneinfo import ZoneInfo
 except Exception:
@@ -21,28 +39,40 @@ except Exception:
 load_dotenv()
 
 
-app = FastAPI()
+# orjson-backed when available; hot handlers return FastJSONResponse/RawJSONResponse directly
+app = FastAPI(default_response_class=FastJSONResponse)
 
 
-@app.middleware("http")
-async def require_api_key(request, call_next):
-    # enforce only for our API paths
-    path = request.url.path or ""
-    if path.startswith("/quiz") or path.startswith("/chat"):
-        if API_KEY:
-            auth = request.headers.get('authorization') or request.headers.get('Authorization')
-            if not auth or not auth.lower().startswith('bearer '):
-                return JSONResponse(status_code=401, content={"detail": "Missing or invalid Authorization header"})
-            token = auth.split(None, 1)[1].strip()
-            if token != API_KEY:
-                return JSONResponse(status_code=401, content={"detail": "Unauthorized"})
-        else:
-            # API_KEY not configured; already warned on startup, allow for dev
-            pass
-    return await call_next(request)
+# API key auth (API_KEYS with per-key scopes, plus the legacy API_KEY); see auth.py.
+# Added first so it sits inside CORS: preflights and 401s still get CORS headers.
+api_keys = auth.load_keys()
+
+# Per-client token buckets on the AI-backed endpoints (429 + Retry-After); see rate_limit.py.
+# Handlers charge them right before calling upstream, after their cache lookups; the auth middleware has
+# already put the key name in the scope by then, so buckets are keyed by it.
+if rate_limit.RATE_LIMIT_STORE == "mongo":
+    rate_limiter = rate_limit.RateLimiter(
+        rate_limit.MongoWindowStore(lambda: db["rate_limits"] if db is not None else None), blocking_store=True)
+else:
+    rate_limiter = rate_limit.RateLimiter(rate_limit.LocalBucketStore())
+
+
+@app.exception_handler(rate_limit.RateLimited)
+async def _rate_limited(request: Request, exc: rate_limit.RateLimited):
+    return rate_limit.rate_limited_response(exc)
+
 
-# Logging setup
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+app.add_middleware(auth.APIKeyMiddleware, keys=api_keys)
+
+# Logging setup: JSON records through a queue handler, written by a background thread (see logging_setup.py)
+_log_level, _log_route_levels = logging_setup.configure()
+app.add_middleware(logging_setup.LogContextMiddleware, route_levels=_log_route_levels, default_level=_log_level)
+
+# gzip / brotli for JSON, text and NDJSON responses (see compression.py); inside metrics so latency includes it
+app.add_middleware(compression.CompressionMiddleware)
+
+# Request latency / in-flight metrics (exposed on /metrics); added after the auth middleware so it wraps it
+app.add_middleware(metrics.MetricsMiddleware)
 
 
 # CORS - allow frontend dev servers
@@ -52,38 +82,169 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Room-Token", "Retry-After"],
 )
 
 # Environment variables
 UNLI_API_KEY = os.getenv("OPENAI_API_KEY")
 LUNOS_API_KEY = os.getenv("LUNOS_API_KEY")
+# Provider base URLs (overridable so benchmarks can point the app at local stand-ins)
+UNLI_API_BASE = (os.getenv("UNLI_API_BASE") or "https://api.unli.dev").rstrip("/")
+LUNOS_API_BASE = (os.getenv("LUNOS_API_BASE") or "https://api.lunos.tech").rstrip("/")
 MAILRY_SETUP_LINK = os.getenv("MAILRY_SETUP_LINK")
 MAILRY_API_URL = os.getenv("MAILRY_API_URL")  # optional: explicit API endpoint for sending mail
 MAILRY_API_KEY = os.getenv("MAILRY_API_KEY")  # Bearer token for Mailry API
 MAILRY_EMAIL_ID = os.getenv("MAILRY_EMAIL_ID")  # default sender emailId (uuid) for Mailry
 FRONTEND_BASE = os.getenv("FRONTEND_BASE")
 MONGODB_URI = os.getenv("MONGODB_URI")
-API_KEY = os.getenv("API_KEY")
-if not API_KEY:
-    logging.warning("API_KEY not set: API endpoints will NOT require authentication (development mode)")
+if not api_keys:
+    logging.warning("API_KEY / API_KEYS not set: API endpoints will NOT require authentication (development mode)")
+
+# Opt-in request profiling: `X-Profile: <PROFILE_TOKEN or any admin key>` or sampling (see profiling.py)
+profile_store = profiling.ProfileStore()
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+
+
+def _profile_token_ok(value):
+    if PROFILE_TOKEN and hmac.compare_digest(value, PROFILE_TOKEN.encode("utf-8")):
+        return True
+    return api_keys.allows(value, "admin")
+
+
+app.add_middleware(profiling.ProfilingMiddleware, verify=_profile_token_ok, store=profile_store)
+
+# Traffic capture for replay load tests (bench/replay.py): enabled by CAPTURE_FILE
+if traffic_capture.CAPTURE_FILE:
+    app.add_middleware(traffic_capture.TrafficCaptureMiddleware, writer=traffic_capture.CaptureWriter(traffic_capture.CAPTURE_FILE))
+    logging.info("Traffic capture enabled: writing to %s", traffic_capture.CAPTURE_FILE)
+
+
+def _upstream(upstream, operation, method, url, **kwargs):
+    """requests.request() for an outbound provider call, recorded in the per-upstream latency histogram."""
+    with metrics.track_upstream(upstream, operation) as call:
+        resp = requests.request(method, url, **kwargs)
+        call.status = resp.status_code
+        return resp
+
+
+# at most UPSTREAM_CONCURRENCY calls in flight per provider
+upstream_limits = rate_limit.UpstreamLimiter()
+
+
+async def _upstream_call(upstream, operation, method, url, **kwargs):
+    """_upstream() on a worker thread so the event loop keeps serving, holding one of the upstream's slots.
+
+    Raises rate_limit.UpstreamSaturated when no slot frees up in time; callers fall back as for any failure.
+    """
+    async with upstream_limits.slot(upstream):
+        return await asyncio.to_thread(_upstream, upstream, operation, method, url, **kwargs)
+
+
+# Answer cache for /quiz/chat (normalized question text + near-duplicate lookup)
+chat_answer_cache = ChatAnswerCache(
+    maxsize=int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1000")),
+    ttl=int(os.getenv("CHAT_CACHE_TTL_SECONDS", str(24 * 3600))),
+    similarity=float(os.getenv("CHAT_CACHE_SIMILARITY", "0.85")),
+)
+# Multi-turn /quiz/chat sessions with a token-budgeted history window (see chat_sessions.py)
+chat_session_store = chat_sessions.ChatSessionStore()
+# Explanations precomputed offline for bank questions (see explanations.py); served without upstream calls
+precomputed_explanations = load_explanations()
+logging.info("Loaded %s precomputed explanations", len(precomputed_explanations))
+# Upper bound on how long /quiz/questions/stream waits for the AI before topping up from the bank
+QUESTION_STREAM_DEADLINE_SECONDS = float(os.getenv("QUESTION_STREAM_DEADLINE_SECONDS", "25"))
 
 # MongoDB setup
+# The connection is established by a background task after startup (see _mongo_connect_loop), so a slow or
+# unavailable database never delays worker start. Handlers check the collections for None as before; they are
+# swapped in once the database answers and swapped out again while it is unreachable.
 client = None
+db = None
 submissions_collection = None
 leaderboard_collection = None
-if MONGODB_URI:
+MONGO_HEALTH_INTERVAL_SECONDS = float(os.getenv("MONGO_HEALTH_INTERVAL_SECONDS", "30"))
+MONGO_RECONNECT_MAX_SECONDS = float(os.getenv("MONGO_RECONNECT_MAX_SECONDS", "60"))
+mongo_state = {
+    "status": "connecting" if MONGODB_URI else "disabled",
+    "attempts": 0,
+    "last_error": None,
+    "connected_at": None,
+}
+if not MONGODB_URI:
+    logging.warning("MONGODB_URI not set; MongoDB integration disabled")
+
+
+def _mongo_open():
+    """Create a client and ping it (blocking); returns the client or raises."""
+    new_client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=3000, event_listeners=[metrics.MongoCommandMetrics()])
+    try:
+        new_client.admin.command('ping')
+    except Exception:
+        new_client.close()
+        raise
+    return new_client
+
+
+def _mongo_attach(new_client):
+    global client, db, submissions_collection, leaderboard_collection
+    client = new_client
+    db = new_client["quiz_merdeka"]
+    submissions_collection = db["submissions"]
+    leaderboard_collection = db["leaderboard"]
+
+
+def _mongo_detach():
+    # keep the client (pymongo reconnects on its own) but stop handlers from waiting on server selection
+    global db, submissions_collection, leaderboard_collection
+    db = None
+    submissions_collection = None
+    leaderboard_collection = None
+
+
+async def _mongo_connect_loop():
+    """Connect to MongoDB with exponential backoff, then keep checking health and hot-swap collections."""
+    delay = 1.0
+    while True:
+        try:
+            if client is None:
+                mongo_state["attempts"] += 1
+                new_client = await asyncio.to_thread(_mongo_open)
+                _mongo_attach(new_client)
+                logging.info("MongoDB: connected and collections initialized (attempt %s)", mongo_state["attempts"])
+                await _provision_mongo_indexes()
+            else:
+                await asyncio.to_thread(client.admin.command, 'ping')
+                if submissions_collection is None:
+                    _mongo_attach(client)
+                    logging.info("MongoDB: reachable again, collections restored")
+            if mongo_state["status"] != "connected":
+                mongo_state["connected_at"] = datetime.now(timezone.utc).isoformat()
+            mongo_state["status"] = "connected"
+            mongo_state["last_error"] = None
+            delay = 1.0
+            await asyncio.sleep(MONGO_HEALTH_INTERVAL_SECONDS)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            mongo_state["last_error"] = str(e)
+            if mongo_state["status"] == "connected":
+                logging.error("MongoDB: lost connection: %s", e)
+                _mongo_detach()
+                mongo_state["status"] = "unavailable"
+            else:
+                logging.error("MongoDB: connection failed (retry in %.0fs): %s", delay, e)
+                mongo_state["status"] = "unavailable" if mongo_state["attempts"] > 1 else "connecting"
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MONGO_RECONNECT_MAX_SECONDS)
+
+
+async def _provision_mongo_indexes():
+    # index builds and explain() are blocking pymongo calls: keep them off the event loop
+    self_check = os.getenv("MONGO_INDEX_SELF_CHECK", "1") != "0"
     try:
-        client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=3000)
-        # try ping
-        client.admin.command('ping')
-        db = client["quiz_merdeka"]
-        submissions_collection = db["submissions"]
-        leaderboard_collection = db["leaderboard"]
-        logging.info("MongoDB: connected and collections initialized")
+        await asyncio.to_thread(mongo_indexes.provision, db, self_check)
     except Exception as e:
-        logging.error("MongoDB: connection failed: %s", e)
-else:
-    logging.warning("MONGODB_URI not set; MongoDB integration disabled")
+        logging.error("MongoDB: index provisioning failed: %s", e)
 
 
 # Background task: weekly leaderboard reset
@@ -150,6 +311,7 @@ async def _weekly_leaderboard_reset_loop():
                     try:
                         res = leaderboard_collection.delete_many({})
                         logging.info("Weekly reset: removed %s leaderboard entries", getattr(res, 'deleted_count', 'unknown'))
+                        _invalidate_leaderboard()
                     except Exception as e:
                         logging.error("Weekly reset delete failed: %s", e)
 
@@ -174,6 +336,11 @@ async def _start_background_tasks():
         app.state.bg_tasks = []
     task = asyncio.create_task(_weekly_leaderboard_reset_loop())
     app.state.bg_tasks.append(task)
+    if MONGODB_URI:
+        app.state.bg_tasks.append(asyncio.create_task(_mongo_connect_loop()))
+    if question_bank.BANK_RELOAD_INTERVAL_SECONDS > 0:
+        app.state.bg_tasks.append(asyncio.create_task(question_bank_store.watch()))
+    app.state.bg_tasks.append(asyncio.create_task(question_stats_store.run(_question_stats_collection)))
 
 
 @app.on_event("shutdown")
@@ -186,6 +353,16 @@ async def _stop_background_tasks():
             pass
     # wait briefly for cancellation
     await asyncio.sleep(0.1)
+    try:
+        await asyncio.to_thread(question_stats_store.flush, _question_stats_collection())
+    except Exception as e:
+        logging.error("question_stats: final flush failed: %s", e)
+    if client is not None:
+        try:
+            client.close()
+        except Exception:
+            pass
+    logging_setup.shutdown()
 
 class QuizAnswer(BaseModel):
     email: str
@@ -214,7 +391,7 @@ async def submit_quiz(request: Request):
         logging.error("/quiz/submit: failed to parse JSON body: %s", e)
         return {"error": "invalid json"}
 
-    logging.info("/quiz/submit called with raw payload: %s", data)
+    logging_setup.log_sampled(logging.DEBUG, "/quiz/submit called with raw payload: %s", data)
     # normalize fields from possibly different client shapes
     def _get(k, default=None):
         return data.get(k, data.get(k.lower(), default))
@@ -230,6 +407,8 @@ async def submit_quiz(request: Request):
     question = _get('question')
     answer = _get('answer')
     date = _get('date')
+    # optional per-question outcome vector (see question_stats.py)
+    outcomes = question_stats.parse_outcomes(_get('outcomes'), question_of=_bank_question)
     # Rebuild a lightweight dict to use below similar to previous `data` object
     class _D: pass
     data = _D()
@@ -269,14 +448,15 @@ async def submit_quiz(request: Request):
     else:
         # 1. Kirim jawaban ke AI (unli.dev)
         try:
-            ai_response = requests.post(
-                "https://api.unli.dev/evaluate",
+            ai_response = (await _upstream_call(
+                "unli.dev", "evaluate", "POST", f"{UNLI_API_BASE}/evaluate",
                 json={"question": data.question, "answer": data.answer, "api_key": UNLI_API_KEY},
                 timeout=6
-            ).json()
+            )).json()
             score = ai_response.get("score", 0)
             feedback = ai_response.get("feedback", "Jawabanmu menarik!")
         except Exception:
+            metrics.count_fallback("/quiz/submit", "evaluate_failed")
             score = 0
             feedback = "Jawabanmu disimpan"
 
@@ -311,12 +491,18 @@ async def submit_quiz(request: Request):
         "feedback": feedback,
         "created_at": __import__('datetime').datetime.utcnow()
     }
+    if outcomes:
+        submission["outcomes"] = outcomes
+        question_stats_store.record(outcomes, _bank_level)
     inserted_id = None
     try:
         if submissions_collection is not None:
             res = submissions_collection.insert_one(submission)
             inserted_id = getattr(res, 'inserted_id', None)
-            logging.info("Inserted submission id=%s for email=%s", inserted_id, data.email)
+            if inserted_id is not None:
+                # the result page and the email link will ask for it next
+                submission_cache.set(str(inserted_id), _public_submission({**submission, "_id": inserted_id}))
+            logging.debug("Inserted submission id=%s for email=%s", inserted_id, data.email)
         else:
             logging.warning("Submissions collection not initialized; skipping insert")
     except Exception as e:
@@ -325,7 +511,7 @@ async def submit_quiz(request: Request):
     # 3. Update leaderboard in MongoDB (keep best score per email)
     try:
         leaderboard_entry = leaderboard_collection.find_one({"email": data.email}) if leaderboard_collection is not None else None
-        logging.info("Existing leaderboard entry for %s: %s", data.email, bool(leaderboard_entry))
+        logging.debug("Existing leaderboard entry for %s: %s", data.email, bool(leaderboard_entry))
     except Exception as e:
         logging.error("Error reading leaderboard entry for %s: %s", data.email, e)
         leaderboard_entry = None
@@ -346,7 +532,7 @@ async def submit_quiz(request: Request):
                             "updated_at": __import__('datetime').datetime.utcnow()
                         }}
                     )
-                    logging.info("Updated leaderboard for %s, matched=%s modified=%s", data.email, getattr(res, 'matched_count', None), getattr(res, 'modified_count', None))
+                    logging.debug("Updated leaderboard for %s, matched=%s modified=%s", data.email, getattr(res, 'matched_count', None), getattr(res, 'modified_count', None))
                 except Exception as e:
                     logging.error("Failed to update leaderboard for %s: %s", data.email, e)
     else:
@@ -363,9 +549,10 @@ async def submit_quiz(request: Request):
                         "date": date_str,
                         "created_at": __import__('datetime').datetime.utcnow()
                     })
-                    logging.info("Inserted leaderboard entry id=%s for email=%s", getattr(res, 'inserted_id', None), data.email)
+                    logging.debug("Inserted leaderboard entry id=%s for email=%s", getattr(res, 'inserted_id', None), data.email)
             except Exception as e:
                 logging.error("Failed to insert leaderboard entry for %s: %s", data.email, e)
+    _invalidate_leaderboard()
 
     # 4. Kirim hasil ke email via mailry.co (non-blocking)
     try:
@@ -432,7 +619,7 @@ async def submit_quiz(request: Request):
             if MAILRY_API_KEY:
                 headers["Authorization"] = f"Bearer {MAILRY_API_KEY}"
             try:
-                requests.post(target_url, json=mail_payload, headers=headers, timeout=5)
+                await _upstream_call("mailry", "send", "POST", target_url, json=mail_payload, headers=headers, timeout=5)
             except Exception:
                 # non-blocking: ignore failures here
                 pass
@@ -564,7 +751,7 @@ async def send_result_email(request: Request):
         headers['Authorization'] = f"Bearer {MAILRY_API_KEY}"
 
     try:
-        resp = requests.post(target_url, json=mail_payload, headers=headers, timeout=8)
+        resp = await _upstream_call("mailry", "send", "POST", target_url, json=mail_payload, headers=headers, timeout=8)
         if not resp.ok:
             logging.error('mailry send failed status=%s body=%s url=%s', resp.status_code, resp.text, target_url)
             # common misconfiguration: somebody pasted a "setup" or dashboard URL instead of the API endpoint
@@ -604,32 +791,111 @@ async def send_result_email(request: Request):
     return { 'ok': True }
 
 
+# Result pages and the /result?id= links in every email resolve submissions by id; submissions never change
+# after insert, so the public fields are cached (filled by submit_quiz, read-through otherwise)
+submission_cache = TTLCache(
+    maxsize=int(os.getenv("SUBMISSION_CACHE_ENTRIES", "5000")),
+    ttl=int(os.getenv("SUBMISSION_CACHE_TTL_SECONDS", "3600")),
+)
+SUBMISSION_FIELDS = ("name", "email", "score", "percentage", "totalQuestions", "timeSpent", "difficulty", "date", "feedback")
+SUBMISSION_BATCH_MAX = 100
+
+
+def _public_submission(doc):
+    """The fields result pages may see, keyed like the frontend expects."""
+    out = {"id": str(doc.get("_id"))}
+    out.update((f, doc.get(f)) for f in SUBMISSION_FIELDS)
+    return out
+
+
 @app.get("/quiz/submission/{submission_id}")
 async def get_submission(submission_id: str):
+    if not ObjectId.is_valid(submission_id):
+        raise HTTPException(status_code=400, detail="invalid id")
+    cached = submission_cache.get(submission_id)
+    if cached is not None:
+        return cached
     if submissions_collection is None:
         raise HTTPException(status_code=503, detail="database unavailable")
     try:
-        doc = submissions_collection.find_one({"_id": ObjectId(submission_id)})
-    except Exception:
-        raise HTTPException(status_code=400, detail="invalid id")
+        doc = await asyncio.to_thread(submissions_collection.find_one, {"_id": ObjectId(submission_id)},
+                                      {f: 1 for f in SUBMISSION_FIELDS})
+    except Exception as e:
+        logging.error("get_submission: lookup of %s failed: %s", submission_id, e)
+        raise HTTPException(status_code=503, detail="database unavailable")
     if not doc:
         raise HTTPException(status_code=404, detail="submission not found")
-    # sanitize and return
-    return {
-        "id": str(doc.get("_id")),
-        "name": doc.get("name"),
-        "email": doc.get("email"),
-        "score": doc.get("score"),
-        "percentage": doc.get("percentage"),
-        "totalQuestions": doc.get("totalQuestions"),
-        "timeSpent": doc.get("timeSpent"),
-        "difficulty": doc.get("difficulty"),
-        "date": doc.get("date"),
-        "feedback": doc.get("feedback")
-    }
+    result = _public_submission(doc)
+    submission_cache.set(submission_id, result)
+    return result
+
+
+class SubmissionBatchRequest(BaseModel):
+    ids: list[str]
+
+
+@app.post("/quiz/submissions/batch")
+async def get_submissions_batch(payload: SubmissionBatchRequest):
+    """Resolve up to SUBMISSION_BATCH_MAX ids: cache hits first, the rest in one `$in` query.
+
+    Returns the found submissions in request order plus the ids that are invalid or unknown.
+    """
+    ids = list(dict.fromkeys(i.strip() for i in payload.ids if isinstance(i, str)))
+    if len(ids) > SUBMISSION_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"at most {SUBMISSION_BATCH_MAX} ids per request")
+    found = {}
+    to_fetch = []
+    for i in ids:
+        cached = submission_cache.get(i) if ObjectId.is_valid(i) else None
+        if cached is not None:
+            found[i] = cached
+        elif ObjectId.is_valid(i):
+            to_fetch.append(ObjectId(i))
+    if to_fetch:
+        if submissions_collection is None:
+            raise HTTPException(status_code=503, detail="database unavailable")
+        try:
+            docs = await asyncio.to_thread(
+                lambda: list(submissions_collection.find({"_id": {"$in": to_fetch}}, {f: 1 for f in SUBMISSION_FIELDS})))
+        except Exception as e:
+            logging.error("get_submissions_batch: lookup of %s ids failed: %s", len(to_fetch), e)
+            raise HTTPException(status_code=503, detail="database unavailable")
+        for doc in docs:
+            result = _public_submission(doc)
+            submission_cache.set(result["id"], result)
+            found[result["id"]] = result
+    return {"submissions": [found[i] for i in ids if i in found], "missing": [i for i in ids if i not in found]}
+
+
+@app.get("/admin/export/submissions")
+async def admin_export_submissions(format: str = "ndjson", start: str | None = None, end: str | None = None,
+                                   week: str | None = None, difficulty: str | None = None,
+                                   after: str | None = None, limit: int | None = None):
+    """Stream submissions as NDJSON or CSV in `_id` order, batch by batch (see exports.py).
+
+    Resume an interrupted export with `after=<last exported id>`.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    try:
+        query = exports.build_query(start, end, week, difficulty)
+        after_id = exports.parse_after(after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if submissions_collection is None:
+        raise HTTPException(status_code=503, detail="database unavailable")
+    label = week or "-".join(p for p in (start, end) if p) or "all"
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        exports.stream_export(lambda: submissions_collection, query, format, after_id, limit),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="submissions-{re.sub(r"[^0-9A-Za-z_-]", "_", label)}.{format}"'},
+    )
+
 
 @app.get("/quiz/fakta")
-async def get_fakta():
+async def get_fakta(request: Request):
+    await rate_limiter.charge(request.scope, request.url.path)
     # Preferensi: gunakan unli.dev (OpenAI-compatible) untuk menghasilkan fakta sejarah singkat
     prompt = (
         "Buatkan satu fakta menarik dan singkat tentang sejarah Indonesia (fokus pada kemerdekaan atau peristiwa penting), "
@@ -639,7 +905,7 @@ async def get_fakta():
     # 1) Coba unli.dev (OpenAI-compatible)
     if UNLI_API_KEY:
         try:
-            url = "https://api.unli.dev/v1/chat/completions"
+            url = f"{UNLI_API_BASE}/v1/chat/completions"
             headers = {"Authorization": f"Bearer {UNLI_API_KEY}", "Content-Type": "application/json"}
             payload = {
                 "model": "auto",
@@ -647,7 +913,7 @@ async def get_fakta():
                 "max_tokens": 150,
                 "temperature": 0.7,
             }
-            resp = requests.post(url, json=payload, headers=headers, timeout=8)
+            resp = await _upstream_call("unli.dev", "fakta", "POST", url, json=payload, headers=headers, timeout=8)
             if resp.ok:
                 j = resp.json()
                 # OpenAI-compatible response shape: choices[0].message.content
@@ -669,15 +935,17 @@ async def get_fakta():
 
     # 2) Fallback ke lunos.tech jika tersedia
     try:
-        resp = requests.get("https://api.lunos.tech/fakta", params={"api_key": LUNOS_API_KEY}, timeout=6)
+        resp = await _upstream_call("lunos.tech", "fakta", "GET", f"{LUNOS_API_BASE}/fakta", params={"api_key": LUNOS_API_KEY}, timeout=6)
         if resp.ok:
             fakta = resp.json().get("fakta")
             if fakta:
+                metrics.count_fallback("/quiz/fakta", "lunos")
                 return {"fakta": fakta}
     except Exception:
         pass
 
     # 3) Default safe message
+    metrics.count_fallback("/quiz/fakta", "default")
     return {"fakta": "Tahukah kamu? Indonesia memproklamasikan kemerdekaan pada 17 Agustus 1945."}
 
 
@@ -705,15 +973,19 @@ async def explain_question(request: Request):
     except Exception:
         correct_choice_text = None
 
-    prompt = (
-        f"Jelaskan secara singkat (1-2 kalimat) mengapa jawaban '{correct_choice_text}' benar untuk pertanyaan berikut dalam bahasa Indonesia:\n\n" \
-        f"{question}\n\nBerikan penjelasan faktual dan mudah dimengerti."
-    )
+    # Bank questions have explanations generated offline; serve them straight from memory
+    if correct_choice_text is not None:
+        precomputed = precomputed_explanations.get(explanation_key(question, correct_choice_text))
+        if precomputed:
+            return {"explanation": precomputed}
+
+    await rate_limiter.charge(request.scope, request.url.path)
+    prompt = explanation_prompt(question, correct_choice_text)
 
     # Try unli.dev first
     if UNLI_API_KEY:
         try:
-            url = "https://api.unli.dev/v1/chat/completions"
+            url = f"{UNLI_API_BASE}/v1/chat/completions"
             headers = {"Authorization": f"Bearer {UNLI_API_KEY}", "Content-Type": "application/json"}
             body = {
                 "model": "auto",
@@ -721,7 +993,7 @@ async def explain_question(request: Request):
                 "max_tokens": 150,
                 "temperature": 0.3,
             }
-            resp = requests.post(url, json=body, headers=headers, timeout=8)
+            resp = await _upstream_call("unli.dev", "explain", "POST", url, json=body, headers=headers, timeout=8)
             if resp.ok:
                 j = resp.json()
                 choices_resp = j.get('choices') or []
@@ -739,23 +1011,34 @@ async def explain_question(request: Request):
 
     # Fallback to lunos.tech if available
     try:
-        resp = requests.post("https://api.lunos.tech/explain", json={"question": question, "choices": choices, "correct_index": correct_index, "api_key": LUNOS_API_KEY}, timeout=6)
+        resp = await _upstream_call("lunos.tech", "explain", "POST", f"{LUNOS_API_BASE}/explain", json={"question": question, "choices": choices, "correct_index": correct_index, "api_key": LUNOS_API_KEY}, timeout=6)
         if resp.ok:
             j = resp.json()
             if isinstance(j, dict) and j.get('explanation'):
+                metrics.count_fallback("/quiz/explain", "lunos")
                 return {"explanation": j.get('explanation')}
     except Exception:
         pass
 
     # Last-resort default explanation
     fallback = f"Jawaban yang benar adalah '{correct_choice_text}'. Penjelasan: ini sesuai dengan fakta sejarah dan sumber yang umum diketahui terkait topik tersebut."
+    metrics.count_fallback("/quiz/explain", "default")
     return {"explanation": fallback}
 
 
+CHAT_INSTRUCTIONS = (
+    "Jawab pertanyaan berikut dalam bahasa Indonesia dengan ringkas dan faktual (1-3 kalimat). "
+    "Topik: sejarah Indonesia (khususnya kemerdekaan dan peristiwa penting)."
+)
+
+
 @app.post("/quiz/chat")
 async def quiz_chat(request: Request):
     """Simple chat endpoint for history Q&A. Expects JSON { question: str } and returns { answer: str }.
     Uses unli.dev (OpenAI-compatible) when available, otherwise falls back to lunos.tech or a safe default.
+
+    Clients that send a `session_id` key (null on the first message) get multi-turn context and the id to use
+    next time in the response; see chat_sessions.py. Requests without the key stay stateless.
     """
     try:
         payload = await request.json()
@@ -766,24 +1049,43 @@ async def quiz_chat(request: Request):
     if not question:
         raise HTTPException(status_code=400, detail="missing question")
 
-    prompt = (
-        "Jawab pertanyaan berikut dalam bahasa Indonesia dengan ringkas dan faktual (1-3 kalimat). "
-        "Topik: sejarah Indonesia (khususnya kemerdekaan dan peristiwa penting)."
-        f"\n\nPertanyaan: {question}\n\nJawaban:"
-    )
+    session = chat_session_store.get_or_create(payload.get('session_id')) if 'session_id' in payload else None
+    follow_up = session is not None and not session.is_new
+
+    def _reply(answer, remember=True):
+        out = {"answer": answer}
+        if session is not None:
+            if remember:
+                chat_session_store.add_turn(session, question, answer)
+            out["session_id"] = session.id
+        return out
+
+    # Popular questions are answered from memory; only real AI answers are cached (never the last-resort text).
+    # Follow-ups ("lalu siapa wakilnya?") depend on the conversation, so they bypass the cache both ways.
+    if not follow_up:
+        cached = chat_answer_cache.lookup(question)
+        if cached is not None:
+            return _reply(cached[0])
+
+    await rate_limiter.charge(request.scope, request.url.path)
+    prompt = f"{CHAT_INSTRUCTIONS}\n\nPertanyaan: {question}\n\nJawaban:"
+    if follow_up:
+        messages = session.messages(CHAT_INSTRUCTIONS) + [{"role": "user", "content": question}]
+    else:
+        messages = [{"role": "user", "content": prompt}]
 
     # Try unli.dev (OpenAI-compatible)
     if UNLI_API_KEY:
         try:
-            url = "https://api.unli.dev/v1/chat/completions"
+            url = f"{UNLI_API_BASE}/v1/chat/completions"
             headers = {"Authorization": f"Bearer {UNLI_API_KEY}", "Content-Type": "application/json"}
             body = {
                 "model": "auto",
-                "messages": [{"role": "user", "content": prompt}],
+                "messages": messages,
                 "max_tokens": 300,
                 "temperature": 0.3,
             }
-            resp = requests.post(url, json=body, headers=headers, timeout=10)
+            resp = await _upstream_call("unli.dev", "chat", "POST", url, json=body, headers=headers, timeout=10)
             if resp.ok:
                 j = resp.json()
                 choices = j.get('choices') or []
@@ -795,22 +1097,31 @@ async def quiz_chat(request: Request):
                     else:
                         text = first.get('text')
                     if text:
-                        return {"answer": text.strip()}
+                        answer = text.strip()
+                        if not follow_up:
+                            chat_answer_cache.store(question, answer)
+                        return _reply(answer)
         except Exception:
             logging.exception("quiz_chat: unli.dev call failed")
 
     # Fallback to lunos.tech
     try:
-        resp = requests.post("https://api.lunos.tech/chat", json={"question": question, "api_key": LUNOS_API_KEY}, timeout=8)
+        # lunos.tech takes a single question string: prepend the compact context for follow-ups
+        lunos_question = f"Konteks percakapan:\n{session.context_text()}\n\nPertanyaan: {question}" if follow_up else question
+        resp = await _upstream_call("lunos.tech", "chat", "POST", f"{LUNOS_API_BASE}/chat", json={"question": lunos_question, "api_key": LUNOS_API_KEY}, timeout=8)
         if resp.ok:
             j = resp.json()
             if isinstance(j, dict) and j.get('answer'):
-                return {"answer": j.get('answer')}
+                if not follow_up:
+                    chat_answer_cache.store(question, j.get('answer'))
+                metrics.count_fallback("/quiz/chat", "lunos")
+                return _reply(j.get('answer'))
     except Exception:
         logging.exception("quiz_chat: lunos.tech call failed")
 
     # Last resort
-    return {"answer": "Maaf, saya sedang tidak bisa menghubungi layanan AI. Coba lagi nanti atau cek sumber sejarah terpercaya."}
+    metrics.count_fallback("/quiz/chat", "default")
+    return _reply("Maaf, saya sedang tidak bisa menghubungi layanan AI. Coba lagi nanti atau cek sumber sejarah terpercaya.", remember=False)
 
 
 @app.post("/chat")
@@ -819,14 +1130,97 @@ async def chat(request: Request):
     # Delegate to existing handler to avoid code duplication
     return await quiz_chat(request)
 
-@app.get("/quiz/leaderboard")
-async def leaderboard():
-    # Fetch enriched leaderboard from MongoDB, sorted by score desc
-    try:
-        docs = list(leaderboard_collection.find().sort("score", -1)) if leaderboard_collection is not None else []
-    except Exception as e:
-        logging.error("Failed to fetch leaderboard: %s", e)
-        docs = []
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of this worker's metrics."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: 200 when the database is connected (or not configured), 503 while it is not."""
+    ready = mongo_state["status"] in ("connected", "disabled")
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "mongo": dict(mongo_state)})
+
+
+@app.get("/admin/profiles")
+async def admin_profiles():
+    """List recent request profiles (newest first) with their wall-time split."""
+    return {"profiles": await asyncio.to_thread(profile_store.list)}
+
+
+@app.get("/admin/profiles/{filename}")
+async def admin_profile_download(filename: str):
+    """Download `<id>.collapsed` (flamegraph.pl / speedscope) or `<id>.json` for a recorded profile."""
+    path = profile_store.path_for(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    media_type = "application/json" if filename.endswith(".json") else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=filename)
+
+
+@app.get("/admin/chat-cache")
+async def admin_chat_cache(limit: int = 50):
+    """Inspect the /quiz/chat answer cache: counters plus the most recently used entries."""
+    return {"stats": chat_answer_cache.stats(), "entries": chat_answer_cache.entries(limit)}
+
+
+@app.get("/admin/chat-sessions")
+async def admin_chat_sessions():
+    """Counters of the /quiz/chat session store (sessions, characters held, created, evicted)."""
+    return chat_session_store.stats()
+
+
+@app.delete("/admin/chat-cache")
+async def admin_chat_cache_purge(question: str | None = None):
+    """Purge the cached answer for `question` (matched on its normalized form), or the whole cache when omitted."""
+    removed = chat_answer_cache.purge(question)
+    logging.info("admin_chat_cache_purge: removed %s entries (question=%s)", removed, question)
+    return {"removed": removed}
+
+
+@app.get("/admin/question-stats")
+async def admin_question_stats(level: str | None = None, min_attempts: int = 0, sort: str = "p_correct", limit: int = 100):
+    """Per-question correctness for the bank, from memory (flushed to `question_stats` in the background).
+
+    `sort`: p_correct (hardest first), -p_correct (easiest first), attempts or avg_ms (most first).
+    """
+    rows = []
+    for qid in question_stats_store.question_ids():
+        found = question_bank_store.find(qid)
+        if found is None or (level and found[0] != level):
+            continue
+        stats = question_stats_store.stats(qid)
+        if stats["attempts"] < min_attempts:
+            continue
+        rows.append({"id": qid, "level": found[0], "question": found[1].text(found[2]), **stats})
+    field = sort.lstrip("-")
+    if field not in ("p_correct", "attempts", "avg_ms"):
+        raise HTTPException(status_code=400, detail="sort must be p_correct, -p_correct, attempts or avg_ms")
+    reverse = sort.startswith("-") if field == "p_correct" else True
+    rows.sort(key=lambda r: (r[field] is not None, r[field] or 0) if reverse else (r[field] is None, r[field] or 0), reverse=reverse)
+    return {"summary": question_stats_store.summary(), "questions": rows[:max(1, min(limit, 1000))]}
+
+
+# The rendered leaderboard is read from Mongo (off the event loop) at most once per LEADERBOARD_CACHE_SECONDS
+# per worker and dropped when this worker changes the leaderboard; its compressed variants are cached too.
+LEADERBOARD_CACHE_SECONDS = float(os.getenv("LEADERBOARD_CACHE_SECONDS", "5"))
+leaderboard_cache = TTLCache(maxsize=1, ttl=LEADERBOARD_CACHE_SECONDS)
+leaderboard_bodies = compression.PrecompressedCache()
+_leaderboard_lock = asyncio.Lock()
+_leaderboard_version = 0
+
+
+def _invalidate_leaderboard():
+    global _leaderboard_version
+    _leaderboard_version += 1
+    leaderboard_cache.clear()
+
+
+def _render_leaderboard():
+    """The leaderboard as JSON bytes (blocking). Raises when Mongo fails."""
+    # Fetch enriched leaderboard from MongoDB, sorted by score desc (faster time wins ties)
+    docs = list(leaderboard_collection.find().sort([("score", -1), ("timeSpent", 1)])) if leaderboard_collection is not None else []
     result = []
     for idx, entry in enumerate(docs, start=1):
         result.append({
@@ -840,7 +1234,26 @@ async def leaderboard():
             "timeSpent": entry.get("timeSpent", None),
             "date": entry.get("date", None)
         })
-    return result
+    return json_dumps(result)
+
+
+@app.get("/quiz/leaderboard")
+async def leaderboard(request: Request):
+    body = leaderboard_cache.get("body")
+    if body is None:
+        async with _leaderboard_lock:  # concurrent misses share one read
+            body = leaderboard_cache.get("body")
+            if body is None:
+                version = _leaderboard_version
+                try:
+                    body = await asyncio.to_thread(_render_leaderboard)
+                except Exception as e:
+                    logging.error("Failed to fetch leaderboard: %s", e)
+                    return leaderboard_bodies.response(request, b"[]")
+                # a submit that landed during the read made this body stale already
+                if LEADERBOARD_CACHE_SECONDS > 0 and version == _leaderboard_version:
+                    leaderboard_cache.set("body", body)
+    return leaderboard_bodies.response(request, body)
 
 
 @app.get("/admin/mailry/test")
@@ -896,7 +1309,7 @@ async def admin_mailry_test(to: str | None = None, name: str | None = None, emai
         headers['Authorization'] = f"Bearer {MAILRY_API_KEY}"
 
     try:
-        resp = requests.post(target_url, json=mail_payload, headers=headers, timeout=10)
+        resp = await _upstream_call("mailry", "test", "POST", target_url, json=mail_payload, headers=headers, timeout=10)
         text = resp.text if isinstance(resp.text, str) else str(resp.text)
         # return a bounded snippet to avoid huge HTML dumps
         snippet = text[:4000]
@@ -919,247 +1332,372 @@ async def admin_mailry_test(to: str | None = None, name: str | None = None, emai
         raise HTTPException(status_code=502, detail=f'failed to call mail service: {e}')
 
 
+# Simple question pool used when the soal/*.json bank for a difficulty is missing or unreadable
+LOCAL_QUESTION_POOL = [
+    {"question": "Siapa proklamator kemerdekaan Indonesia?", "choices": ["Sukarno & Hatta", "Sutan Sjahrir", "Tan Malaka", "Sudirman"], "answer": 0},
+    {"question": "Tanggal berapakah Indonesia memproklamasikan kemerdekaan?", "choices": ["17 Agustus 1945", "10 November 1945", "1 Juni 1945", "28 Oktober 1928"], "answer": 0},
+    {"question": "Siapa yang menjahit bendera Merah Putih yang dikibarkan saat proklamasi?", "choices": ["Fatmawati", "R.A. Kartini", "Cut Nyak Dien", "Dewi Sartika"], "answer": 0},
+    {"question": "Dimanakah teks proklamasi resmi dibacakan?", "choices": ["Di Jalan Pegangsaan Timur 56", "Di Istana Merdeka", "Di Alun-alun Kota", "Di Gedung Sate"], "answer": 0},
+    {"question": "Apa nama lagu kebangsaan Indonesia?", "choices": ["Indonesia Raya", "Bagimu Negeri", "Halo-Halo Bandung", "Tanah Airku"], "answer": 0},
+    {"question": "Siapakah Pangeran Diponegoro dalam sejarah Indonesia?", "choices": ["Pemimpin Perang Jawa melawan VOC", "Presiden pertama Indonesia", "Pahlawan Kemerdekaan 1945", "Pendiri Budi Utomo"], "answer": 0},
+    {"question": "Peristiwa 10 November diperingati sebagai hari apa?", "choices": ["Hari Pahlawan", "Hari Pendidikan Nasional", "Hari Kebangkitan Nasional", "Hari Proklamasi"], "answer": 0},
+    {"question": "Apa tujuan Sumpah Pemuda 1928?", "choices": ["Persatuan bangsa Indonesia", "Mendirikan negara baru", "Menggulingkan penjajah", "Membentuk tentara"], "answer": 0},
+    {"question": "Siapa tokoh yang memimpin pertempuran di Surabaya 1945?", "choices": ["Sudirman", "Sukarno", "Hatta", "Sutan Sjahrir"], "answer": 0},
+    {"question": "Apa nama perjanjian yang mengakui kedaulatan Indonesia pada 1949?", "choices": ["Perjanjian Konferensi Meja Bundar", "Perjanjian Linggarjati", "Perjanjian Roem-Royen", "Perjanjian Renville"], "answer": 0},
+    {"question": "Siapakah Cut Nyak Dien terkenal karena?", "choices": ["Perlawanan terhadap penjajah di Aceh", "Menciptakan lagu kebangsaan", "Mendirikan sekolah wanita", "Menjadi presiden"], "answer": 0},
+    {"question": "Apa tujuan Budi Utomo saat didirikan?", "choices": ["Mengangkat pendidikan dan kebudayaan pribumi", "Menjadi organisasi militer", "Menyerang VOC", "Membentuk partai politik"], "answer": 0},
+    {"question": "Peran unsur pemuda dalam kebangkitan nasional terlihat pada?", "choices": ["Sumpah Pemuda 1928", "Proklamasi 1945", "Konferensi Meja Bundar", "Perjanjian Renville"], "answer": 0},
+    {"question": "Siapa yang dikenal sebagai Panglima Besar Tentara Nasional Indonesia?", "choices": ["Sudirman", "Sukarno", "Hatta", "Soedirman"], "answer": 0},
+]
+
+# parsed once and pre-encoded; a watcher swaps in new snapshots when a soal file changes
+question_bank_store = question_bank.QuestionBank(fallback=LOCAL_QUESTION_POOL)
+
+# per-question correctness from submitted outcome vectors; optionally steers the sampler
+question_stats_store = question_stats.QuestionStats()
+_sample_weight = question_stats_store.weight if question_stats.QUESTION_STATS_BALANCE else None
+
+
+def _bank_level(qid):
+    found = question_bank_store.find(qid)
+    return found[0] if found else None
+
+
+def _bank_question(qid):
+    """The bank question with id `qid` (text, choices in file order, answer index), or None."""
+    found = question_bank_store.find(qid)
+    return found[1].question(found[2]) if found else None
+
+
+def _question_stats_collection():
+    return db["question_stats"] if db is not None else None
+
+
+def _difficulty_settings(difficulty):
+    """Map a requested difficulty label to (normalized label, question count, minutes, age group)."""
+    diff = (difficulty or "Mudah").lower()
+    if "sulit" in diff or "sukar" in diff or "hard" in diff or "dewasa" in diff:
+        return diff, 20, 12, "dewasa"
+    if "sedang" in diff or "medium" in diff or "smp" in diff or "sma" in diff:
+        return diff, 15, 8, "remaja"
+    # default -> Mudah
+    return diff, 10, 5, "anak"
+
+
+def _questions_prompt(target_count, age_group):
+    return (
+        f"Buatkan {target_count} soal pilihan ganda singkat tentang sejarah Indonesia (campuran topik: kemerdekaan, perang, perjuangan, pahlawan, dan peristiwa penting) yang sesuai untuk {age_group}. "
+        "Setiap soal harus memiliki 4 pilihan, dan jawaban benar direpresentasikan sebagai indeks (0-3). "
+        "Setiap soal singkat, relevan, dan sesuai tingkat kesulitan. Balas hanya dengan JSON yang memiliki kunci: total_questions, time_minutes, questions. "
+        "Contoh format: {\"total_questions\":10, \"time_minutes\":5, \"questions\":[{\"question\":\"...\", \"choices\":[\"...\",...], \"answer\":0}, ...]}"
+    )
+
+
+def _sample_local_questions(diff, target_count, exclude=None):
+    """Sample up to `target_count` questions from the soal/*.json bank for `diff` as plain dicts (see question_bank.py).
+
+    `exclude` is an optional set of question texts the caller already has (used to top up AI sets).
+    """
+    return [p.as_dict() for p in question_bank_store.sample(diff, target_count, exclude=exclude, weight=_sample_weight)]
+
+
+async def _ai_questions_allowed(request, route):
+    """Whether this request may spend an AI call on a question set; otherwise the handler serves the bank."""
+    if upstream_limits.saturated("unli.dev"):
+        metrics.count_fallback(route, "upstream_saturated")
+        return False
+    client = rate_limit.client_id(request.scope)
+    allowed, _ = await rate_limiter.check(client)
+    if not allowed:
+        # not an error for the client, but the AI path is being throttled: make it visible
+        metrics.count_fallback(route, "rate_limited")
+        metrics.RATE_LIMITED.labels(route, "fallback").inc()
+        logging.warning("%s: rate limit reached for %s, serving the local bank instead of the AI", route, client)
+    return allowed
+
+
+async def _ai_question_set(diff, target_count, time_minutes, age_group, route):
+    """One question set from unli.dev as a dict, or None when the AI gave nothing usable (callers use the bank)."""
+    try:
+        prompt = _questions_prompt(target_count, age_group)
+
+        url = f"{UNLI_API_BASE}/v1/chat/completions"
+        headers = {"Authorization": f"Bearer {UNLI_API_KEY}", "Content-Type": "application/json"}
+        payload_body = {
+            "model": "auto",
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 1200,
+            "temperature": 0.6,
+        }
+        resp = await _upstream_call("unli.dev", "questions", "POST", url, json=payload_body, headers=headers, timeout=10)
+        if resp.ok:
+            j = resp.json()
+            content = None
+            choices = j.get("choices") or []
+            if len(choices):
+                first = choices[0]
+                msg = first.get("message")
+                if isinstance(msg, dict):
+                    content = msg.get("content")
+                else:
+                    content = first.get("text")
+
+            if content:
+                # Whole-document JSON or not (markdown, a broken item), every item goes through the same checks;
+                # usable questions are kept and the set is topped up from the bank
+                try:
+                    parsed = json.loads(content)
+                    items = parsed.get("questions") if isinstance(parsed, dict) else None
+                    items = items if isinstance(items, list) else []
+                    dropped = 0
+                except Exception:
+                    parser = IncrementalQuestionParser()
+                    items = parser.feed(content)
+                    dropped = parser.invalid_items
+                valid = []
+                seen = set()
+                for q in (validate_question(o) for o in items):
+                    if q is None or q["question"] in seen:
+                        dropped += 1
+                        continue
+                    seen.add(q["question"])
+                    valid.append(q)
+                if valid:
+                    valid = valid[:target_count]
+                    if dropped or len(valid) < target_count:
+                        metrics.count_fallback(route, "ai_partial")
+                        valid.extend(_sample_local_questions(diff, target_count - len(valid), exclude=seen))
+                    return {"total_questions": len(valid), "time_minutes": time_minutes, "questions": valid}
+    except Exception:
+        pass
+    return None
+
+
+# An AI question set is reused for AI_SET_CACHE_SECONDS (0 = never) by requests for the same difficulty, so a
+# class starting together costs one completion. Everyone in that window gets the same questions; each response
+# shuffles the question and choice order, so neighbours do not see the same answer letters.
+AI_SET_CACHE_SECONDS = float(os.getenv("AI_SET_CACHE_SECONDS", "30"))
+ai_question_sets = TTLCache(maxsize=4, ttl=AI_SET_CACHE_SECONDS)
+
+
+def _shuffled_set(question_set):
+    """A per-response copy of a question set with questions and choices reordered and answers remapped."""
+    questions = []
+    for q in question_set["questions"]:
+        order = list(range(len(q["choices"])))
+        random.shuffle(order)
+        questions.append({**q, "choices": [q["choices"][i] for i in order], "answer": order.index(q["answer"])})
+    random.shuffle(questions)
+    return {**question_set, "questions": questions}
+
+
 @app.post("/quiz/questions")
-async def quiz_questions(payload: QuestionsRequest):
+async def quiz_questions(payload: QuestionsRequest, request: Request):
     """Return a small set of questions. This is a simple local generator.
     The frontend expects: { questions: [{ question, choices, answer }, ...] }
     """
-    # Simple question pool (can be replaced by AI generation or external API)
-    pool = [
-        {"question": "Siapa proklamator kemerdekaan Indonesia?", "choices": ["Sukarno & Hatta", "Sutan Sjahrir", "Tan Malaka", "Sudirman"], "answer": 0},
-        {"question": "Tanggal berapakah Indonesia memproklamasikan kemerdekaan?", "choices": ["17 Agustus 1945", "10 November 1945", "1 Juni 1945", "28 Oktober 1928"], "answer": 0},
-        {"question": "Siapa yang menjahit bendera Merah Putih yang dikibarkan saat proklamasi?", "choices": ["Fatmawati", "R.A. Kartini", "Cut Nyak Dien", "Dewi Sartika"], "answer": 0},
-        {"question": "Dimanakah teks proklamasi resmi dibacakan?", "choices": ["Di Jalan Pegangsaan Timur 56", "Di Istana Merdeka", "Di Alun-alun Kota", "Di Gedung Sate"], "answer": 0},
-        {"question": "Apa nama lagu kebangsaan Indonesia?", "choices": ["Indonesia Raya", "Bagimu Negeri", "Halo-Halo Bandung", "Tanah Airku"], "answer": 0},
-        {"question": "Siapakah Pangeran Diponegoro dalam sejarah Indonesia?", "choices": ["Pemimpin Perang Jawa melawan VOC", "Presiden pertama Indonesia", "Pahlawan Kemerdekaan 1945", "Pendiri Budi Utomo"], "answer": 0},
-        {"question": "Peristiwa 10 November diperingati sebagai hari apa?", "choices": ["Hari Pahlawan", "Hari Pendidikan Nasional", "Hari Kebangkitan Nasional", "Hari Proklamasi"], "answer": 0},
-        {"question": "Apa tujuan Sumpah Pemuda 1928?", "choices": ["Persatuan bangsa Indonesia", "Mendirikan negara baru", "Menggulingkan penjajah", "Membentuk tentara"], "answer": 0},
-        {"question": "Siapa tokoh yang memimpin pertempuran di Surabaya 1945?", "choices": ["Sudirman", "Sukarno", "Hatta", "Sutan Sjahrir"], "answer": 0},
-        {"question": "Apa nama perjanjian yang mengakui kedaulatan Indonesia pada 1949?", "choices": ["Perjanjian Konferensi Meja Bundar", "Perjanjian Linggarjati", "Perjanjian Roem-Royen", "Perjanjian Renville"], "answer": 0},
-        {"question": "Siapakah Cut Nyak Dien terkenal karena?", "choices": ["Perlawanan terhadap penjajah di Aceh", "Menciptakan lagu kebangsaan", "Mendirikan sekolah wanita", "Menjadi presiden"], "answer": 0},
-        {"question": "Apa tujuan Budi Utomo saat didirikan?", "choices": ["Mengangkat pendidikan dan kebudayaan pribumi", "Menjadi organisasi militer", "Menyerang VOC", "Membentuk partai politik"], "answer": 0},
-        {"question": "Peran unsur pemuda dalam kebangkitan nasional terlihat pada?", "choices": ["Sumpah Pemuda 1928", "Proklamasi 1945", "Konferensi Meja Bundar", "Perjanjian Renville"], "answer": 0},
-        {"question": "Siapa yang dikenal sebagai Panglima Besar Tentara Nasional Indonesia?", "choices": ["Sudirman", "Sukarno", "Hatta", "Soedirman"], "answer": 0},
-    ]
-
     # Determine target number of questions and suggested time based on requested difficulty
-    diff = (payload.difficulty or "Mudah").lower()
-    if "sulit" in diff or "sukar" in diff or "hard" in diff or "dewasa" in diff:
-        target_count = 20
-        time_minutes = 12
-        age_group = "dewasa"
-    elif "sedang" in diff or "medium" in diff or "smp" in diff or "sma" in diff:
-        target_count = 15
-        time_minutes = 8
-        age_group = "remaja"
-    else:
-        # default -> Mudah
-        target_count = 10
-        time_minutes = 5
-        age_group = "anak"
+    diff, target_count, time_minutes, age_group = _difficulty_settings(payload.difficulty)
 
     # Try to ask unli.dev (OpenAI-compatible) to generate a JSON list of questions matching difficulty
     if UNLI_API_KEY:
-        try:
-            prompt = (
-                f"Buatkan {target_count} soal pilihan ganda singkat tentang sejarah Indonesia (campuran topik: kemerdekaan, perang, perjuangan, pahlawan, dan peristiwa penting) yang sesuai untuk {age_group}. "
-                "Setiap soal harus memiliki 4 pilihan, dan jawaban benar direpresentasikan sebagai indeks (0-3). "
-                "Setiap soal singkat, relevan, dan sesuai tingkat kesulitan. Balas hanya dengan JSON yang memiliki kunci: total_questions, time_minutes, questions. "
-                "Contoh format: {\"total_questions\":10, \"time_minutes\":5, \"questions\":[{\"question\":\"...\", \"choices\":[\"...\",...], \"answer\":0}, ...]}"
-            )
-
-            url = "https://api.unli.dev/v1/chat/completions"
-            headers = {"Authorization": f"Bearer {UNLI_API_KEY}", "Content-Type": "application/json"}
-            payload_body = {
-                "model": "auto",
-                "messages": [{"role": "user", "content": prompt}],
-                "max_tokens": 1200,
-                "temperature": 0.6,
-            }
-            resp = requests.post(url, json=payload_body, headers=headers, timeout=10)
-            if resp.ok:
-                j = resp.json()
-                content = None
-                choices = j.get("choices") or []
-                if len(choices):
-                    first = choices[0]
-                    msg = first.get("message")
-                    if isinstance(msg, dict):
-                        content = msg.get("content")
-                    else:
-                        content = first.get("text")
-
-                if content:
-                    # Try to parse JSON out of the assistant content
-                    try:
-                        parsed = json.loads(content)
-                        # basic validation
-                        if isinstance(parsed, dict) and parsed.get("questions"):
-                            return parsed
-                    except Exception:
-                        # if AI included backticks or markdown, try to extract JSON substring
-                        import re
-                        m = re.search(r"\{[\s\S]*\}", content)
-                        if m:
-                            try:
-                                parsed = json.loads(m.group(0))
-                                if isinstance(parsed, dict) and parsed.get("questions"):
-                                    return parsed
-                            except Exception:
-                                pass
-        except Exception:
-            pass
+        question_set = ai_question_sets.get(age_group) if AI_SET_CACHE_SECONDS > 0 else None
+        if question_set is None and await _ai_questions_allowed(request, "/quiz/questions"):
+            question_set = await _ai_question_set(diff, target_count, time_minutes, age_group, "/quiz/questions")
+            if question_set is not None and AI_SET_CACHE_SECONDS > 0:
+                ai_question_sets.set(age_group, question_set)
+        if question_set is not None:
+            return RawJSONResponse(json_dumps(_shuffled_set(question_set)))
+
+    metrics.count_fallback("/quiz/questions", "soal_bank")
+    picks = question_bank_store.sample(diff, target_count, weight=_sample_weight)
+    return RawJSONResponse(question_bank.render_set(picks, len(picks), time_minutes))
+
+
+def _open_question_stream(target_count, age_group):
+    """Start a streamed completion for a question set; returns the open `requests` response or None."""
+    url = f"{UNLI_API_BASE}/v1/chat/completions"
+    headers = {"Authorization": f"Bearer {UNLI_API_KEY}", "Content-Type": "application/json"}
+    body = {
+        "model": "auto",
+        "messages": [{"role": "user", "content": _questions_prompt(target_count, age_group)}],
+        "max_tokens": 1200,
+        "temperature": 0.6,
+        "stream": True,
+    }
+    resp = _upstream("unli.dev", "questions_stream", "POST", url, json=body, headers=headers, timeout=10, stream=True)
+    if not resp.ok:
+        resp.close()
+        return None
+    return resp
 
-    # Fallback: sample from local pool and repeat/trim to reach target_count
-    # Prefer loading from backend/soal JSON files when available for better, labeled pools
-    selected = []
-    soal_dir = os.path.join(os.path.dirname(__file__), "soal")
-    difficulty_file = None
-    if "sulit" in diff:
-        difficulty_file = os.path.join(soal_dir, "sulit.json")
-    elif "sedang" in diff:
-        difficulty_file = os.path.join(soal_dir, "sedang.json")
-    else:
-        difficulty_file = os.path.join(soal_dir, "mudah.json")
 
-    source_questions = None
-    try:
-        if os.path.exists(difficulty_file):
-            with open(difficulty_file, 'r', encoding='utf-8') as f:
-                j = json.load(f)
-                source_questions = j.get('questions') if isinstance(j, dict) else None
-    except Exception:
-        source_questions = None
+@app.post("/quiz/questions/stream")
+async def quiz_questions_stream(payload: QuestionsRequest, request: Request):
+    """Stream a question set as NDJSON so the client can start on question 1 while the rest is generated.
 
-    # fallback to local inline pool if file missing or unreadable
-    if not source_questions:
-        source_questions = pool
+    Lines: {"type":"meta",...} first, then one {"type":"question","source":"ai"|"bank",...} per question,
+    then {"type":"done","count":N}; the meta total_questions is the number of question lines that follow.
+    Items the model gets wrong are replaced by questions from the local bank.
+    """
+    diff, target_count, time_minutes, age_group = _difficulty_settings(payload.difficulty)
+    use_ai = bool(UNLI_API_KEY) and await _ai_questions_allowed(request, "/quiz/questions/stream")
+
+    def _line(obj):
+        return json_dumps(obj) + b"\n"
+
+    async def _events():
+        # the sampler returns fewer than target_count when the level has fewer near-duplicate clusters; sampling
+        # up front announces a count the bank can always complete, whatever the AI delivers
+        picks = question_bank_store.sample(diff, target_count, weight=_sample_weight)
+        total = len(picks)
+        yield _line({"type": "meta", "total_questions": total, "time_minutes": time_minutes})
+        sent = []
+        seen = set()
+        resp = None
+        if use_ai:
+            try:
+                # the slot is held while the completion streams
+                async with upstream_limits.slot("unli.dev"):
+                    resp = await asyncio.to_thread(_open_question_stream, target_count, age_group)
+                    if resp is not None:
+                        parser = IncrementalQuestionParser()
+                        deltas = iter_stream_content(resp)
+                        deadline = asyncio.get_running_loop().time() + QUESTION_STREAM_DEADLINE_SECONDS
+                        while len(sent) < total and asyncio.get_running_loop().time() < deadline:
+                            # the upstream read blocks, so pull each delta on a worker thread
+                            chunk = await asyncio.to_thread(next, deltas, None)
+                            if chunk is None:
+                                break
+                            for obj in parser.feed(chunk):
+                                q = validate_question(obj)
+                                if q is None or q["question"] in seen or len(sent) >= total:
+                                    continue
+                                seen.add(q["question"])
+                                sent.append(q)
+                                yield _line({"type": "question", "source": "ai", **q})
+                        if parser.invalid_items:
+                            logging.info("quiz_questions_stream: dropped %s malformed AI items", parser.invalid_items)
+            except Exception as e:
+                logging.warning("quiz_questions_stream: AI stream failed: %s", e)
+            finally:
+                if resp is not None:
+                    resp.close()
+
+        if len(sent) < total:
+            metrics.count_fallback("/quiz/questions/stream", "soal_bank_topup")
+            if sent:
+                # every AI question rules out at most one cluster, so this still returns total - len(sent)
+                picks = question_bank_store.sample(diff, total - len(sent), exclude=seen, weight=_sample_weight)
+            for p in picks:
+                sent.append(p)
+                yield b'{"type":"question","source":"bank",%b}\n' % p.fields_json()
+        yield _line({"type": "done", "count": len(sent)})
+
+    return StreamingResponse(_events(), media_type="application/x-ndjson")
+
+
+# Live-event rooms: one question set per room, served from memory to every participant (see rooms.py)
+room_store = rooms.RoomStore(lambda: db["rooms"] if db is not None else None,
+                             lambda: db["room_results"] if db is not None else None)
+# question sets stay the same for the room's lifetime: one best-level variant per room and encoding, compressed
+# off the loop; rankings change every second and get their own cache so they never evict a question set
+room_bodies = compression.PrecompressedCache(maxsize=2 * rooms.ROOM_MAX_ACTIVE, ttl=rooms.ROOM_TTL_HOURS * 3600, best=True)
+ranking_bodies = compression.PrecompressedCache(maxsize=2 * rooms.ROOM_MAX_ACTIVE, ttl=60)
+
+
+class RoomCreateRequest(BaseModel):
+    name: str | None = None
+    difficulty: str | None = "Mudah"
 
-    # Build buckets by original answer index so we can sample a balanced set
-    buckets = {0: [], 1: [], 2: [], 3: []}
-    for q in source_questions:
-        try:
-            ans = int(q.get('answer', 0)) if isinstance(q.get('answer', 0), int) or str(q.get('answer', 0)).isdigit() else 0
-        except Exception:
-            ans = 0
-        if ans not in buckets:
-            ans = 0
-        buckets[ans].append(copy.deepcopy(q))
-
-    # target per index: distribute as evenly as possible
-    base = target_count // 4
-    rem = target_count % 4
-    target_per_index = [base + (1 if i < rem else 0) for i in range(4)]
-
-    # pick from each bucket up to its target
-    for idx in range(4):
-        want = target_per_index[idx]
-        have = len(buckets[idx])
-        if have <= want:
-            selected.extend(buckets[idx])
-            buckets[idx] = []
-        else:
-            selected.extend(random.sample(buckets[idx], want))
-            # remove chosen ones
-            chosen_set = set()
-            # remove chosen by identity (simple approach)
-            chosen = set()
-            for c in selected[-want:]:
-                try:
-                    buckets[idx].remove(c)
-                except Exception:
-                    # fallback: ignore
-                    pass
-
-    # if we still need more (not enough variety), fill from remaining questions across buckets
-    remaining_pool = []
-    for arr in buckets.values():
-        remaining_pool.extend(arr)
-    while len(selected) < target_count and remaining_pool:
-        take = random.choice(remaining_pool)
-        selected.append(take)
-        remaining_pool.remove(take)
-
-    # if still short (very small pools), repeat random samples from source_questions
-    while len(selected) < target_count:
-        selected.append(copy.deepcopy(random.choice(source_questions)))
-
-    # Trim to exact target_count
-    selected = selected[:target_count]
-
-    # Now shuffle choices per question and fix answer indexes; also avoid repeating '(variasi N)'
-    try:
-        from collections import Counter
-        counts = Counter()
-        for i, q in enumerate(selected):
-            # defensive copies
-            choices = list(q.get("choices", []))
-            ans_idx = q.get("answer", 0) if isinstance(q.get("answer", 0), int) else 0
-            if not choices:
-                continue
-            # use base question text (strip any existing '(variasi N)')
-            q_text = q.get("question", "")
-            base = re.sub(r"\s*\(variasi\s*\d+\)\s*$", "", q_text)
-            counts[base] += 1
-            if counts[base] > 1:
-                q["question"] = f"{base} (variasi {counts[base]})"
-            else:
-                q["question"] = base
 
-            # determine correct choice string from ans_idx if possible
-            correct_choice = None
-            try:
-                if 0 <= int(ans_idx) < len(choices):
-                    correct_choice = choices[int(ans_idx)]
-            except Exception:
-                correct_choice = None
+class RoomJoinRequest(BaseModel):
+    name: str | None = None
+    email: str | None = None
 
-            # shuffle and compute new index
-            random.shuffle(choices)
-            q["choices"] = choices
-            if correct_choice is not None and correct_choice in choices:
-                q["answer"] = choices.index(correct_choice)
-            else:
-                # ensure correct choice present by inserting at random position
-                insert_at = random.randrange(0, len(choices) + 1)
-                # avoid duplicating if correct_choice is None; then leave as-is and set answer 0
-                if correct_choice:
-                    choices.insert(insert_at, correct_choice)
-                    q["choices"] = choices
-                    q["answer"] = insert_at
-                else:
-                    q["answer"] = 0
-    except Exception:
-        pass
 
-    # final pass: ensure no two questions have identical text for the user
+class RoomResultRequest(BaseModel):
+    name: str | None = None
+    email: str
+    timeSpent: int = 0
+    outcomes: list | None = None
+    token: str | None = None
+
+
+async def _room_or_404(code):
+    room = await room_store.get(code)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Ruangan tidak ditemukan atau sudah berakhir")
+    return room
+
+
+@app.post("/quiz/rooms")
+async def create_room(payload: RoomCreateRequest, request: Request):
+    """Create a room and generate its question set once; participants join with the returned code."""
+    diff, target_count, time_minutes, age_group = _difficulty_settings(payload.difficulty)
+    body = None
+    source = "bank"
+    if UNLI_API_KEY and await _ai_questions_allowed(request, "/quiz/rooms"):
+        question_set = await _ai_question_set(diff, target_count, time_minutes, age_group, "/quiz/rooms")
+        if question_set is not None:
+            body, source = json_dumps(question_set), "ai"
+    if body is None:
+        picks = question_bank_store.sample(diff, target_count, weight=_sample_weight)
+        body = question_bank.render_set(picks, len(picks), time_minutes)
+    room = await room_store.create(payload.difficulty or "Mudah", body, host=payload.name)
+    logging.info("create_room: %s (%s, %s questions from %s)", room.code, room.difficulty, target_count, source)
+    return {**room.info(), "source": source}
+
+
+@app.get("/quiz/rooms/{code}")
+async def room_info(code: str):
+    return (await _room_or_404(code)).info()
+
+
+@app.post("/quiz/rooms/{code}/join")
+async def join_room(code: str, payload: RoomJoinRequest, request: Request):
+    """The room's question set (same shape as /quiz/questions), from memory and compressed once.
+
+    The participant token for submit comes in the X-Room-Token header, so the body stays shared by everyone.
+    """
+    if not rooms.normalize_participant(payload.email):
+        raise HTTPException(status_code=400, detail="Email wajib diisi untuk bergabung ke ruangan")
+    room = await _room_or_404(code)
     try:
-        seen_texts = set()
-        deduped = []
-        for q in selected:
-            q_text = str(q.get("question", "")).strip()
-            base = re.sub(r"\s*\(variasi\s*\d+\)\s*$", "", q_text)
-            candidate = base
-            # if exact text already seen, add an incremental variation suffix until unique
-            if candidate in seen_texts:
-                i = 2
-                new_text = f"{base} (variasi {i})"
-                while new_text in seen_texts:
-                    i += 1
-                    new_text = f"{base} (variasi {i})"
-                q["question"] = new_text
-                seen_texts.add(new_text)
-                deduped.append(q)
-            else:
-                q["question"] = base
-                seen_texts.add(base)
-                deduped.append(q)
-        selected = deduped
-    except Exception:
-        # if dedupe fails for any reason, keep original selection
-        pass
+        token = room_store.join(room, payload.email)
+    except rooms.RoomFull:
+        raise HTTPException(status_code=409, detail="Ruangan sudah penuh")
+    response = room_bodies.response(request, room.body)
+    response.headers["X-Room-Token"] = token
+    return response
 
-    # final shuffle of questions
-    random.shuffle(selected)
 
-    return {"total_questions": target_count, "time_minutes": time_minutes, "questions": selected}
+@app.post("/quiz/rooms/{code}/submit")
+async def submit_room_result(code: str, payload: RoomResultRequest):
+    """Record a participant's result; needs the token from joining the room with the same email.
+
+    The score is graded from `outcomes` against the room's question set (rooms.grade), not taken from the client.
+    """
+    room = await _room_or_404(code)
+    if not rooms.token_valid(room.code, payload.email, payload.token):
+        raise HTTPException(status_code=403, detail="Gabung ke ruangan ini dengan email yang sama sebelum mengirim hasil")
+    outcomes = question_stats.parse_outcomes(payload.outcomes, question_of=_bank_question)
+    if outcomes:
+        question_stats_store.record(outcomes, _bank_level)
+    score, total = rooms.grade(room, payload.outcomes)
+    await room_store.submit(room, {
+        "email": rooms.normalize_participant(payload.email),
+        "name": payload.name,
+        "score": score,
+        "percentage": round(100 * score / total) if total else 0,
+        "totalQuestions": total,
+        "timeSpent": max(0, payload.timeSpent),
+    })
+    return {"ok": True, "room": room.code}
+
+
+@app.get("/quiz/rooms/{code}/ranking")
+async def room_ranking(code: str, request: Request):
+    """Live ranking of the room (best result per participant), refreshed about once a second."""
+    room = await _room_or_404(code)
+    return ranking_bodies.response(request, await room_store.ranking(room))
@@ -0,0 +1,274 @@
+"""In-process metrics with Prometheus text exposition.
+
+Kept dependency-free and cheap enough to leave on in production: every observation is a dict lookup,
+a bisect and a few additions under a per-metric lock. Each worker process keeps its own registry, so
+with several uvicorn workers the scraper sees whichever worker answered `/metrics` (label the target
+per worker or run the scrape against each worker port when exact totals matter).
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from pymongo import monitoring
+
+# Latency buckets (seconds) covering fast cache hits up to slow LLM completions.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values, **kv):
+        if kv:
+            values = tuple(kv[n] for n in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._new_child()
+                    self._children[key] = child
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, key, child):
+        return [f"{self.name}{_fmt_labels(self.labelnames, key)} {_fmt_value(child.value)}"]
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount=1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, key, child):
+        with child._lock:
+            counts = list(child.counts)
+            total_sum = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = 'le="' + _fmt_value(bound) + '"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(total_sum)}")
+        lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template, method and status code.",
+    ("route", "method", "status")))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."))
+UPSTREAM_LATENCY = REGISTRY.register(Histogram(
+    "upstream_request_duration_seconds", "Latency of outbound calls (unli.dev, lunos.tech, Mailry) by outcome.",
+    ("upstream", "operation", "outcome")))
+UPSTREAM_IN_FLIGHT = REGISTRY.register(Gauge(
+    "upstream_requests_in_flight", "Outbound calls currently waiting on an upstream.", ("upstream",)))
+MONGO_LATENCY = REGISTRY.register(Histogram(
+    "mongo_operation_duration_seconds", "MongoDB command latency by command, collection and outcome.",
+    ("command", "collection", "outcome")))
+FALLBACKS = REGISTRY.register(Counter(
+    "fallback_total", "Times a handler answered from a fallback path instead of its primary source.",
+    ("route", "path")))
+RATE_LIMITED = REGISTRY.register(Counter(
+    "rate_limited_total",
+    "AI calls refused by the per-client rate limiter (outcome: rejected = answered 429, fallback = served without AI).",
+    ("route", "outcome")))
+UPSTREAM_REJECTED = REGISTRY.register(Counter(
+    "upstream_saturated_total", "Outbound calls not made because every concurrency slot of the upstream was busy.",
+    ("upstream",)))
+BANK_RELOADS = REGISTRY.register(Counter(
+    "question_bank_reloads_total", "Question bank files reloaded or rejected (invalid) by the watcher.",
+    ("level", "outcome")))
+LOG_RECORDS_DROPPED = REGISTRY.register(Counter(
+    "log_records_dropped_total", "Log records discarded because the logging queue was full."))
+
+
+def count_fallback(route, path):
+    FALLBACKS.labels(route, path).inc()
+
+
+class _UpstreamCall:
+    __slots__ = ("status",)
+
+    def __init__(self):
+        self.status = None
+
+
+@contextmanager
+def track_upstream(upstream, operation):
+    """Time one outbound call. Set `.status` on the yielded object to record the HTTP status class."""
+    call = _UpstreamCall()
+    gauge = UPSTREAM_IN_FLIGHT.labels(upstream)
+    gauge.inc()
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield call
+        outcome = f"{call.status // 100}xx" if call.status else "ok"
+    finally:
+        gauge.dec()
+        UPSTREAM_LATENCY.labels(upstream, operation, outcome).observe(time.perf_counter() - start)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding MONGO_LATENCY; pass it to MongoClient(event_listeners=[...])."""
+
+    _SKIP = frozenset(("ping", "hello", "ismaster", "isMaster", "endSessions", "saslStart", "saslContinue"))
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        if event.command_name in self._SKIP:
+            return
+        coll = event.command.get(event.command_name)
+        self._collections[(event.request_id, event.connection_id)] = coll if isinstance(coll, str) else ""
+
+    def _finish(self, event, outcome):
+        coll = self._collections.pop((event.request_id, event.connection_id), None)
+        if coll is None:
+            return
+        MONGO_LATENCY.labels(event.command_name, coll, outcome).observe(event.duration_micros / 1e6)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency per matched route template (not raw path) and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status_holder = [500]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.labels().inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            HTTP_IN_FLIGHT.labels().dec()
+            route = scope.get("route")
+            # unmatched paths (404s, scanners) share one label value to keep cardinality bounded
+            template = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.labels(template, scope.get("method", ""), status_holder[0]).observe(time.perf_counter() - start)
@@ -0,0 +1,104 @@
+"""Declared MongoDB indexes for quiz_merdeka and a query-plan self-check for the hot queries in main.py."""
+import logging
+import os
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Archived submissions (documents with an `archived_at` date) are removed by Mongo after this many days.
+# Documents without `archived_at` are never touched by the TTL index.
+ARCHIVE_TTL_SECONDS = int(float(os.getenv("SUBMISSIONS_ARCHIVE_TTL_DAYS", "365")) * 24 * 3600)
+
+# collection -> list of (keys, options). Names are explicit so re-running is a no-op.
+INDEXES = {
+    "submissions": [
+        # send_result_email: latest submission for an email
+        ([("email", ASCENDING), ("created_at", DESCENDING)], {"name": "email_created_at"}),
+        ([("archived_at", ASCENDING)], {"name": "archived_at_ttl", "expireAfterSeconds": ARCHIVE_TTL_SECONDS}),
+    ],
+    "leaderboard": [
+        # submit_quiz: best entry per email
+        ([("email", ASCENDING)], {"name": "email"}),
+        # leaderboard(): ranking order
+        ([("score", DESCENDING), ("timeSpent", ASCENDING)], {"name": "score_time"}),
+    ],
+    # rate_limit.MongoWindowStore: one document per client and minute
+    "rate_limits": [
+        ([("expire_at", ASCENDING)], {"name": "expire_at_ttl", "expireAfterSeconds": 0}),
+    ],
+    # rooms.RoomStore: rooms (by code) and per-room best results, both dropped when the room expires
+    "rooms": [
+        ([("expire_at", ASCENDING)], {"name": "expire_at_ttl", "expireAfterSeconds": 0}),
+    ],
+    "room_results": [
+        # RoomStore.ranking: one room's results in ranking order
+        ([("room", ASCENDING), ("score", DESCENDING), ("timeSpent", ASCENDING)], {"name": "room_score_time"}),
+        ([("expire_at", ASCENDING)], {"name": "expire_at_ttl", "expireAfterSeconds": 0}),
+    ],
+}
+
+# Probe queries mirroring the hot paths; the email never matches a real user.
+_PROBE_EMAIL = "index-self-check@example.invalid"
+HOT_QUERIES = [
+    ("leaderboard", "submit_quiz: find_one by email", {"email": _PROBE_EMAIL}, None),
+    ("submissions", "send_result_email: latest by email", {"email": _PROBE_EMAIL}, [("created_at", DESCENDING)]),
+    ("leaderboard", "leaderboard: ranking sort", {}, [("score", DESCENDING), ("timeSpent", ASCENDING)]),
+]
+
+
+def ensure_indexes(db):
+    """Create every declared index. Safe to call on every startup; returns the list of index names ensured."""
+    ensured = []
+    for coll_name, specs in INDEXES.items():
+        coll = db[coll_name]
+        for keys, options in specs:
+            try:
+                ensured.append(f"{coll_name}.{coll.create_index(keys, **options)}")
+            except OperationFailure as e:
+                # e.g. an index with the same keys but different options already exists; leave it for an operator
+                logging.warning("mongo_indexes: could not create %s.%s: %s", coll_name, options.get("name"), e)
+    logging.info("mongo_indexes: ensured %s", ", ".join(ensured) or "nothing")
+    return ensured
+
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for key in ("inputStage", "queryPlan"):
+            if key in plan:
+                yield from _plan_stages(plan[key])
+        for child in plan.get("inputStages") or []:
+            yield from _plan_stages(child)
+
+
+def verify_query_plans(db):
+    """Explain each hot query and warn when its winning plan is a COLLSCAN. Returns {label: [stages]}."""
+    results = {}
+    for coll_name, label, query, sort in HOT_QUERIES:
+        try:
+            cursor = db[coll_name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            cursor = cursor.limit(1) if query else cursor
+            explain = cursor.explain()
+            winning = (explain.get("queryPlanner") or {}).get("winningPlan") or {}
+            stages = list(_plan_stages(winning))
+        except Exception as e:
+            logging.warning("mongo_indexes: explain failed for %s: %s", label, e)
+            continue
+        results[label] = stages
+        if "COLLSCAN" in stages:
+            logging.warning("mongo_indexes: %s uses a COLLSCAN (plan: %s)", label, " <- ".join(stages))
+        else:
+            logging.info("mongo_indexes: %s plan ok (%s)", label, " <- ".join(stages))
+    return results
+
+
+def provision(db, self_check=True):
+    """Ensure indexes, then optionally run the query-plan self-check. Blocking; run it off the event loop."""
+    ensure_indexes(db)
+    if self_check:
+        return verify_query_plans(db)
+    return {}
@@ -0,0 +1,225 @@
+"""Opt-in per-request sampling profiler writing collapsed-stack files.
+
+A request is profiled when it carries an `X-Profile: <token>` header accepted by the middleware's `token` / `verify`,
+or when its path is in PROFILE_SAMPLE_PATHS and a random draw falls under PROFILE_SAMPLE_RATE.
+
+While a request is profiled a background thread samples the stacks of the event-loop thread and of the
+worker threads every PROFILE_INTERVAL_MS. Each sample is classified so the summary shows where wall time went:
+
+- event_loop_cpu      Python code running on the event loop
+- event_loop_idle     the loop waiting in select/epoll (awaiting I/O or other tasks)
+- blocking_io_on_loop the loop blocked inside a socket/SSL call (sync I/O on the loop stalls every request)
+- threadpool_cpu      work running in a worker thread
+- threadpool_io       a worker thread waiting on a socket
+
+Samples are written as `<id>.collapsed` (flamegraph.pl / speedscope "collapsed stack" format, one line per
+unique stack with its sample count) plus `<id>.json` with the request metadata and the time split.
+Only one request is profiled at a time; the loop thread is shared, so concurrent requests show up too.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_PATHS = tuple(p for p in os.getenv("PROFILE_SAMPLE_PATHS", "/quiz/questions,/quiz/submit").split(",") if p)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+_IDLE_FUNCS = frozenset(("wait", "get", "select", "poll", "_wait_for_tstate_lock", "acquire"))
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+_IO_FILES = ("socket.py", "ssl.py")
+_MAX_DEPTH = 64
+
+
+def _frame_stack(frame):
+    """Root-first list of 'file:function' labels for a frame."""
+    out = []
+    while frame is not None and len(out) < _MAX_DEPTH:
+        code = frame.f_code
+        out.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    out.reverse()
+    return out
+
+
+def _is_idle(stack):
+    if not stack:
+        return True
+    file_name, _, func = stack[-1].partition(":")
+    return func in _IDLE_FUNCS and file_name in _IDLE_FILES
+
+
+def _touches_io(stack):
+    return any(label.partition(":")[0] in _IO_FILES for label in stack)
+
+
+class SamplingProfiler:
+    """Samples the loop thread and worker threads until stopped."""
+
+    def __init__(self, loop_thread_id, interval_ms=PROFILE_INTERVAL_MS):
+        self.loop_thread_id = loop_thread_id
+        self.interval = max(0.001, interval_ms / 1000.0)
+        self.stacks = Counter()
+        self.split = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        self.wall = time.perf_counter() - self.started
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = _frame_stack(frame)
+                if tid == self.loop_thread_id:
+                    if _touches_io(stack):
+                        kind = "blocking_io_on_loop"
+                    elif _is_idle(stack):
+                        kind = "event_loop_idle"
+                    else:
+                        kind = "event_loop_cpu"
+                else:
+                    if _is_idle(stack):
+                        continue
+                    kind = "threadpool_io" if _touches_io(stack) else "threadpool_cpu"
+                self.split[kind] += 1
+                self.stacks[";".join([kind] + stack)] += 1
+
+
+class ProfileStore:
+    """Writes and lists profile files in PROFILE_DIR, keeping the newest PROFILE_KEEP profiles."""
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, profile_id, profiler, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        interval_ms = profiler.interval * 1000.0
+        meta = dict(meta)
+        meta.update({
+            "id": profile_id,
+            "wall_ms": round(profiler.wall * 1000.0, 2),
+            "samples": profiler.samples,
+            "interval_ms": interval_ms,
+            # each classified sample stands for one interval of wall time in that state
+            "split_ms": {k: round(v * interval_ms, 2) for k, v in profiler.split.most_common()},
+        })
+        with open(os.path.join(self.directory, f"{profile_id}.collapsed"), "w", encoding="utf-8") as f:
+            for stack, count in profiler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(os.path.join(self.directory, f"{profile_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=1)
+        self._prune()
+        return meta
+
+    def _prune(self):
+        metas = sorted(self._meta_files(), key=os.path.getmtime, reverse=True)
+        for path in metas[self.keep:]:
+            for ext in (".json", ".collapsed"):
+                try:
+                    os.remove(path[:-len(".json")] + ext)
+                except OSError:
+                    pass
+
+    def _meta_files(self):
+        try:
+            return [os.path.join(self.directory, n) for n in os.listdir(self.directory) if n.endswith(".json")]
+        except FileNotFoundError:
+            return []
+
+    def list(self):
+        out = []
+        for path in sorted(self._meta_files(), key=os.path.getmtime, reverse=True):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    out.append(json.load(f))
+            except Exception:
+                continue
+        return out
+
+    def path_for(self, filename):
+        """Absolute path of a profile file, or None when `filename` is not a file this store wrote."""
+        if os.path.basename(filename) != filename or not filename.endswith((".json", ".collapsed")):
+            return None
+        path = os.path.join(self.directory, filename)
+        return path if os.path.isfile(path) else None
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that profiles selected requests (see module docstring)."""
+
+    def __init__(self, app, token=None, store=None, sample_rate=PROFILE_SAMPLE_RATE, sample_paths=PROFILE_SAMPLE_PATHS, verify=None):
+        self.app = app
+        self.token = token
+        # optional callable(header_value_bytes) -> bool, used instead of comparing against `token`
+        self.verify = verify
+        self.store = store or ProfileStore()
+        self.sample_rate = sample_rate
+        self.sample_paths = sample_paths
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope):
+        if self.token or self.verify:
+            for name, value in scope.get("headers") or []:
+                if name == b"x-profile":
+                    if self.verify is not None:
+                        return self.verify(value)
+                    return hmac.compare_digest(value, self.token.encode("utf-8"))
+        if self.sample_rate > 0 and scope.get("path") in self.sample_paths:
+            return random.random() < self.sample_rate
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            return await self.app(scope, receive, send)
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        status_holder = [500]
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+                message = dict(message)
+                message["headers"] = list(message.get("headers") or []) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = SamplingProfiler(threading.get_ident())
+        profiler.start()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            profiler.stop()
+            self._busy.release()
+            route = scope.get("route")
+            meta = {
+                "path": scope.get("path"),
+                "route": getattr(route, "path", None),
+                "method": scope.get("method"),
+                "status": status_holder[0],
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            }
+            try:
+                await asyncio.to_thread(self.store.save, profile_id, profiler, meta)
+                logging.info("profiling: saved %s for %s %s (%s samples)", profile_id, meta["method"], meta["path"], profiler.samples)
+            except Exception as e:
+                logging.error("profiling: failed to save %s: %s", profile_id, e)
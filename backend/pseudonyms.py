@@ -0,0 +1,20 @@
+"""Keyed pseudonyms for personal data in logs and traffic captures (logging_setup.py, traffic_capture.py).
+
+A plain hash of an email address is easy to reverse: hash the class list or the leaderboard and compare. The
+pseudonym is therefore an HMAC-SHA256 keyed with PSEUDONYM_SECRET, which never leaves the server. The same
+value always gets the same pseudonym under the same secret, so log lines and captured requests of one user
+stay correlatable. Without PSEUDONYM_SECRET a random per-process key is used: pseudonyms are then only
+stable within one worker until it restarts.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+
+PSEUDONYM_SECRET = (os.getenv("PSEUDONYM_SECRET") or secrets.token_hex(32)).encode("utf-8")
+
+
+def pseudonym(value, length=10, secret=PSEUDONYM_SECRET):
+    """Hex pseudonym of `value` (case and surrounding whitespace ignored)."""
+    message = str(value).strip().lower().encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()[:length]
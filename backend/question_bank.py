@@ -0,0 +1,278 @@
+"""The local question bank (soal/*.json), kept pre-serialized for splicing into responses.
+
+Levels come from the compiled, memory-mapped soal/bank.qmb when it is present and up to date (see
+bank_compiler.py), otherwise from the JSON file. Either way each question's text and choices are available as
+JSON byte fragments and the answer buckets are precomputed, so a sampled question set is built by splicing
+fragments, without re-encoding or rebuilding pools per request.
+
+Near-duplicate questions are clustered when a level is loaded (bank_compiler.cluster_ids; stored in bank.qmb
+for compiled levels) and a sampled set never holds two questions of one cluster. A pool with fewer clusters
+than requested yields a shorter set rather than repeats; `python bank_compiler.py --duplicates` lists the
+clusters so editors can clean the files up.
+
+Requests never touch the filesystem: they read the current snapshot, a dict of immutable level views. The
+watcher (QuestionBank.watch, every BANK_RELOAD_INTERVAL_SECONDS) stats the files on a worker thread; a changed
+file is parsed and validated there and the snapshot is replaced with a new dict in one assignment, so a request
+that already holds a view keeps a consistent one. A file that fails validation is logged and counted, and the
+level keeps serving its previous questions until the file is fixed.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+
+import bank_compiler
+import metrics
+from fast_json import encode_str
+
+SOAL_DIR = bank_compiler.SOAL_DIR
+BANK_RELOAD_INTERVAL_SECONDS = float(os.getenv("BANK_RELOAD_INTERVAL_SECONDS", "2"))
+
+
+def difficulty_level(diff):
+    """Bank level ('mudah' / 'sedang' / 'sulit') for a normalized difficulty label."""
+    if "sulit" in diff:
+        return "sulit"
+    if "sedang" in diff:
+        return "sedang"
+    return "mudah"
+
+
+class BankQuestion:
+    """One bank question plus its pre-encoded JSON fragments."""
+    __slots__ = ("qid", "text", "choices", "answer", "text_json", "choices_json")
+
+    def __init__(self, text, choices, answer):
+        self.qid = bank_compiler.question_id(text, choices, answer)
+        self.text = text
+        self.choices = choices
+        # index of the correct choice in `choices`, None when the file's answer index is out of range
+        self.answer = answer
+        self.text_json = encode_str(text)
+        self.choices_json = [encode_str(c) for c in choices]
+
+
+class LevelView:
+    """A level parsed from JSON, with the same interface as bank_compiler.CompiledLevel."""
+
+    def __init__(self, questions, clusters):
+        self.questions = questions
+        self.clusters = clusters
+        buckets = ([], [], [], [])
+        for i, q in enumerate(questions):
+            buckets[q.answer if q.answer in (0, 1, 2, 3) else 0].append(i)
+        self.buckets = buckets
+
+    def __len__(self):
+        return len(self.questions)
+
+    def text(self, i):
+        return self.questions[i].text
+
+    def qid(self, i):
+        return self.questions[i].qid
+
+    def cluster(self, i):
+        return self.clusters[i]
+
+    def question(self, i):
+        return self.questions[i]
+
+
+def _view(items):
+    return LevelView([BankQuestion(t, c, a) for t, c, a in items], bank_compiler.cluster_ids(items))
+
+
+class Pick:
+    """A question drawn for one response: which bank entry and in which choice order."""
+    __slots__ = ("question", "order", "answer")
+
+    def __init__(self, question, order, answer):
+        self.question = question
+        self.order = order
+        self.answer = answer
+
+    def as_dict(self):
+        q = self.question
+        return {
+            "id": q.qid,
+            "question": q.text,
+            "choices": [q.choices[i] for i in self.order],
+            "answer": self.answer,
+        }
+
+    def fields_json(self):
+        """`"id":...,"question":...,"choices":[...],"answer":N` without the surrounding braces."""
+        q = self.question
+        return b'"id":"%s","question":%b,"choices":[%b],"answer":%d' % (
+            q.qid.encode(), q.text_json, b",".join(q.choices_json[i] for i in self.order), self.answer)
+
+    def to_json(self):
+        return b"{%b}" % self.fields_json()
+
+
+def _weighted_order(view, bucket, weight):
+    """All of `bucket` in draw order, proportional to weight(qid) (Efraimidis-Spirakis)."""
+    keyed = [(random.random() ** (1.0 / max(weight(view.qid(i)), 1e-6)), i) for i in bucket]
+    keyed.sort(reverse=True)
+    return [i for _, i in keyed]
+
+
+def _file_key(path):
+    """(mtime_ns, size, inode) of `path`, or None when it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class QuestionBank:
+    def __init__(self, soal_dir=SOAL_DIR, fallback=None, compiled_path=bank_compiler.COMPILED_PATH):
+        self.soal_dir = soal_dir
+        self.compiled_path = compiled_path
+        self.fallback = _view(bank_compiler.normalize_questions(fallback))
+        self.compiled = None
+        self._compiled_key = None
+        self._sources = {}  # level -> file key the current view (or the last rejected file) was read from
+        self._levels = {}  # the snapshot: level -> view, replaced as a whole, never mutated
+        self._index = {}  # question id -> (level, view, index), rebuilt with the snapshot
+        self._reload_lock = threading.Lock()
+        self.check()
+
+    def level(self, level):
+        """The current view for a level (the inline pool when its file never loaded)."""
+        return self._levels.get(level, self.fallback)
+
+    def find(self, qid):
+        """(level, view, index) of the bank question with id `qid`, or None (AI questions, removed questions)."""
+        return self._index.get(qid)
+
+    def _check_compiled(self):
+        """Re-map bank.qmb when it was rebuilt; returns True when the mapping changed."""
+        key = _file_key(self.compiled_path) if self.compiled_path else None
+        if key == self._compiled_key:
+            return False
+        self._compiled_key = key
+        if key is None:
+            changed, self.compiled = self.compiled is not None, None
+            return changed
+        try:
+            # the previous mapping is left to the garbage collector: in-flight picks may still slice it
+            self.compiled = bank_compiler.CompiledBank(self.compiled_path)
+            logging.info("question_bank: mapped %s (%s)", self.compiled_path,
+                         ", ".join(f"{k}={len(v)}" for k, v in self.compiled.levels.items()))
+        except Exception as e:
+            logging.error("question_bank: cannot use %s, keeping the current bank: %s", self.compiled_path, e)
+            return False
+        return True
+
+    def check(self):
+        """Reload changed levels and swap in a new snapshot; blocking, run it off the event loop."""
+        with self._reload_lock:
+            compiled_changed = self._check_compiled()
+            levels = dict(self._levels)
+            for level in bank_compiler.LEVELS:
+                path = os.path.join(self.soal_dir, f"{level}.json")
+                key = _file_key(path)
+                if key == self._sources.get(level, False) and not compiled_changed:
+                    continue
+                self._sources[level] = key
+                if key is None:
+                    if level in levels:
+                        logging.warning("question_bank: %s disappeared, keeping the loaded questions", path)
+                    continue
+                compiled = self.compiled.levels.get(level) if self.compiled is not None else None
+                if compiled is not None and (compiled.source_mtime_ns, compiled.source_size) == key[:2]:
+                    view = compiled
+                else:
+                    try:
+                        view = _view(bank_compiler.load_level_file(path, validate=True))
+                    except Exception as e:
+                        metrics.BANK_RELOADS.labels(level, "rejected").inc()
+                        logging.error("question_bank: rejected %s, still serving the previous %s questions: %s",
+                                      path, len(levels.get(level, self.fallback)), e)
+                        continue
+                if levels.get(level) is not view:
+                    if level in levels:
+                        metrics.BANK_RELOADS.labels(level, "reloaded").inc()
+                    levels[level] = view
+                    logging.info("question_bank: %s -> %s questions (%s)", level, len(view),
+                                 "compiled" if view is compiled else "json")
+            if levels != self._levels:
+                self._index = {view.qid(i): (level, view, i) for level, view in levels.items() for i in range(len(view))}
+            self._levels = levels
+
+    async def watch(self, interval=BANK_RELOAD_INTERVAL_SECONDS):
+        """Poll the bank files every `interval` seconds (started from main.py's startup hook)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.check)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error("question_bank: reload check failed: %s", e)
+
+    def sample(self, diff, target_count, exclude=None, weight=None):
+        """Draw up to `target_count` questions for `diff`, balanced by original answer index, choices shuffled.
+
+        At most one question per near-duplicate cluster; a level with fewer clusters returns fewer questions.
+        `exclude` is an optional set of question texts the caller already has (used to top up AI sets); their
+        clusters are skipped too. `weight` optionally maps a question id to a positive sampling weight (see
+        question_stats.py); within each answer bucket questions are then drawn proportionally to it.
+        """
+        view = self.level(difficulty_level(diff))
+        if not len(view):
+            return []
+        used = set()
+        if exclude:
+            used.update(view.cluster(i) for b in view.buckets for i in b if view.text(i).strip() in exclude)
+
+        # target per index: distribute as evenly as possible
+        base, rem = divmod(target_count, 4)
+        selected = []
+        leftovers = []
+        for idx in range(4):
+            want = base + (1 if idx < rem else 0)
+            order = list(view.buckets[idx]) if weight is None else _weighted_order(view, view.buckets[idx], weight)
+            n, k, taken = len(order), 0, 0
+            while k < n and taken < want:
+                if weight is None:
+                    # partial Fisher-Yates: only as many draws as the bucket has to give
+                    j = random.randrange(k, n)
+                    order[k], order[j] = order[j], order[k]
+                i = order[k]
+                k += 1
+                cluster = view.cluster(i)
+                if cluster not in used:
+                    used.add(cluster)
+                    selected.append(i)
+                    taken += 1
+            leftovers.extend(order[k:])
+
+        # if we still need more (not enough variety in some buckets), fill from the rest across buckets
+        random.shuffle(leftovers)
+        for i in leftovers:
+            if len(selected) >= target_count:
+                break
+            cluster = view.cluster(i)
+            if cluster not in used:
+                used.add(cluster)
+                selected.append(i)
+
+        picks = []
+        for i in selected:
+            q = view.question(i)
+            order = list(range(len(q.choices)))
+            random.shuffle(order)
+            picks.append(Pick(q, order, order.index(q.answer) if q.answer is not None else 0))
+        random.shuffle(picks)
+        return picks
+
+
+def render_set(picks, total_questions, time_minutes):
+    """Response body for a whole bank question set, spliced from pre-encoded fragments."""
+    return b'{"total_questions":%d,"time_minutes":%d,"questions":[%b]}' % (
+        total_questions, time_minutes, b",".join(p.to_json() for p in picks))
@@ -0,0 +1,217 @@
+"""Per-question correctness and timing statistics for the soal bank, aggregated incrementally.
+
+Submissions may carry an outcome vector, one entry per question shown (see parse_outcomes):
+
+    "outcomes": [{"id": "d594837851732e0c", "choice": "Soekarno", "correct": true, "ms": 8400}, ...]
+
+`id` is the question id sent with every bank question (bank_compiler.question_id, a hash of text, choices and
+answer, so bank items sharing a text are told apart); for other questions clients may send "question" (the
+text) instead, which never matches a bank question. `choice` is the chosen text (null when skipped), and correctness of
+bank questions is decided here from the bank, not by the client. The vector is stored with the submission
+in a compact form ({"q", "c", "ok", "ms"}, `c` indexing the bank's choice order) and counted here:
+
+- record() adds to in-memory counters (pending deltas plus the totals served to readers), no I/O.
+- Every QUESTION_STATS_FLUSH_SECONDS the pending deltas go to the `question_stats` collection as one unordered
+  bulk write of `$inc` upserts (one document per question id), and the totals are re-read from it so each
+  worker also sees the other workers' answers. A failed flush keeps the deltas for the next round.
+- stats() / p_correct() read the in-memory totals only, so the admin endpoint and the sampler never wait on Mongo.
+
+With QUESTION_STATS_BALANCE=1 the sampler weights bank questions by how close their observed correctness is
+to the target for their level (QUESTION_STATS_TARGETS), so sets stop drifting too easy or too hard; questions
+with fewer than QUESTION_STATS_MIN_ATTEMPTS answers keep weight 1.
+"""
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from bank_compiler import question_id
+
+QUESTION_STATS_FLUSH_SECONDS = float(os.getenv("QUESTION_STATS_FLUSH_SECONDS", "30"))
+QUESTION_STATS_BALANCE = os.getenv("QUESTION_STATS_BALANCE", "0").lower() in ("1", "true", "yes")
+QUESTION_STATS_MIN_ATTEMPTS = int(os.getenv("QUESTION_STATS_MIN_ATTEMPTS", "20"))
+QUESTION_STATS_TARGETS = os.getenv("QUESTION_STATS_TARGETS", "mudah=0.8,sedang=0.65,sulit=0.5")
+MAX_OUTCOMES = 100
+
+_FIELDS = ("attempts", "correct", "skipped", "time_ms", "timed")
+
+
+def parse_outcomes(raw, limit=MAX_OUTCOMES, question_of=None):
+    """Compact outcome entries ({"q", "c", "ok", "ms"}) from a submitted list; malformed entries are dropped.
+
+    `question_of(qid)` returns the bank question for an id, or None. For bank questions `choice` must be the
+    chosen text (clients shuffle choices, so an index means nothing here): it is stored as the index in the
+    bank's choice order and `ok` is graded against the bank's answer, whatever the client claimed. Entries for
+    other questions keep the client's index and `correct`; they are stored but never counted (see record()).
+    """
+    if not isinstance(raw, list):
+        return []
+    out = []
+    for item in raw[:limit]:
+        if not isinstance(item, dict):
+            continue
+        qid = item.get("id")
+        if not isinstance(qid, str) or not qid:
+            text = item.get("question")
+            if not isinstance(text, str) or not text.strip():
+                continue
+            qid = question_id(text)
+        qid = qid[:32]
+        choice = item.get("choice")
+        ms = item.get("ms")
+        ms = int(ms) if isinstance(ms, (int, float)) and not isinstance(ms, bool) and 0 <= ms < 3_600_000 else None
+        bank = question_of(qid) if question_of is not None else None
+        if bank is not None:
+            if choice is None:
+                c = -1
+            elif isinstance(choice, str) and choice in bank.choices:
+                c = bank.choices.index(choice)
+            else:
+                continue  # an index or a text the question doesn't have: can't be graded
+            out.append({"q": qid, "c": c, "ok": c >= 0 and c == bank.answer, "ms": ms})
+            continue
+        choice = choice if isinstance(choice, int) and not isinstance(choice, bool) and 0 <= choice < 10 else -1
+        out.append({"q": qid, "c": choice, "ok": bool(item.get("correct")) and choice >= 0, "ms": ms})
+    return out
+
+
+def parse_targets(text):
+    targets = {}
+    for part in (text or "").split(","):
+        name, _, value = part.partition("=")
+        try:
+            targets[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return targets
+
+
+class QuestionStats:
+    def __init__(self, min_attempts=QUESTION_STATS_MIN_ATTEMPTS, targets=None):
+        self.min_attempts = min_attempts
+        self.targets = parse_targets(QUESTION_STATS_TARGETS) if targets is None else dict(targets)
+        self._pending = {}  # qid -> [attempts, correct, skipped, time_ms, timed] not yet written
+        self._levels = {}  # qid -> level of the question when it was last answered
+        self._totals = {}  # qid -> the same counters, as last read from Mongo plus local deltas since
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.flushes = 0
+        self.flush_errors = 0
+
+    def record(self, outcomes, level_of):
+        """Count bank outcomes; `level_of(qid)` returns the question's level, or None for non-bank questions."""
+        counted = 0
+        with self._lock:
+            for o in outcomes:
+                level = level_of(o["q"])
+                if level is None:
+                    continue
+                delta = (1, 1 if o["ok"] else 0, 1 if o["c"] < 0 else 0, o["ms"] or 0, 1 if o["ms"] is not None else 0)
+                for counters in (self._pending.setdefault(o["q"], [0] * 5), self._totals.setdefault(o["q"], [0] * 5)):
+                    for n, d in enumerate(delta):
+                        counters[n] += d
+                self._levels[o["q"]] = level
+                counted += 1
+        return counted
+
+    def flush(self, coll):
+        """Write pending deltas with one bulk `$inc` upsert, then reload the totals (blocking; run off the loop)."""
+        if coll is None:
+            return 0
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                levels = dict(self._levels)
+            if pending:
+                now = datetime.now(timezone.utc)
+                ops = [
+                    UpdateOne({"_id": qid},
+                              {"$inc": dict(zip(_FIELDS, counters)), "$set": {"level": levels.get(qid), "updated_at": now}},
+                              upsert=True)
+                    for qid, counters in pending.items()
+                ]
+                try:
+                    coll.bulk_write(ops, ordered=False)
+                    self.flushes += 1
+                except Exception as e:
+                    self.flush_errors += 1
+                    logging.warning("question_stats: flush of %s questions failed, retrying later: %s", len(pending), e)
+                    with self._lock:
+                        for qid, counters in pending.items():
+                            merged = self._pending.setdefault(qid, [0] * 5)
+                            for n, d in enumerate(counters):
+                                merged[n] += d
+                    return 0
+            self._reload(coll)
+            return len(pending)
+
+    def _reload(self, coll):
+        try:
+            docs = list(coll.find({}, {f: 1 for f in (*_FIELDS, "level")}))
+        except Exception as e:
+            logging.warning("question_stats: reading totals failed: %s", e)
+            return
+        totals = {d["_id"]: [int(d.get(f) or 0) for f in _FIELDS] for d in docs}
+        with self._lock:
+            # deltas recorded since this flush started are not in Mongo yet
+            for qid, counters in self._pending.items():
+                merged = totals.setdefault(qid, [0] * 5)
+                for n, d in enumerate(counters):
+                    merged[n] += d
+            for d in docs:
+                if d.get("level"):
+                    self._levels.setdefault(d["_id"], d["level"])
+            self._totals = totals
+
+    async def run(self, get_collection, interval=QUESTION_STATS_FLUSH_SECONDS):
+        """Flush loop (started from main.py's startup hook)."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.flush, get_collection())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error("question_stats: flush loop error: %s", e)
+
+    def p_correct(self, qid):
+        """Observed share of correct answers, or None below `min_attempts` answers."""
+        counters = self._totals.get(qid)
+        if counters is None or counters[0] < self.min_attempts:
+            return None
+        return counters[1] / counters[0]
+
+    def weight(self, qid):
+        """Sampling weight for QuestionBank.sample: 1 near the level's target correctness, down to 0.1 far from it."""
+        p = self.p_correct(qid)
+        target = self.targets.get(self._levels.get(qid))
+        if p is None or target is None:
+            return 1.0
+        return max(0.1, 1.0 - 2.0 * abs(p - target))
+
+    def stats(self, qid):
+        counters = self._totals.get(qid)
+        if counters is None:
+            return None
+        attempts, correct, skipped, time_ms, timed = counters
+        return {
+            "attempts": attempts,
+            "correct": correct,
+            "skipped": skipped,
+            "p_correct": round(correct / attempts, 4) if attempts else None,
+            "avg_ms": int(time_ms / timed) if timed else None,
+            "weight": round(self.weight(qid), 3),
+        }
+
+    def question_ids(self):
+        return list(self._totals)
+
+    def summary(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"questions": len(self._totals), "pending": pending, "flushes": self.flushes,
+                "flush_errors": self.flush_errors, "balance": QUESTION_STATS_BALANCE,
+                "min_attempts": self.min_attempts, "targets": self.targets}
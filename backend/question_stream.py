@@ -0,0 +1,122 @@
+"""Incremental parsing of LLM-generated question sets.
+
+The model is asked for `{"total_questions":..,"time_minutes":..,"questions":[{...}, ...]}` but may wrap it in
+markdown, cut it off, or break a single item. `IncrementalQuestionParser` is fed raw text chunks (e.g. streamed
+completion deltas) and yields every question object as soon as its closing brace arrives, so one malformed
+item only costs that item instead of the whole set.
+"""
+import json
+
+# An item that grows beyond this many characters is assumed to be broken and is skipped without buffering it
+MAX_ITEM_CHARS = 4000
+
+
+def validate_question(q):
+    """Return a clean {question, choices, answer} dict when `q` is a usable multiple-choice question, else None."""
+    if not isinstance(q, dict):
+        return None
+    text = q.get("question")
+    choices = q.get("choices")
+    answer = q.get("answer")
+    if not isinstance(text, str) or not text.strip():
+        return None
+    if not isinstance(choices, list) or len(choices) != 4:
+        return None
+    if not all(isinstance(c, str) and c.strip() for c in choices):
+        return None
+    if len({c.strip().lower() for c in choices}) != 4:
+        return None
+    if isinstance(answer, str) and answer.strip().isdigit():
+        answer = int(answer.strip())
+    if isinstance(answer, bool) or not isinstance(answer, int) or not 0 <= answer < 4:
+        return None
+    return {"question": text.strip(), "choices": [c.strip() for c in choices], "answer": answer}
+
+
+class IncrementalQuestionParser:
+    """Character-level scanner that emits every JSON object found directly inside a JSON array.
+
+    Text outside any JSON container (markdown fences, prose) is ignored. Only the object currently being
+    captured is buffered, so memory stays bounded regardless of how long the stream is.
+    """
+
+    def __init__(self, max_item_chars=MAX_ITEM_CHARS):
+        self.max_item_chars = max_item_chars
+        self._stack = []          # open containers: '{' or '['
+        self._in_string = False
+        self._escape = False
+        self._item = None         # list of chars of the item being captured, or None
+        self._item_depth = 0      # stack depth at which the current item was opened
+        self._skipping = False    # the current item outgrew max_item_chars and is scanned without buffering
+        self.invalid_items = 0
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return the list of complete objects (parsed dicts) it finished."""
+        done = []
+        for ch in chunk or "":
+            if self._item is not None:
+                self._item.append(ch)
+                if len(self._item) > self.max_item_chars:
+                    self._abort_item()
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if not self._stack and ch not in "{[":
+                continue  # outside JSON: markdown, prose, whitespace
+
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                if self._item is None and not self._skipping and self._stack and self._stack[-1] == "[":
+                    self._item = [ch]
+                    self._item_depth = len(self._stack)
+                self._stack.append(ch)
+            elif ch == "[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._skipping and len(self._stack) == self._item_depth:
+                    self._skipping = False
+                if self._item is not None and ch == "}" and len(self._stack) == self._item_depth:
+                    text = "".join(self._item)
+                    self._item = None
+                    try:
+                        done.append(json.loads(text))
+                    except Exception:
+                        self.invalid_items += 1
+        return done
+
+    def _abort_item(self):
+        # drop the runaway item's buffer but keep scanning it, so the parser resumes at the next sibling
+        self.invalid_items += 1
+        self._item = None
+        self._skipping = True
+
+
+def iter_stream_content(resp):
+    """Yield assistant text deltas from an OpenAI-compatible `stream: true` (server-sent events) response."""
+    for raw in resp.iter_lines(decode_unicode=True):
+        if not raw or not raw.startswith("data:"):
+            continue
+        data = raw[5:].strip()
+        if data == "[DONE]":
+            break
+        try:
+            event = json.loads(data)
+        except Exception:
+            continue
+        for choice in event.get("choices") or []:
+            delta = choice.get("delta") or {}
+            text = delta.get("content") if isinstance(delta, dict) else None
+            if text is None:
+                text = choice.get("text")
+            if text:
+                yield text
@@ -0,0 +1,230 @@
+"""Per-client rate limiting and per-upstream concurrency caps for the AI-backed endpoints.
+
+Every AI-backed request costs a paid upstream call, so two limits apply:
+
+- RateLimiter: a token bucket per client (RATE_LIMIT_PER_MINUTE refill, RATE_LIMIT_BURST capacity) for the
+  routes in RATE_LIMIT_PATHS. Handlers charge it (RateLimiter.charge) right before the upstream call, after
+  their cache / precomputed lookups, so answers served from memory are never throttled. An empty bucket
+  raises RateLimited, answered 429 with Retry-After. /quiz/questions is not rejected; its handler checks the
+  same bucket and serves the local bank instead of calling the AI (counted as outcome="fallback" and logged).
+- UpstreamLimiter: at most UPSTREAM_CONCURRENCY calls in flight per upstream (e.g. `unli.dev=8,lunos.tech=8`).
+  A call that cannot get a slot within UPSTREAM_QUEUE_TIMEOUT_SECONDS raises UpstreamSaturated, which the
+  handlers treat like any other upstream failure (they fall back).
+
+Clients are identified by their key name when they authenticate with a named key from API_KEYS, otherwise by
+IP. Behind reverse proxies, RATE_LIMIT_TRUST_PROXY is the number of proxies in front of the app (`1`/`true`
+= one): the address is the X-Forwarded-For entry that many hops from the right, i.e. the one the outermost
+trusted proxy appended. Entries further left are whatever the client sent and are never used, so a forged
+header cannot buy a fresh bucket. The legacy API_KEY is shared by every
+browser, so it is keyed by IP too. A classroom behind one NAT address shares a bucket; size the limits for that.
+
+Buckets live in process memory by default. With RATE_LIMIT_STORE=mongo, all workers share a fixed-window
+counter per client and minute in the `rate_limits` collection (RATE_LIMIT_PER_MINUTE + RATE_LIMIT_BURST
+requests per window). If Mongo is unavailable, the in-process buckets are used instead.
+"""
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+
+import metrics
+from ttl_cache import TTLCache
+
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+RATE_LIMIT_PATHS = tuple(p for p in os.getenv("RATE_LIMIT_PATHS", "/quiz/chat,/chat,/quiz/explain,/quiz/fakta").split(",") if p)
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "local").lower()
+
+# number of reverse proxies in front of the app ("true"/"yes" = 1)
+_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0").strip().lower()
+RATE_LIMIT_TRUST_PROXY = 1 if _TRUST_PROXY in ("true", "yes") else int(_TRUST_PROXY) if _TRUST_PROXY.isdigit() else 0
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+UPSTREAM_CONCURRENCY = os.getenv("UPSTREAM_CONCURRENCY", "unli.dev=8,lunos.tech=8,mailry=4")
+UPSTREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_QUEUE_TIMEOUT_SECONDS", "2"))
+
+
+def client_id(scope, trusted_hops=None):
+    """Rate-limit identity of a request: 'key:<name>' for named API keys, else 'ip:<address>'."""
+    name = scope.get("api_key_name")
+    if name and name != "default":
+        return f"key:{name}"
+    trusted_hops = RATE_LIMIT_TRUST_PROXY if trusted_hops is None else trusted_hops
+    if trusted_hops:
+        # several X-Forwarded-For headers form one list, in order
+        hops = [hop.strip() for header, value in scope.get("headers") or [] if header == b"x-forwarded-for"
+                for hop in value.decode("latin-1").split(",") if hop.strip()]
+        if hops:
+            # with fewer hops than proxies the leftmost one was still written by a trusted proxy
+            return "ip:" + hops[max(0, len(hops) - trusted_hops)]
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+
+class LocalBucketStore:
+    """Token buckets in process memory; idle buckets are dropped once they would have refilled anyway."""
+
+    def __init__(self, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST, max_clients=RATE_LIMIT_MAX_CLIENTS):
+        self.rate = per_minute / 60.0
+        self.burst = max(1.0, burst)
+        refill_seconds = self.burst / self.rate if self.rate > 0 else 3600
+        self._buckets = TTLCache(maxsize=max_clients, ttl=refill_seconds, touch_on_get=True)
+        self._lock = threading.Lock()
+
+    def take(self, key, cost=1.0):
+        """Consume `cost` tokens; returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = [self.burst, now]
+                self._buckets.set(key, bucket)
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return True, 0.0
+            bucket[0] = tokens
+        if self.rate <= 0:
+            return False, 60.0
+        return False, (cost - tokens) / self.rate
+
+
+class MongoWindowStore:
+    """Fixed one-minute windows counted in Mongo, shared by every worker.
+
+    `get_collection` returns the current collection (or None while Mongo is down); documents expire through
+    the `expire_at` TTL index declared in mongo_indexes.py.
+    """
+
+    def __init__(self, get_collection, per_minute=RATE_LIMIT_PER_MINUTE, burst=RATE_LIMIT_BURST, fallback=None):
+        self.get_collection = get_collection
+        self.limit = int(per_minute + burst)
+        self.fallback = fallback or LocalBucketStore(per_minute, burst)
+        self._warned = False
+
+    def take(self, key, cost=1.0):
+        coll = self.get_collection()
+        if coll is None:
+            return self.fallback.take(key, cost)
+        now = time.time()
+        window = int(now // 60)
+        try:
+            doc = coll.find_one_and_update(
+                {"_id": f"{key}:{window}"},
+                {"$inc": {"n": int(math.ceil(cost))}, "$setOnInsert": {"expire_at": _utc((window + 2) * 60)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self._warned = False
+        except Exception as e:
+            if not self._warned:
+                logging.warning("rate_limit: mongo store unavailable, using local buckets: %s", e)
+                self._warned = True
+            return self.fallback.take(key, cost)
+        if (doc or {}).get("n", 0) <= self.limit:
+            return True, 0.0
+        return False, (window + 1) * 60 - now
+
+
+def _utc(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+class RateLimited(Exception):
+    """The client's bucket is empty; main.py answers it with rate_limited_response()."""
+
+    def __init__(self, route, retry_after):
+        super().__init__(f"{route}: rate limited for {retry_after:.1f}s")
+        self.route = route
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    def __init__(self, store, blocking_store=False, paths=RATE_LIMIT_PATHS):
+        self.store = store
+        # Mongo round trips block, so they run on a worker thread
+        self.blocking_store = blocking_store
+        self.paths = frozenset(paths)
+
+    async def check(self, key, cost=1.0):
+        if self.blocking_store:
+            return await asyncio.to_thread(self.store.take, key, cost)
+        return self.store.take(key, cost)
+
+    async def charge(self, scope, route):
+        """Take a token for an upstream call made by `route`; raises RateLimited when the bucket is empty.
+
+        Routes outside RATE_LIMIT_PATHS are not limited. Call it only on the path that really calls upstream.
+        """
+        if route not in self.paths:
+            return
+        allowed, retry_after = await self.check(client_id(scope))
+        if not allowed:
+            metrics.RATE_LIMITED.labels(route, "rejected").inc()
+            raise RateLimited(route, retry_after)
+
+
+def rate_limited_response(exc):
+    seconds = max(1, int(math.ceil(exc.retry_after)))
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Terlalu banyak permintaan. Coba lagi sebentar lagi.", "retry_after": seconds},
+        headers={"Retry-After": str(seconds)},
+    )
+
+
+class UpstreamSaturated(Exception):
+    """No concurrency slot for an upstream became free within the queue timeout."""
+
+
+def parse_concurrency(text):
+    limits = {}
+    for part in (text or "").split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            try:
+                limits[name.strip()] = max(1, int(value))
+            except ValueError:
+                logging.warning("UPSTREAM_CONCURRENCY: ignoring %r", part)
+    return limits
+
+
+class UpstreamLimiter:
+    def __init__(self, limits=None, queue_timeout=UPSTREAM_QUEUE_TIMEOUT_SECONDS):
+        self.limits = parse_concurrency(UPSTREAM_CONCURRENCY) if limits is None else dict(limits)
+        self.queue_timeout = queue_timeout
+        self._semaphores = {}
+
+    def _semaphore(self, upstream):
+        sem = self._semaphores.get(upstream)
+        if sem is None and upstream in self.limits:
+            sem = self._semaphores[upstream] = asyncio.Semaphore(self.limits[upstream])
+        return sem
+
+    def saturated(self, upstream):
+        sem = self._semaphore(upstream)
+        return sem is not None and sem.locked()
+
+    @asynccontextmanager
+    async def slot(self, upstream):
+        """Hold one of `upstream`'s slots; unknown upstreams are not limited."""
+        sem = self._semaphore(upstream)
+        if sem is None:
+            yield
+            return
+        try:
+            await asyncio.wait_for(sem.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            metrics.UPSTREAM_REJECTED.labels(upstream).inc()
+            raise UpstreamSaturated(f"{upstream}: all {self.limits[upstream]} slots busy")
+        try:
+            yield
+        finally:
+            sem.release()
@@ -0,0 +1,268 @@
+"""Quiz rooms for live events: one question set per room, served from memory to every participant.
+
+A host creates a room (POST /quiz/rooms); the question set is generated once (AI, else the soal bank),
+rendered to JSON bytes and stored in the `rooms` collection. Participants join with the room code and get
+that set from memory, compressed once per encoding (compression.PrecompressedCache), so a join costs a dict
+lookup and a send: no generation, no Mongo round trip, no serialization.
+
+Every worker can serve every room. A worker that does not know a code yet loads it from Mongo once, however
+many joins for it arrive at the same moment (single flight); unknown codes are remembered briefly so a
+mistyped code cannot turn a join storm into a query storm.
+
+Joining returns a participant token (HMAC of room code and participant, keyed by ROOM_TOKEN_SECRET) that a
+result submission must carry, so only people who joined can appear in the ranking; any worker can check it.
+
+Participants join with their email, and results are graded here against the room's own question set
+(grade()), so the ranking never takes a score from the client. Results are kept per room and email (best
+score, then shortest time) in `room_results`. The live ranking is
+read from there at most once per ROOM_RANKING_REFRESH_SECONDS per room and worker, so polling clients share
+one query. Without Mongo, rooms and results live in this worker only.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import DuplicateKeyError
+
+from bank_compiler import question_id
+from fast_json import dumps as json_dumps
+from ttl_cache import TTLCache
+
+ROOM_TTL_HOURS = float(os.getenv("ROOM_TTL_HOURS", "12"))
+ROOM_MAX_ACTIVE = int(os.getenv("ROOM_MAX_ACTIVE", "500"))
+ROOM_MAX_PARTICIPANTS = int(os.getenv("ROOM_MAX_PARTICIPANTS", "5000"))
+ROOM_RANKING_SIZE = int(os.getenv("ROOM_RANKING_SIZE", "100"))
+ROOM_RANKING_REFRESH_SECONDS = float(os.getenv("ROOM_RANKING_REFRESH_SECONDS", "1"))
+# shared by all workers; the per-process fallback only works with a single worker
+ROOM_TOKEN_SECRET = (os.getenv("ROOM_TOKEN_SECRET") or secrets.token_hex(32)).encode("utf-8")
+
+# no 0/O, 1/I/L: codes are read out loud and typed on phones
+CODE_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+CODE_LENGTH = 6
+
+
+def new_code():
+    return "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+
+
+def normalize_code(code):
+    return (code or "").strip().upper()
+
+
+def normalize_participant(value):
+    return (value or "").strip().lower()
+
+
+def grade(room, outcomes):
+    """(score, total) of a submission's outcome entries ({"id" or "question", "choice": text}) against the room.
+
+    Each question of the room counts once; unknown questions and answers given by index score nothing.
+    """
+    key = room.answer_key()
+    correct = set()
+    for item in outcomes if isinstance(outcomes, list) else []:
+        if not isinstance(item, dict):
+            continue
+        qid = item.get("id") if isinstance(item.get("id"), str) else None
+        if qid is None and isinstance(item.get("question"), str):
+            qid = question_id(item["question"])
+        if qid in key and item.get("choice") == key[qid]:
+            correct.add(qid)
+    return len(correct), len(key)
+
+
+def participant_token(code, participant, secret=ROOM_TOKEN_SECRET):
+    """Token proving that `participant` joined room `code` (returned by join, required by submit)."""
+    message = f"{normalize_code(code)}:{normalize_participant(participant)}".encode("utf-8")
+    return hmac.new(secret, message, hashlib.sha256).hexdigest()[:32]
+
+
+def token_valid(code, participant, token, secret=ROOM_TOKEN_SECRET):
+    return isinstance(token, str) and hmac.compare_digest(token, participant_token(code, participant, secret))
+
+
+class RoomFull(Exception):
+    """The room already has ROOM_MAX_PARTICIPANTS participants (as seen by this worker)."""
+
+
+class Room:
+    def __init__(self, code, difficulty, body, host=None, created_at=None, expires_at=None):
+        self.code = code
+        self.difficulty = difficulty
+        self.body = body  # the question set, rendered once
+        self.host = host
+        self.created_at = created_at or datetime.now(timezone.utc)
+        self.expires_at = expires_at or self.created_at + timedelta(hours=ROOM_TTL_HOURS)
+        self.participants = set()
+        self.results = {}  # email -> result dict; authoritative only without Mongo
+        self.ranking_body = None
+        self.ranking_at = 0.0
+        self.ranking_lock = asyncio.Lock()
+        self._answer_key = None
+
+    def answer_key(self):
+        """{question id: correct choice text} of the room's set; AI questions (no id) by question_id(text)."""
+        if self._answer_key is None:
+            key = {}
+            for q in json.loads(self.body).get("questions") or []:
+                choices, answer = q.get("choices") or [], q.get("answer")
+                if isinstance(answer, int) and 0 <= answer < len(choices):
+                    key[q.get("id") or question_id(q.get("question") or "")] = choices[answer]
+            self._answer_key = key
+        return self._answer_key
+
+    def info(self):
+        return {
+            "code": self.code,
+            "difficulty": self.difficulty,
+            "host": self.host,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at,
+            "participants": len(self.participants),
+        }
+
+
+def _aware(value):
+    # pymongo returns naive UTC datetimes unless the client is tz_aware
+    return value.replace(tzinfo=timezone.utc) if isinstance(value, datetime) and value.tzinfo is None else value
+
+
+def _better(a, b):
+    """Whether result `a` ranks above `b`: higher score, then less time."""
+    return (a["score"], -a["timeSpent"]) > (b["score"], -b["timeSpent"])
+
+
+class RoomStore:
+    def __init__(self, get_rooms, get_results, max_rooms=ROOM_MAX_ACTIVE):
+        self.get_rooms = get_rooms
+        self.get_results = get_results
+        self._rooms = TTLCache(maxsize=max_rooms, ttl=ROOM_TTL_HOURS * 3600)
+        self._missing = TTLCache(maxsize=10000, ttl=5)
+        self._loading = {}  # code -> future of the Mongo load in progress
+
+    async def create(self, difficulty, body, host=None):
+        coll = self.get_rooms()
+        for _ in range(5):
+            code = new_code()
+            if code in self._rooms:
+                continue
+            room = Room(code, difficulty, body, host)
+            if coll is not None:
+                try:
+                    await asyncio.to_thread(coll.insert_one, {
+                        "_id": code, "difficulty": difficulty, "body": body.decode("utf-8"), "host": host,
+                        "created_at": room.created_at, "expire_at": room.expires_at,
+                    })
+                except DuplicateKeyError:
+                    continue
+                except Exception as e:
+                    logging.error("rooms: could not store room %s, serving it from this worker only: %s", code, e)
+            self._rooms.set(code, room)
+            self._missing.pop(code)
+            return room
+        raise RuntimeError("rooms: no free room code after 5 attempts")
+
+    async def get(self, code):
+        """The room for `code` or None; concurrent misses for one code share a single Mongo read."""
+        code = normalize_code(code)
+        room = self._rooms.get(code)
+        if room is not None:
+            return room if room.expires_at > datetime.now(timezone.utc) else None
+        if self._missing.get(code) is not None or len(code) != CODE_LENGTH:
+            return None
+        pending = self._loading.get(code)
+        if pending is None:
+            pending = self._loading[code] = asyncio.ensure_future(self._load(code))
+            pending.add_done_callback(lambda _f: self._loading.pop(code, None))
+        return await asyncio.shield(pending)
+
+    async def _load(self, code):
+        coll = self.get_rooms()
+        if coll is None:
+            return None
+        try:
+            doc = await asyncio.to_thread(coll.find_one, {"_id": code})
+        except Exception as e:
+            logging.error("rooms: loading room %s failed: %s", code, e)
+            return None
+        if not doc:
+            self._missing.set(code, True)
+            return None
+        created_at = _aware(doc.get("created_at"))
+        expires_at = _aware(doc.get("expire_at"))
+        if expires_at is not None and expires_at <= datetime.now(timezone.utc):
+            self._missing.set(code, True)
+            return None
+        room = Room(code, doc.get("difficulty"), doc["body"].encode("utf-8"), doc.get("host"), created_at, expires_at)
+        self._rooms.set(code, room)
+        return room
+
+    def join(self, room, participant):
+        """Register a participant (by email); returns their token for submit.
+
+        Raises RoomFull past ROOM_MAX_PARTICIPANTS.
+        """
+        participant = normalize_participant(participant)
+        if participant not in room.participants:
+            if len(room.participants) >= ROOM_MAX_PARTICIPANTS:
+                raise RoomFull(room.code)
+            room.participants.add(participant)
+        return participant_token(room.code, participant)
+
+    async def submit(self, room, result):
+        """Keep the participant's best result; `result` has email, name, score, percentage, timeSpent."""
+        key = result["email"]
+        current = room.results.get(key)
+        if current is None or _better(result, current):
+            room.results[key] = result
+        coll = self.get_results()
+        if coll is None:
+            return
+        doc = {**result, "room": room.code, "updated_at": datetime.now(timezone.utc), "expire_at": room.expires_at}
+        # replace only when better; an existing better result makes the upsert collide on _id
+        better = {"$or": [{"score": {"$lt": result["score"]}},
+                          {"score": result["score"], "timeSpent": {"$gt": result["timeSpent"]}}]}
+        try:
+            await asyncio.to_thread(coll.replace_one, {"_id": f"{room.code}:{key}", **better}, doc, upsert=True)
+        except DuplicateKeyError:
+            pass
+        except Exception as e:
+            logging.error("rooms: storing result for room %s failed: %s", room.code, e)
+
+    def _local_ranking(self, room):
+        ordered = sorted(room.results.values(), key=lambda r: (-r["score"], r["timeSpent"]))
+        return ordered[:ROOM_RANKING_SIZE], len(ordered)
+
+    def _read_ranking(self, coll, code):
+        projection = {"_id": 0, "name": 1, "score": 1, "percentage": 1, "timeSpent": 1}
+        docs = list(coll.find({"room": code}, projection).sort([("score", -1), ("timeSpent", 1)]).limit(ROOM_RANKING_SIZE))
+        return docs, coll.count_documents({"room": code})
+
+    async def ranking(self, room):
+        """Rendered ranking body, refreshed at most every ROOM_RANKING_REFRESH_SECONDS (single flight)."""
+        if room.ranking_body is not None and time.monotonic() - room.ranking_at < ROOM_RANKING_REFRESH_SECONDS:
+            return room.ranking_body
+        async with room.ranking_lock:
+            if room.ranking_body is not None and time.monotonic() - room.ranking_at < ROOM_RANKING_REFRESH_SECONDS:
+                return room.ranking_body
+            coll = self.get_results()
+            entries = total = None
+            if coll is not None:
+                try:
+                    entries, total = await asyncio.to_thread(self._read_ranking, coll, room.code)
+                except Exception as e:
+                    logging.error("rooms: reading ranking of %s failed, using this worker's results: %s", room.code, e)
+            if entries is None:
+                entries, total = self._local_ranking(room)
+            ranking = [{"rank": n, "name": e.get("name"), "score": e.get("score", 0), "percentage": e.get("percentage"),
+                        "timeSpent": e.get("timeSpent")} for n, e in enumerate(entries, start=1)]
+            room.ranking_body = json_dumps({"room": room.code, "participants": len(room.participants),
+                                            "submissions": total, "ranking": ranking})
+            room.ranking_at = time.monotonic()
+            return room.ranking_body
@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import auth
+import main
+
+
+def test_parse_api_keys():
+    keys = auth.parse_api_keys("frontend:abc:quiz|chat, ops:xyz:admin,,broken,all:k")
+    assert [(k.name, sorted(k.scopes)) for k in keys] == [
+        ("frontend", ["chat", "quiz"]), ("ops", ["admin"]), ("all", ["admin", "chat", "quiz"])]
+
+
+def test_required_scope():
+    assert auth.required_scope("/metrics") == "admin"
+    assert auth.required_scope("/admin/chat-cache") == "admin"
+    assert auth.required_scope("/quiz/chat") == "chat"
+    assert auth.required_scope("/chat") == "chat"
+    assert auth.required_scope("/quiz/questions") == "quiz"
+    assert auth.required_scope("/health/ready") is None
+
+
+def test_key_ring_checks_every_key():
+    ring = auth.KeyRing(auth.parse_api_keys("a:same:quiz,b:other:admin"))
+    assert ring.match("other").name == "b"
+    assert ring.match(b"same").name == "a"
+    assert ring.match("sam") is None and ring.match("") is None
+    assert ring.allows("other", "admin") and not ring.allows("same", "admin")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # the middleware holds main.api_keys; swap its keys rather than the object
+    monkeypatch.setattr(main.api_keys, "keys", auth.parse_api_keys("frontend:front-key:quiz|chat,ops:ops-key:admin"))
+    return TestClient(main.app)
+
+
+def _get(client, path, key=None):
+    headers = {"Authorization": f"Bearer {key}"} if key else {}
+    return client.get(path, headers=headers)
+
+
+@pytest.mark.parametrize("path", ["/metrics", "/admin/chat-cache", "/admin/chat-sessions", "/admin/question-stats"])
+def test_admin_routes_need_the_admin_scope(client, path):
+    assert _get(client, path).status_code == 401
+    assert _get(client, path).headers["WWW-Authenticate"] == "Bearer"
+    assert _get(client, path, "wrong-key").status_code == 401
+    assert _get(client, path, "front-key").status_code == 403
+    assert _get(client, path, "ops-key").status_code == 200
+
+
+def test_quiz_routes_and_public_paths(client):
+    assert _get(client, "/quiz/leaderboard", "ops-key").status_code == 403
+    assert client.get("/quiz/leaderboard", headers={"Authorization": "Basic front-key"}).status_code == 401
+    assert client.options("/quiz/leaderboard").status_code != 401  # CORS preflight carries no key
+    assert _get(client, "/health/ready").status_code != 401
+
+
+def test_no_keys_means_development_mode(monkeypatch):
+    monkeypatch.setattr(main.api_keys, "keys", [])
+    assert _get(TestClient(main.app), "/admin/chat-sessions").status_code == 200
+
+
+def test_legacy_api_key_has_no_admin_scope(monkeypatch):
+    monkeypatch.setenv("API_KEYS", "")
+    monkeypatch.setenv("API_KEY", "legacy-key")
+    monkeypatch.setattr(main.api_keys, "keys", auth.load_keys().keys)
+    client = TestClient(main.app)
+    for path in ("/metrics", "/admin/chat-cache", "/admin/chat-sessions", "/admin/question-stats"):
+        assert _get(client, path, "legacy-key").status_code == 403
+    assert _get(client, "/quiz/leaderboard", "legacy-key").status_code != 403
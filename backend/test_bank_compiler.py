@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+import bank_compiler
+import question_bank
+from fast_json import encode_str
+
+LEVELS = {
+    "mudah": [
+        {"question": "Siapa proklamator kemerdekaan Indonesia?", "choices": ["Soekarno", "Soeharto", "Habibie", "Gus Dur"], "answer": 0},
+        {"question": 'Apa arti "merdeka"?', "choices": ["Bebas", "Terjajah"], "answer": 1},
+        {"question": "Lagu kebangsaan Indonesia — judulnya?", "choices": ["Indonesia Raya", "Halo-halo Bandung", "Garuda Pancasila", "Satu Nusa"], "answer": 3},
+    ],
+    "sulit": [
+        {"question": "Kapan Agresi Militer Belanda I dimulai?", "choices": ["21 Juli 1947", "19 Desember 1948", "17 Agustus 1945", "Soekarno"], "answer": 0},
+    ],
+}
+
+
+@pytest.fixture
+def soal(tmp_path):
+    for name, questions in LEVELS.items():
+        (tmp_path / f"{name}.json").write_text(json.dumps({"questions": questions}, ensure_ascii=False), encoding="utf-8")
+    return tmp_path
+
+
+def test_round_trip_matches_the_json_files(soal):
+    out = str(soal / "bank.qmb")
+    assert bank_compiler.compile_bank(str(soal), out) == {"mudah": 3, "sulit": 1}
+    bank = bank_compiler.CompiledBank(out)
+    assert sorted(bank.levels) == ["mudah", "sulit"]
+    for name, items in LEVELS.items():
+        level = bank.levels[name]
+        assert len(level) == len(items)
+        assert level.matches_source(str(soal / f"{name}.json"))
+        for i, item in enumerate(items):
+            q = level.question(i)
+            assert (q.text, q.choices, q.answer) == (item["question"], item["choices"], item["answer"])
+            assert q.qid == bank_compiler.question_id(item["question"], item["choices"], item["answer"]) == level.qid(i)
+            # JSON fragments are zero-copy slices of the mapping, already encoded
+            assert isinstance(q.text_json, memoryview)
+            assert bytes(q.text_json) == encode_str(item["question"])
+            assert [bytes(c) for c in q.choices_json] == [encode_str(c) for c in item["choices"]]
+    # one bucket per original answer index, read in place
+    assert [list(b) for b in bank.levels["mudah"].buckets] == [[0], [1], [], [2]]
+    # a string used twice ("Soekarno") is stored once
+    assert bank.nstrings == len({s for items in LEVELS.values() for q in items for s in [q["question"], *q["choices"]]})
+
+
+def test_invalid_level_keeps_the_previous_file(soal):
+    out = soal / "bank.qmb"
+    bank_compiler.compile_bank(str(soal), str(out))
+    before = out.read_bytes()
+    (soal / "sulit.json").write_text(json.dumps({"questions": [{"question": "?", "choices": ["a"], "answer": 0}]}))
+    with pytest.raises(ValueError, match="sulit.json"):
+        bank_compiler.compile_bank(str(soal), str(out))
+    assert out.read_bytes() == before
+    assert not os.path.exists(f"{out}.tmp")
+
+
+def test_not_a_bank(tmp_path):
+    path = tmp_path / "bank.qmb"
+    path.write_bytes(b"QMB0" + b"\0" * 64)
+    with pytest.raises(ValueError):
+        bank_compiler.CompiledBank(str(path))
+
+
+def test_question_bank_serves_the_mapping_until_a_json_file_changes(soal):
+    out = str(soal / "bank.qmb")
+    bank_compiler.compile_bank(str(soal), out)
+    bank = question_bank.QuestionBank(str(soal), fallback=[], compiled_path=out)
+    assert isinstance(bank.level("mudah"), bank_compiler.CompiledLevel)
+    picks = bank.sample("Mudah", 3)
+    body = json.loads(question_bank.render_set(picks, len(picks), 5))
+    assert sorted(q["question"] for q in body["questions"]) == sorted(q["question"] for q in LEVELS["mudah"])
+    for q in body["questions"]:
+        original = next(item for item in LEVELS["mudah"] if item["question"] == q["question"])
+        assert q["choices"][q["answer"]] == original["choices"][original["answer"]]
+        assert bank.find(q["id"])[0] == "mudah"
+
+    # an edit after compiling: that level comes from the JSON file, the others stay mapped
+    edited = LEVELS["mudah"] + [{"question": "Siapa wakil presiden pertama?", "choices": ["Hatta", "Sjahrir", "Tan Malaka", "Natsir"], "answer": 0}]
+    path = soal / "mudah.json"
+    path.write_text(json.dumps({"questions": edited}), encoding="utf-8")
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    bank.check()
+    assert not isinstance(bank.level("mudah"), bank_compiler.CompiledLevel)
+    assert len(bank.level("mudah")) == 4
+    assert isinstance(bank.level("sulit"), bank_compiler.CompiledLevel)
+    new_id = bank_compiler.question_id("Siapa wakil presiden pertama?", ["Hatta", "Sjahrir", "Tan Malaka", "Natsir"], 0)
+    assert bank.find(new_id)[0] == "mudah"
+
+
+def test_same_text_with_another_answer_is_another_question(soal):
+    same = [{"question": "BPUPKI dibentuk pada tahun?", "choices": ["1945", "1944", "1943", "1942"], "answer": 1},
+            {"question": "BPUPKI dibentuk pada tahun?", "choices": ["1944", "1943", "1942", "1945"], "answer": 3}]
+    (soal / "sedang.json").write_text(json.dumps({"questions": same}), encoding="utf-8")
+    out = str(soal / "bank.qmb")
+    bank_compiler.compile_bank(str(soal), out)
+    compiled = bank_compiler.CompiledBank(out).levels["sedang"]
+    json_view = question_bank._view(bank_compiler.normalize_questions(same))
+    for view in (compiled, json_view):
+        assert view.qid(0) != view.qid(1)
+        assert [view.qid(i) for i in range(2)] == [compiled.qid(i) for i in range(2)]
+    bank = question_bank.QuestionBank(str(soal), fallback=[], compiled_path=out)
+    assert [bank.find(compiled.qid(i))[2] for i in range(2)] == [0, 1]
@@ -0,0 +1,54 @@
+from chat_cache import ChatAnswerCache
+from text_similarity import markers, normalize_text
+
+
+def test_normalize_drops_case_punctuation_particles_and_fillers():
+    assert normalize_text("Siapakah proklamator Indonesia?") == normalize_text("siapa  proklamator")
+    assert normalize_text("Tolong jelaskan, kapan Sumpah Pemuda?") == "kapan sumpah pemuda"
+    assert normalize_text("") == ""
+
+
+def test_negations_are_kept():
+    assert normalize_text("Siapa yang tidak hadir saat proklamasi?") != normalize_text("Siapa yang hadir saat proklamasi?")
+    for word in ("tidak", "bukan", "belum", "tanpa"):
+        assert word in normalize_text(f"Peristiwa apa yang {word} terjadi tahun 1945?")
+
+
+def test_markers_cover_numbers_numerals_and_negations():
+    assert markers(normalize_text("Agresi Militer Belanda II tahun 1948")) == ["ii", "1948"]
+    assert markers(normalize_text("Siapa yang tidak hadir?")) == ["tidak"]
+    assert markers(normalize_text("Siapa proklamator?")) == []
+
+
+def test_exact_and_fuzzy_hits():
+    cache = ChatAnswerCache(similarity=0.6)
+    assert cache.store("Siapa tokoh yang memimpin Perang Diponegoro di Jawa?", "Pangeran Diponegoro.")
+    assert cache.lookup("siapakah tokoh yang memimpin perang diponegoro di jawa") == ("Pangeran Diponegoro.", "exact")
+    assert cache.lookup("Siapa tokoh pemimpin Perang Diponegoro di Jawa?") == ("Pangeran Diponegoro.", "fuzzy")
+    assert cache.lookup("Kapan Sumpah Pemuda diikrarkan?") is None
+    assert (cache.hits_exact, cache.hits_fuzzy, cache.misses) == (1, 1, 1)
+
+
+def test_negated_question_never_gets_the_cached_answer():
+    cache = ChatAnswerCache(similarity=0.5)
+    cache.store("Siapa anggota PPKI yang hadir pada rapat 18 Agustus 1945?", "Soekarno, Hatta, ...")
+    assert cache.lookup("Siapa anggota PPKI yang tidak hadir pada rapat 18 Agustus 1945?") is None
+
+
+def test_numbers_and_roman_numerals_must_match():
+    cache = ChatAnswerCache(similarity=0.5)
+    cache.store("Kapan Agresi Militer Belanda I terjadi?", "21 Juli 1947.")
+    cache.store("Apa isi perjanjian yang ditandatangani tahun 1946?", "Linggarjati.")
+    assert cache.lookup("Kapan Agresi Militer Belanda II terjadi?") is None
+    assert cache.lookup("Apa isi perjanjian yang ditandatangani tahun 1948?") is None
+    assert cache.lookup("Kapan Agresi Militer Belanda I berlangsung?") == ("21 Juli 1947.", "fuzzy")
+
+
+def test_store_rejects_empty_and_oversized_answers_and_purge():
+    cache = ChatAnswerCache(max_answer_chars=10)
+    assert not cache.store("Siapa proklamator?", "")
+    assert not cache.store("Siapa proklamator?", "x" * 11)
+    assert not cache.store("???", "Jawaban.")
+    assert cache.store("Siapa proklamator?", "Soekarno.")
+    assert cache.purge("siapa proklamator") == 1
+    assert cache.lookup("Siapa proklamator?") is None
@@ -0,0 +1,59 @@
+from chat_sessions import ChatSessionStore
+import ttl_cache
+
+
+def _answer(k):
+    # one long sentence of exactly 400 characters (100 tokens)
+    return f"Jawaban {k:02d} " + "x" * 389 + "."
+
+
+def test_old_turns_fold_into_a_bounded_summary():
+    store = ChatSessionStore(max_sessions=10, idle_seconds=60, max_chars=10**6)
+    session = store.get_or_create()
+    for k in range(1, 13):
+        store.add_turn(session, f"Soal nomor {k:02d}?", _answer(k))
+    # 5 turns of 104 tokens fit the 600-token window; the 7 older ones were folded
+    assert [q for q, _ in session.turns] == [f"Soal nomor {k:02d}?" for k in range(8, 13)]
+    assert session.turns[0][1] == _answer(8)
+    # a 179-character line is 45 tokens: only the newest 4 fit the 200-token summary
+    assert [line.split(" → ")[0] for line in session.summary] == [f"- Soal nomor {k:02d}?" for k in range(4, 8)]
+    assert session.summary[0].split(" → ")[1].startswith("Jawaban 04 ")
+    messages = session.messages("Kamu tutor sejarah.")
+    assert messages[0]["role"] == "system" and "Soal nomor 04?" in messages[0]["content"]
+    assert "Soal nomor 03?" not in messages[0]["content"]
+    assert [m["content"] for m in messages[1:] if m["role"] == "user"] == [f"Soal nomor {k:02d}?" for k in range(8, 13)]
+    assert session.count == 12
+    assert store.stats()["chars"] == session.chars
+
+
+def test_global_cap_evicts_the_least_recently_used_sessions():
+    store = ChatSessionStore(max_sessions=10, idle_seconds=60, max_chars=1200)
+    a, b = store.get_or_create(), store.get_or_create()
+    store.add_turn(a, "Soal A?", _answer(1))
+    store.add_turn(b, "Soal B?", _answer(2))
+    assert store.get_or_create(a.id) is a  # b is now the least recently used
+    c = store.get_or_create()
+    store.add_turn(c, "Soal C?", _answer(3))
+    assert store.get_or_create(a.id) is a and [q for q, _ in a.turns] == ["Soal A?"]
+    assert store.get_or_create(c.id) is c and [q for q, _ in c.turns] == ["Soal C?"]
+    fresh = store.get_or_create(b.id)
+    assert fresh is not b and fresh.is_new
+    stats = store.stats()
+    assert stats["evicted"] == 1 and stats["chars"] == a.chars + c.chars <= 1200
+
+
+def test_idle_sessions_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    store = ChatSessionStore(max_sessions=10, idle_seconds=60, max_chars=10**6)
+    a, b = store.get_or_create(), store.get_or_create()
+    store.add_turn(a, "Soal A?", _answer(1))
+    store.add_turn(b, "Soal B?", _answer(2))
+    now[0] += 40
+    assert store.get_or_create(a.id) is a  # a read refreshes the idle timer
+    now[0] += 30
+    assert store.get_or_create(a.id) is a and [q for q, _ in a.turns] == ["Soal A?"]
+    fresh = store.get_or_create(b.id)
+    assert fresh is not b and fresh.is_new and fresh.id != b.id
+    stats = store.stats()
+    assert stats["evicted"] == 1 and stats["chars"] == a.chars
@@ -0,0 +1,103 @@
+import asyncio
+import gzip
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import compression
+import main
+
+BODY = b'{"questions":[' + b",".join(b'{"question":"Soal nomor %d tentang sejarah"}' % i for i in range(40)) + b"]}"
+
+
+def test_choose_encoding_honours_q_values():
+    assert compression.choose_encoding("gzip") == "gzip"
+    assert compression.choose_encoding("gzip;q=0, identity") is None
+    assert compression.choose_encoding(b"*") in ("br", "gzip")
+    assert compression.choose_encoding("") is None
+
+
+def test_inline_cache_compresses_once_at_normal_level(monkeypatch):
+    cache = compression.PrecompressedCache()
+    calls = []
+    real = compression.compress
+
+    def counting(data, encoding, best=False):
+        calls.append(best)
+        return real(data, encoding, best)
+
+    monkeypatch.setattr(compression, "compress", counting)
+    first = cache.encoded(BODY, "gzip")
+    assert cache.encoded(BODY, "gzip") is first
+    assert calls == [False]
+    assert gzip.decompress(first) == BODY
+
+
+def test_best_cache_compresses_off_the_loop():
+    cache = compression.PrecompressedCache(best=True)
+
+    async def scenario():
+        assert cache.encoded(BODY, "gzip") is None  # being compressed on a worker thread
+        for _ in range(100):
+            await asyncio.sleep(0.01)
+            data = cache.encoded(BODY, "gzip")
+            if data is not None:
+                return data
+        raise AssertionError("never compressed")
+
+    assert gzip.decompress(asyncio.run(scenario())) == BODY
+
+
+def _app(cache):
+    app = FastAPI()
+
+    @app.get("/body")
+    async def body(request: Request):
+        return cache.response(request, BODY)
+
+    app.add_middleware(compression.CompressionMiddleware)
+    return TestClient(app)
+
+
+def test_best_cache_serves_plain_body_to_the_middleware_until_ready():
+    client = _app(compression.PrecompressedCache(best=True))
+    first = client.get("/body", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["vary"] == "Accept-Encoding"
+    assert first.content == BODY
+
+
+def test_identity_clients_are_not_compressed():
+    client = _app(compression.PrecompressedCache())
+    assert "content-encoding" not in client.get("/body", headers={"Accept-Encoding": "identity"}).headers
+
+
+class _Cursor(list):
+    def sort(self, *args):
+        return self
+
+
+class _Leaderboard:
+    def __init__(self):
+        self.docs = []
+        self.finds = 0
+
+    def find(self, *args):
+        self.finds += 1
+        return _Cursor(self.docs)
+
+
+def test_leaderboard_is_cached_and_invalidated(monkeypatch):
+    coll = _Leaderboard()
+    coll.docs.append({"name": "Ani", "email": "ani@example.com", "score": 9})
+    monkeypatch.setattr(main, "leaderboard_collection", coll)
+    main._invalidate_leaderboard()
+    client = TestClient(main.app)
+    for _ in range(5):
+        assert [e["name"] for e in client.get("/quiz/leaderboard").json()] == ["Ani"]
+    assert coll.finds == 1
+    coll.docs.append({"name": "Budi", "email": "budi@example.com", "score": 7})
+    main._invalidate_leaderboard()
+    assert [e["name"] for e in client.get("/quiz/leaderboard").json()] == ["Ani", "Budi"]
+    assert coll.finds == 2
+    main._invalidate_leaderboard()
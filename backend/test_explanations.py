@@ -0,0 +1,60 @@
+import asyncio
+import json
+import time
+
+import explanations
+
+
+def _fake_bank(n):
+    return [("sulit.json", {"question": f"Pertanyaan nomor {i}?"}, f"Jawaban {i}") for i in range(n)]
+
+
+def test_checkpoints_write_a_snapshot_while_tasks_keep_adding(tmp_path, monkeypatch):
+    monkeypatch.setattr(explanations, "iter_bank_questions", lambda: _fake_bank(60))
+
+    def generate(api_key, question, correct, timeout):
+        time.sleep(0.002)
+        return f"{correct} benar karena begitulah catatan sejarahnya."
+
+    write = explanations._write_sidecar
+
+    def slow_write(path, data):
+        # iterate slowly, the way json.dump walks the dict, while other tasks finish
+        for _ in data["explanations"]:
+            time.sleep(0.0005)
+        write(path, data)
+
+    monkeypatch.setattr(explanations, "_generate", generate)
+    monkeypatch.setattr(explanations, "_write_sidecar", slow_write)
+    sidecar = tmp_path / "explanations.json"
+    counters = asyncio.run(explanations.run_batch("key", str(sidecar), concurrency=8, rps=0, checkpoint_every=1))
+    assert counters == {"ok": 60, "invalid": 0, "failed": 0}
+    assert len(json.loads(sidecar.read_text(encoding="utf-8"))["explanations"]) == 60
+    assert len(explanations.load_explanations(str(sidecar))) == 60
+
+
+def test_no_backoff_after_the_last_attempt(tmp_path, monkeypatch):
+    monkeypatch.setattr(explanations, "iter_bank_questions", lambda: _fake_bank(1))
+
+    def generate(api_key, question, correct, timeout):
+        raise RuntimeError("upstream down")
+
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(explanations, "_generate", generate)
+    monkeypatch.setattr(explanations.asyncio, "sleep", fake_sleep)
+    counters = asyncio.run(explanations.run_batch("key", str(tmp_path / "e.json"), rps=0, retries=3))
+    assert counters["failed"] == 1
+    assert sleeps == [1, 2]
+
+
+def test_invalid_explanations_are_not_stored(tmp_path, monkeypatch):
+    monkeypatch.setattr(explanations, "iter_bank_questions", lambda: _fake_bank(2))
+    monkeypatch.setattr(explanations, "_generate", lambda *args: '{"explanation": "json instead of prose"}')
+    sidecar = tmp_path / "e.json"
+    counters = asyncio.run(explanations.run_batch("key", str(sidecar), rps=0))
+    assert counters == {"ok": 0, "invalid": 2, "failed": 0}
+    assert explanations.load_explanations(str(sidecar)) == {}
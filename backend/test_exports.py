@@ -0,0 +1,170 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime, timezone
+
+import pymongo
+import pytest
+from bson.objectid import ObjectId
+
+import exports
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[key])
+        return self
+
+    def limit(self, n):
+        return self.docs[:n]
+
+
+class _Submissions:
+    """find() with the `_id` range operators the export uses."""
+
+    def __init__(self, n, fail_after_batches=None):
+        start = int(datetime(2026, 10, 12, tzinfo=timezone.utc).timestamp())
+        self.docs = [{"_id": ObjectId.from_datetime(datetime.fromtimestamp(start + i * 60, timezone.utc)),
+                      "name": f"Siswa {i}", "email": f"s{i}@x.id", "score": i % 10, "feedback": "baris\nbaru"}
+                     for i in range(n)]
+        self.finds = 0
+        self.fail_after_batches = fail_after_batches
+
+    def find(self, query):
+        if self.fail_after_batches is not None and self.finds >= self.fail_after_batches:
+            raise pymongo.errors.AutoReconnect("connection lost")
+        self.finds += 1
+        ops = {"$gt": lambda a, b: a > b, "$gte": lambda a, b: a >= b, "$lt": lambda a, b: a < b}
+        id_range = query.get("_id", {})
+        return _Cursor([d for d in self.docs if all(ops[op](d["_id"], v) for op, v in id_range.items())])
+
+
+def _export(coll, fmt="ndjson", **kwargs):
+    async def collect():
+        return b"".join([chunk async for chunk in exports.stream_export(lambda: coll, {}, fmt, **kwargs)])
+    return asyncio.run(collect())
+
+
+def test_batches_are_paged_by_id_and_resume_after_an_id():
+    coll = _Submissions(25)
+    rows = [json.loads(line) for line in _export(coll, batch_size=10).splitlines()]
+    assert [r["name"] for r in rows] == [f"Siswa {i}" for i in range(25)]
+    assert coll.finds == 3
+    resumed = [json.loads(line) for line in _export(coll, after=ObjectId(rows[9]["id"]), limit=5).splitlines()]
+    assert [r["name"] for r in resumed] == [f"Siswa {i}" for i in range(10, 15)]
+
+
+def test_week_filter_is_an_id_range():
+    coll = _Submissions(3)
+    query = exports.build_query(week="2026-W42")
+    assert [d["name"] for d in exports.fetch_batch(coll, query)] == ["Siswa 0", "Siswa 1", "Siswa 2"]
+    assert exports.fetch_batch(coll, exports.build_query(week="2026-W43")) == []
+    with pytest.raises(ValueError):
+        exports.build_query(start="kemarin")
+
+
+def test_week_is_the_leaderboard_week():
+    # the leaderboard resets Sunday 00:00 WIB; 2026-W42 ends with the reset on Sunday 18 October
+    start, end = exports.week_range("2026-W42")
+    assert start == datetime(2026, 10, 10, 17, tzinfo=timezone.utc)  # Sun 11 Oct 00:00 WIB
+    assert end == datetime(2026, 10, 17, 17, tzinfo=timezone.utc)    # Sun 18 Oct 00:00 WIB
+    assert exports.week_range("2026w43")[0] == end
+
+
+def test_csv_rows_keep_embedded_newlines():
+    rows = list(csv.reader(io.StringIO(_export(_Submissions(2), "csv").decode("utf-8"))))
+    assert rows[0] == list(exports.CSV_FIELDS)
+    assert [r[exports.CSV_FIELDS.index("feedback")] for r in rows[1:]] == ["baris\nbaru", "baris\nbaru"]
+
+
+def test_database_failure_mid_export_is_raised():
+    coll = _Submissions(25, fail_after_batches=1)
+    chunks = []
+
+    async def collect():
+        async for chunk in exports.stream_export(lambda: coll, {}, batch_size=10):
+            chunks.append(chunk)
+
+    with pytest.raises(exports.ExportInterrupted) as info:
+        asyncio.run(collect())
+    assert len(chunks) == 1
+    assert info.value.after == coll.docs[9]["_id"]
+
+
+def test_database_gone_is_raised():
+    async def collect():
+        return [chunk async for chunk in exports.stream_export(lambda: None, {})]
+
+    with pytest.raises(exports.ExportInterrupted):
+        asyncio.run(collect())
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+def test_cli_drops_a_partial_row_and_resumes(tmp_path, monkeypatch, fmt):
+    coll = _Submissions(12)
+    _cli(monkeypatch, coll)
+    out = tmp_path / f"export.{fmt}"
+    full = _export(coll, fmt)
+    # a crash in the middle of row 5
+    cut = full.index(b"Siswa 5")
+    out.write_bytes(full[:cut])
+    assert exports._last_exported_id(str(out), fmt) == (str(coll.docs[4]["_id"]), full.rindex(b"\n", 0, cut) + 1)
+
+    exports.main(["--format", fmt, "--out", str(out), "--mongo-uri", "mongodb://stub", "--batch-size", "5"])
+    assert out.read_bytes() == full
+
+
+def test_last_exported_id_of_a_header_only_or_empty_file(tmp_path):
+    path = tmp_path / "e.csv"
+    path.write_bytes(exports.csv_header())
+    assert exports._last_exported_id(str(path), "csv") == (None, len(exports.csv_header()))
+    path.write_bytes(b'{"id":"65')
+    assert exports._last_exported_id(str(path), "ndjson") == (None, 0)
+
+
+def _cli(monkeypatch, coll):
+    class _Client:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def __getitem__(self, name):
+            return {"submissions": coll}
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(pymongo, "MongoClient", _Client)
+
+
+def test_csv_crlf_inside_a_field_is_not_a_row_end(tmp_path, monkeypatch):
+    coll = _Submissions(6)
+    for d in coll.docs:
+        d["feedback"] = 'kata "guru":\r\n' + str(d["_id"]) + ",bukan baris baru"
+    _cli(monkeypatch, coll)
+    full = _export(coll, "csv")
+    out = tmp_path / "export.csv"
+    # cut just after the CRLF inside row 4's feedback: the line before it looks like a complete row
+    cut = full.index(b"\r\n", full.index(b"Siswa 4")) + 2
+    out.write_bytes(full[:cut])
+    row_4 = full.index(str(coll.docs[4]["_id"]).encode())
+    assert exports._last_exported_id(str(out), "csv") == (str(coll.docs[3]["_id"]), row_4)
+    exports.main(["--format", "csv", "--out", str(out), "--mongo-uri", "mongodb://stub"])
+    assert out.read_bytes() == full
+
+
+def test_csv_resume_of_a_file_larger_than_the_tail_window(tmp_path, monkeypatch):
+    monkeypatch.setattr(exports, "_TAIL_BYTES", 300)
+    coll = _Submissions(40)
+    for n, d in enumerate(coll.docs):
+        d["feedback"] = '"' * (n % 3) + "\r\n" * 20  # long quoted values, varying quote parity
+    _cli(monkeypatch, coll)
+    full = _export(coll, "csv")
+    out = tmp_path / "export.csv"
+    out.write_bytes(full[:full.index(b"Siswa 31") + 40])
+    assert exports._last_exported_id(str(out), "csv")[0] == str(coll.docs[30]["_id"])
+    exports.main(["--format", "csv", "--out", str(out), "--mongo-uri", "mongodb://stub"])
+    assert out.read_bytes() == full
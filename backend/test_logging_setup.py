@@ -0,0 +1,47 @@
+import hashlib
+import json
+import logging
+import queue
+import sys
+
+import logging_setup
+import pseudonyms
+import traffic_capture
+
+
+def _record(msg, *args, exc_info=None):
+    return logging.LogRecord("test", logging.ERROR, __file__, 1, msg, args, exc_info)
+
+
+def test_prepare_renders_the_message_and_drops_args_and_exc_info():
+    handler = logging_setup.DroppingQueueHandler(queue.Queue())
+    payload = {"email": "ani@example.com", "score": 9}
+    try:
+        raise ValueError("gagal untuk budi@example.com")
+    except ValueError:
+        record = _record("payload %s", payload, exc_info=sys.exc_info())
+    prepared = handler.prepare(record)
+    payload["score"] = 0  # changed after logging: the queued record must not see it
+    assert prepared.args is None and prepared.exc_info is None
+    assert "'score': 9" in prepared.msg and "ani@example.com" not in prepared.msg
+    assert "ValueError" in prepared.exc_text and "budi@example.com" not in prepared.exc_text
+    assert record.args and record.exc_info  # other handlers still get the original record
+
+    line = json.loads(logging_setup.JsonFormatter().format(prepared))
+    assert line["msg"] == prepared.msg
+    assert "ValueError" in line["exc"]
+
+
+def test_long_messages_are_clipped_once():
+    handler = logging_setup.DroppingQueueHandler(queue.Queue())
+    prepared = handler.prepare(_record("x" * (logging_setup.LOG_MAX_MESSAGE_CHARS + 50)))
+    assert logging_setup.render_message(prepared).endswith("...[50 chars truncated]")
+
+
+def test_pseudonyms_are_keyed():
+    email = "Ani@Example.com"
+    assert pseudonyms.pseudonym(email) == pseudonyms.pseudonym(" ani@example.com ")
+    assert pseudonyms.pseudonym(email) != hashlib.sha1(b"ani@example.com").hexdigest()[:10]
+    assert pseudonyms.pseudonym(email, secret=b"a") != pseudonyms.pseudonym(email, secret=b"b")
+    assert logging_setup.redact(f"kirim ke {email}") == f"kirim ke <email:{pseudonyms.pseudonym(email, 8)}>"
+    assert traffic_capture.pseudonymize_email(email) == f"user-{pseudonyms.pseudonym(email)}@example.invalid"
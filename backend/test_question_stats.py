@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import main
+import question_stats
+
+BANK = {"q1": SimpleNamespace(choices=["1945", "1946", "1947", "1948"], answer=0)}
+
+
+def test_bank_outcomes_are_graded_from_the_bank():
+    raw = [
+        {"id": "q1", "choice": "1945", "correct": False, "ms": 1200},  # right, whatever the client says
+        {"id": "q1", "choice": "1947", "correct": True},               # wrong, whatever the client says
+        {"id": "q1", "choice": None, "correct": True},                 # skipped
+        {"id": "q1", "choice": 2, "correct": True},                    # a shuffled index can't be graded
+        {"id": "q1", "choice": "1950", "correct": True},               # not one of the choices
+    ]
+    assert question_stats.parse_outcomes(raw, question_of=BANK.get) == [
+        {"q": "q1", "c": 0, "ok": True, "ms": 1200},
+        {"q": "q1", "c": 2, "ok": False, "ms": None},
+        {"q": "q1", "c": -1, "ok": False, "ms": None},
+    ]
+
+
+def test_other_questions_keep_the_client_fields():
+    raw = [{"question": "Soal dari AI?", "choice": 1, "correct": True, "ms": -5}, "junk", {"choice": 1}]
+    [entry] = question_stats.parse_outcomes(raw, question_of=BANK.get)
+    assert entry["c"] == 1 and entry["ok"] and entry["ms"] is None
+    assert entry["q"] == question_stats.question_id("Soal dari AI?")
+
+
+def test_submit_recounts_correctness(monkeypatch):
+    monkeypatch.setattr(main, "submissions_collection", None)
+    monkeypatch.setattr(main, "leaderboard_collection", None)
+    stats = question_stats.QuestionStats(min_attempts=1)
+    monkeypatch.setattr(main, "question_stats_store", stats)
+    pick = main.question_bank_store.sample("mudah", 1)[0].as_dict()
+    wrong = next(c for i, c in enumerate(pick["choices"]) if i != pick["answer"])
+    outcomes = [{"id": pick["id"], "choice": wrong, "correct": True, "ms": 1000},
+                {"id": pick["id"], "choice": pick["choices"][pick["answer"]], "correct": False, "ms": 1000}]
+    r = TestClient(main.app).post("/quiz/submit", json={"name": "Ani", "email": "ani@example.com", "answer": 1,
+                                                         "totalQuestions": 1, "outcomes": outcomes})
+    assert r.status_code == 200
+    assert stats.stats(pick["id"])["attempts"] == 2
+    assert stats.stats(pick["id"])["correct"] == 1
+
+
+def test_bank_questions_sharing_a_text_are_graded_separately(monkeypatch):
+    monkeypatch.setattr(main, "submissions_collection", None)
+    monkeypatch.setattr(main, "leaderboard_collection", None)
+    stats = question_stats.QuestionStats(min_attempts=1)
+    monkeypatch.setattr(main, "question_stats_store", stats)
+    view = main.question_bank_store.level("sulit")
+    by_text = {}
+    for i in range(len(view)):
+        q = view.question(i)
+        by_text.setdefault(q.text, {})[q.choices[q.answer]] = q
+    # the bank really has such pairs, e.g. "BPUPKI dibentuk ..." keyed 1944 and 1945
+    pair = next(list(answers.values()) for answers in by_text.values() if len(answers) > 1)
+    assert pair[0].qid != pair[1].qid
+    outcomes = [{"id": q.qid, "choice": q.choices[q.answer], "correct": False, "ms": 500} for q in pair[:2]]
+    r = TestClient(main.app).post("/quiz/submit", json={"name": "Ani", "email": "ani@example.com", "answer": 2,
+                                                         "totalQuestions": 2, "outcomes": outcomes})
+    assert r.status_code == 200
+    for q in pair[:2]:
+        assert stats.stats(q.qid)["attempts"] == 1
+        assert stats.stats(q.qid)["correct"] == 1
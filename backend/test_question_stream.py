@@ -0,0 +1,169 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+import main
+import question_bank
+from question_stream import IncrementalQuestionParser, validate_question
+
+
+def _item(i, **overrides):
+    return {"question": f"Soal nomor {i}?", "choices": ["A", "B", "C", "D"], "answer": i % 4, **overrides}
+
+
+def test_items_split_across_chunks_are_emitted_once_complete():
+    text = "```json\n" + json.dumps({"total_questions": 3, "questions": [_item(0), _item(1), _item(2)]}) + "\n```"
+    parser = IncrementalQuestionParser()
+    got = []
+    for i in range(0, len(text), 7):
+        got.extend(parser.feed(text[i:i + 7]))
+    assert [q["question"] for q in got] == ["Soal nomor 0?", "Soal nomor 1?", "Soal nomor 2?"]
+    assert parser.invalid_items == 0
+
+
+def test_braces_and_quotes_inside_strings_do_not_confuse_the_parser():
+    item = _item(0, question='Apa arti "{merdeka}" dalam teks \\"proklamasi\\"?')
+    got = IncrementalQuestionParser().feed(json.dumps({"questions": [item]}))
+    assert got == [item]
+
+
+def test_a_malformed_item_only_costs_that_item():
+    text = '{"questions": [%s, {"question": "rusak", "choices": [1,, 2]}, %s]}' % (
+        json.dumps(_item(0)), json.dumps(_item(1)))
+    parser = IncrementalQuestionParser()
+    got = parser.feed(text)
+    assert [q["question"] for q in got] == ["Soal nomor 0?", "Soal nomor 1?"]
+    assert parser.invalid_items == 1
+
+
+def test_runaway_items_are_dropped_and_the_parser_resynchronises():
+    parser = IncrementalQuestionParser(max_item_chars=200)
+    got = parser.feed('{"questions": [{"question": "' + "x" * 500)
+    got += parser.feed('"}, ' + json.dumps(_item(1)) + "]}")
+    assert parser.invalid_items == 1
+    assert [q["question"] for q in got] == ["Soal nomor 1?"]
+
+
+def test_validate_question():
+    assert validate_question(_item(1, answer="2")) == _item(1, answer=2)
+    assert validate_question(_item(1, choices=["A", "B", "C"])) is None
+    assert validate_question(_item(1, choices=["A", "a", "C", "D"])) is None
+    assert validate_question(_item(1, choices=["A", "", "C", "D"])) is None
+    assert validate_question(_item(1, answer=4)) is None
+    assert validate_question(_item(1, answer=True)) is None
+    assert validate_question(_item(1, question=" ")) is None
+
+
+class _Response:
+    ok = True
+
+    def __init__(self, content):
+        self._content = content
+
+    def json(self):
+        return {"choices": [{"message": {"content": self._content}}]}
+
+
+def _ai_set(monkeypatch, content, target_count=3):
+    async def fake_call(*args, **kwargs):
+        return _Response(content)
+
+    monkeypatch.setattr(main, "_upstream_call", fake_call)
+    return asyncio.run(main._ai_question_set("mudah", target_count, 5, "anak", "/quiz/questions"))
+
+
+def test_well_formed_ai_json_is_validated_too(monkeypatch):
+    content = json.dumps({"total_questions": 3, "time_minutes": 5,
+                          "questions": [_item(0), _item(1, answer=9), _item(2, choices=["A", "B"]), _item(0)]})
+    question_set = _ai_set(monkeypatch, content)
+    questions = question_set["questions"]
+    assert questions[0] == _item(0)
+    assert len(questions) == 3 and question_set["total_questions"] == 3
+    # the invalid and duplicate items were replaced from the bank
+    assert all(validate_question(q) for q in questions[1:])
+    assert all(q["question"] != "Soal nomor 0?" for q in questions[1:])
+
+
+def test_ai_set_without_any_valid_item_is_rejected(monkeypatch):
+    assert _ai_set(monkeypatch, json.dumps({"questions": [_item(0, answer=7)]})) is None
+    assert _ai_set(monkeypatch, json.dumps({"questions": "none"})) is None
+    assert _ai_set(monkeypatch, "Maaf, saya tidak bisa.") is None
+
+
+def test_ai_set_is_capped_at_the_target_count(monkeypatch):
+    question_set = _ai_set(monkeypatch, "```" + json.dumps({"questions": [_item(i) for i in range(5)]}) + "```", 2)
+    assert [q["question"] for q in question_set["questions"]] == ["Soal nomor 0?", "Soal nomor 1?"]
+
+
+BANK_TEXTS = ["Siapa yang membacakan teks Proklamasi?", "Siapakah yang membacakan teks proklamasi ?",
+              "Kapan Sumpah Pemuda diikrarkan?", "Di mana Proklamasi dibacakan?"]
+
+
+def _stream(monkeypatch, ai_items=None):
+    # four questions but three near-duplicate clusters: at most three can be sampled
+    view = question_bank._view([(text, ["A", "B", "C", "D"], i % 4) for i, text in enumerate(BANK_TEXTS)])
+    monkeypatch.setattr(main.question_bank_store, "_levels", {"mudah": view})
+    monkeypatch.setattr(main, "UNLI_API_KEY", "test-key" if ai_items is not None else "")
+    if ai_items is not None:
+        class _Stream:
+            def close(self):
+                pass
+
+        async def allowed(request, route):
+            return True
+
+        monkeypatch.setattr(main, "_ai_questions_allowed", allowed)
+        monkeypatch.setattr(main, "_open_question_stream", lambda target_count, age_group: _Stream())
+        monkeypatch.setattr(main, "iter_stream_content", lambda resp: iter([json.dumps({"questions": ai_items})]))
+    r = TestClient(main.app).post("/quiz/questions/stream", json={"difficulty": "Mudah"})
+    assert r.status_code == 200
+    return [json.loads(line) for line in r.text.splitlines()]
+
+
+def test_stream_meta_counts_the_questions_actually_sent(monkeypatch):
+    meta, *questions, done = _stream(monkeypatch)
+    assert meta["type"] == "meta" and done["type"] == "done"
+    assert meta["total_questions"] == len(questions) == done["count"] == 3
+    assert {q["source"] for q in questions} == {"bank"}
+
+
+def test_stream_bank_top_up_completes_the_announced_count(monkeypatch):
+    ai_items = [_item(0, question=BANK_TEXTS[2]), _item(1, question="Siapa presiden pertama Indonesia?")]
+    meta, *questions, done = _stream(monkeypatch, ai_items)
+    assert meta["total_questions"] == len(questions) == done["count"] == 3
+    assert [q["source"] for q in questions] == ["ai", "ai", "bank"]
+    # the AI question ruled out its bank cluster
+    assert questions[2]["question"] in BANK_TEXTS and questions[2]["question"] != BANK_TEXTS[2]
+
+
+def test_cached_ai_set_is_shared_but_shuffled_per_response(monkeypatch):
+    question_set = {"total_questions": 4, "time_minutes": 5, "questions": [_item(i) for i in range(4)]}
+    calls = []
+
+    async def allowed(request, route):
+        return True
+
+    async def fake_set(*args):
+        calls.append(args)
+        return question_set
+
+    monkeypatch.setattr(main, "UNLI_API_KEY", "test-key")
+    monkeypatch.setattr(main, "_ai_questions_allowed", allowed)
+    monkeypatch.setattr(main, "_ai_question_set", fake_set)
+    monkeypatch.setattr(main, "ai_question_sets", main.TTLCache(maxsize=4, ttl=30))
+    client = TestClient(main.app)
+    orders = set()
+    for _ in range(10):
+        body = client.post("/quiz/questions", json={"difficulty": "Mudah"}).json()
+        by_text = {q["question"]: q for q in body["questions"]}
+        assert sorted(by_text) == sorted(q["question"] for q in question_set["questions"])
+        for original in question_set["questions"]:
+            q = by_text[original["question"]]
+            assert sorted(q["choices"]) == sorted(original["choices"])
+            assert q["choices"][q["answer"]] == original["choices"][original["answer"]]
+        orders.add(tuple(c for q in body["questions"] for c in q["choices"]))
+    assert len(calls) == 1
+    assert len(orders) > 1
+    # the cached set itself is never reordered
+    assert question_set["questions"] == [_item(i) for i in range(4)]
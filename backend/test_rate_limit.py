@@ -0,0 +1,98 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import rate_limit
+from explanations import explanation_key
+
+
+def test_bucket_allows_burst_then_refuses():
+    store = rate_limit.LocalBucketStore(per_minute=60, burst=3)
+    assert [store.take("ip:a")[0] for _ in range(4)] == [True, True, True, False]
+    allowed, retry_after = store.take("ip:a")
+    assert not allowed and 0 < retry_after <= 1.0
+    # buckets are per client
+    assert store.take("ip:b")[0]
+
+
+def test_bucket_refills_over_time(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    store = rate_limit.LocalBucketStore(per_minute=60, burst=1)
+    assert store.take("ip:a")[0]
+    assert not store.take("ip:a")[0]
+    now[0] += 1.0
+    assert store.take("ip:a")[0]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    limiter = rate_limit.RateLimiter(rate_limit.LocalBucketStore(per_minute=0, burst=2))
+    monkeypatch.setattr(main, "rate_limiter", limiter)
+
+    async def no_upstream(*args, **kwargs):
+        raise RuntimeError("no upstream in tests")
+
+    monkeypatch.setattr(main, "_upstream_call", no_upstream)
+    return TestClient(main.app)
+
+
+def test_precomputed_explanations_are_not_charged(client, monkeypatch):
+    monkeypatch.setitem(main.precomputed_explanations, explanation_key("Kapan merdeka?", "1945"), "Karena 1945.")
+    body = {"question": "Kapan merdeka?", "choices": ["1945", "1949"], "correct_index": 0}
+    for _ in range(10):
+        r = client.post("/quiz/explain", json=body)
+        assert r.status_code == 200
+        assert r.json()["explanation"] == "Karena 1945."
+
+
+def test_upstream_calls_are_charged(client):
+    body = {"question": "Pertanyaan tanpa penjelasan?", "choices": ["a", "b"], "correct_index": 1}
+    assert [client.post("/quiz/explain", json=body).status_code for _ in range(3)] == [200, 200, 429]
+    r = client.post("/quiz/explain", json=body)
+    assert r.status_code == 429
+    assert int(r.headers["Retry-After"]) >= 1
+    assert r.json()["retry_after"] >= 1
+
+
+def test_chat_cache_hits_are_not_charged(client, monkeypatch):
+    monkeypatch.setattr(main.chat_answer_cache, "lookup", lambda question: ("Soekarno.", 1.0))
+    for _ in range(10):
+        r = client.post("/quiz/chat", json={"question": "Siapa proklamator?"})
+        assert r.status_code == 200
+        assert r.json()["answer"] == "Soekarno."
+
+
+def test_questions_fall_back_to_bank_when_limited(client, monkeypatch):
+    monkeypatch.setattr(main, "UNLI_API_KEY", "test")
+    fallbacks = main.metrics.RATE_LIMITED.labels("/quiz/questions", "fallback")
+    before = fallbacks.value
+    for _ in range(4):
+        r = client.post("/quiz/questions", json={"difficulty": "Mudah"})
+        assert r.status_code == 200
+        assert r.json()["questions"]
+    # two AI attempts used the burst, the other two were served from the bank and counted
+    assert fallbacks.value - before == 2
+
+
+def _scope(*forwarded, peer="10.0.0.5"):
+    return {"client": (peer, 1234), "headers": [(b"x-forwarded-for", v.encode()) for v in forwarded]}
+
+
+def test_client_id_ignores_hops_the_client_wrote():
+    # the proxy appends the real address; anything to its left came from the client
+    assert rate_limit.client_id(_scope("1.2.3.4, 203.0.113.9"), trusted_hops=1) == "ip:203.0.113.9"
+    assert rate_limit.client_id(_scope("6.6.6.6", "203.0.113.9"), trusted_hops=1) == "ip:203.0.113.9"
+    # a CDN in front of the load balancer: two trusted hops
+    assert rate_limit.client_id(_scope("1.2.3.4, 203.0.113.9, 198.51.100.7"), trusted_hops=2) == "ip:203.0.113.9"
+    assert rate_limit.client_id(_scope("203.0.113.9"), trusted_hops=2) == "ip:203.0.113.9"
+    # not behind a proxy: the header is ignored altogether
+    assert rate_limit.client_id(_scope("1.2.3.4"), trusted_hops=0) == "ip:10.0.0.5"
+    assert rate_limit.client_id({**_scope(), "api_key_name": "frontend"}) == "key:frontend"
+
+
+def test_spoofed_leading_hops_share_one_bucket(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUST_PROXY", 1)
+    store = rate_limit.LocalBucketStore(per_minute=0, burst=2)
+    allowed = [store.take(rate_limit.client_id(_scope(f"9.9.9.{n}, 203.0.113.9")))[0] for n in range(5)]
+    assert allowed == [True, True, False, False, False]
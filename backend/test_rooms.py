@@ -0,0 +1,147 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from pymongo.errors import DuplicateKeyError
+
+import main
+import rooms
+from fast_json import dumps as json_dumps
+
+
+class _Rooms:
+    """Just enough of a pymongo collection for RoomStore."""
+
+    def __init__(self):
+        self.docs = {}
+        self.finds = 0
+        self._lock = threading.Lock()
+
+    def insert_one(self, doc):
+        with self._lock:
+            if doc["_id"] in self.docs:
+                raise DuplicateKeyError("duplicate")
+            self.docs[doc["_id"]] = dict(doc)
+
+    def find_one(self, query):
+        with self._lock:
+            self.finds += 1
+        time.sleep(0.05)  # a slow read, so concurrent misses overlap
+        return self.docs.get(query["_id"])
+
+
+def test_concurrent_misses_share_one_read():
+    coll = _Rooms()
+    coll.docs["ABCDEF"] = {"_id": "ABCDEF", "difficulty": "Mudah", "body": '{"questions":[]}',
+                           "created_at": datetime.now(timezone.utc),
+                           "expire_at": datetime.now(timezone.utc) + timedelta(hours=1)}
+    store = rooms.RoomStore(lambda: coll, lambda: None)
+
+    async def scenario():
+        return await asyncio.gather(*(store.get("abcdef") for _ in range(200)))
+
+    found = asyncio.run(scenario())
+    assert coll.finds == 1
+    assert all(r is found[0] for r in found)
+    assert found[0].body == b'{"questions":[]}'
+
+
+def test_unknown_codes_are_remembered():
+    coll = _Rooms()
+    store = rooms.RoomStore(lambda: coll, lambda: None)
+
+    async def scenario():
+        for _ in range(3):
+            assert await store.get("ZZZZZZ") is None
+        assert await store.get("bad") is None
+
+    asyncio.run(scenario())
+    assert coll.finds == 1
+
+
+def test_expired_rooms_are_not_served():
+    coll = _Rooms()
+    coll.docs["OLDOLD"] = {"_id": "OLDOLD", "body": "{}", "expire_at": datetime.utcnow() - timedelta(minutes=1)}
+    store = rooms.RoomStore(lambda: coll, lambda: None)
+    assert asyncio.run(store.get("OLDOLD")) is None
+
+
+def test_join_caps_participants_and_returns_tokens(monkeypatch):
+    monkeypatch.setattr(rooms, "ROOM_MAX_PARTICIPANTS", 2)
+    store = rooms.RoomStore(lambda: None, lambda: None)
+    room = asyncio.run(store.create("Mudah", b"{}"))
+    token = store.join(room, " Ani@Example.com ")
+    assert rooms.token_valid(room.code, "ani@example.com", token)
+    assert store.join(room, "ani@example.com") == token  # joining again is not a new participant
+    store.join(room, "budi@example.com")
+    with pytest.raises(rooms.RoomFull):
+        store.join(room, "citra@example.com")
+    assert not rooms.token_valid(room.code, "budi@example.com", token)
+    assert not rooms.token_valid("OTHER1", "ani@example.com", token)
+    assert not rooms.token_valid(room.code, "ani@example.com", None)
+
+
+def test_best_result_is_kept_without_mongo():
+    store = rooms.RoomStore(lambda: None, lambda: None)
+
+    async def scenario():
+        room = await store.create("Mudah", b"{}")
+        for score, spent in ((5, 100), (7, 200), (7, 150), (6, 10)):
+            await store.submit(room, {"email": "a@x.id", "name": "A", "score": score, "percentage": None, "timeSpent": spent})
+        await store.submit(room, {"email": "b@x.id", "name": "B", "score": 7, "percentage": None, "timeSpent": 120})
+        return await store.ranking(room)
+
+    ranking = json.loads(asyncio.run(scenario()))
+    assert [(e["name"], e["score"], e["timeSpent"]) for e in ranking["ranking"]] == [("B", 7, 120), ("A", 7, 150)]
+
+
+def test_submit_requires_joining_first(monkeypatch):
+    monkeypatch.setattr(main, "db", None)
+    client = TestClient(main.app)
+    code = client.post("/quiz/rooms", json={"name": "Guru", "difficulty": "Mudah"}).json()["code"]
+    result = {"name": "Ani", "email": "ani@example.com", "timeSpent": 60}
+    assert client.post(f"/quiz/rooms/{code}/submit", json=result).status_code == 403
+
+    # results are keyed by email, so joining needs one
+    assert client.post(f"/quiz/rooms/{code}/join", json={"name": "Ani"}).status_code == 400
+    joined = client.post(f"/quiz/rooms/{code}/join", json={"name": "Ani", "email": " Ani@Example.com "})
+    assert joined.status_code == 200 and joined.json()["questions"]
+    token = joined.headers["X-Room-Token"]
+    assert client.post(f"/quiz/rooms/{code}/submit", json={**result, "email": "budi@example.com", "token": token}).status_code == 403
+    assert client.post(f"/quiz/rooms/{code}/submit", json={**result, "token": token}).status_code == 200
+    ranking = client.get(f"/quiz/rooms/{code}/ranking").json()
+    assert [e["name"] for e in ranking["ranking"]] == ["Ani"]
+
+
+def test_score_is_graded_against_the_room_set(monkeypatch):
+    monkeypatch.setattr(main, "db", None)
+    monkeypatch.setattr(rooms, "ROOM_RANKING_REFRESH_SECONDS", 0)
+    client = TestClient(main.app)
+    code = client.post("/quiz/rooms", json={"name": "Guru", "difficulty": "Mudah"}).json()["code"]
+    joined = client.post(f"/quiz/rooms/{code}/join", json={"email": "ani@example.com"})
+    questions = joined.json()["questions"]
+    right = [{"id": q["id"], "choice": q["choices"][q["answer"]]} for q in questions]
+    wrong = {"id": questions[1]["id"], "choice": questions[1]["choices"][(questions[1]["answer"] + 1) % 4]}
+    outcomes = [right[0], right[0], wrong, {"id": questions[2]["id"], "choice": questions[2]["answer"]}]
+    r = client.post(f"/quiz/rooms/{code}/submit", json={
+        "name": "Ani", "email": "ani@example.com", "timeSpent": 60, "token": joined.headers["X-Room-Token"],
+        "score": 100, "percentage": 100, "outcomes": outcomes})
+    assert r.status_code == 200
+    [entry] = client.get(f"/quiz/rooms/{code}/ranking").json()["ranking"]
+    # counted once; wrong text and a bare index score nothing; the client's score is ignored
+    assert (entry["score"], entry["percentage"]) == (1, round(100 / len(questions)))
+
+
+def test_grade_uses_question_text_for_ai_sets():
+    body = json_dumps({"questions": [
+        {"question": "Siapa proklamator?", "choices": ["Soekarno", "Hatta", "Sjahrir", "Tan Malaka"], "answer": 0},
+        {"question": "Kapan Sumpah Pemuda?", "choices": ["1928", "1945", "1908", "1926"], "answer": 0},
+    ]})
+    room = rooms.Room("ABCDEF", "Mudah", body)
+    outcomes = [{"question": "Siapa proklamator?", "choice": "Soekarno"}, {"question": "Kapan Sumpah Pemuda?", "choice": "1945"}]
+    assert rooms.grade(room, outcomes) == (1, 2)
+    assert rooms.grade(room, None) == (0, 2)
@@ -0,0 +1,97 @@
+import pytest
+from bson.objectid import ObjectId
+from fastapi.testclient import TestClient
+
+import main
+from ttl_cache import TTLCache
+
+
+class _InsertResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class _Submissions:
+    """find_one / find({"_id": {"$in": ...}}) / insert_one, counting reads."""
+
+    def __init__(self):
+        self.docs = {}
+        self.reads = []
+
+    def insert_one(self, doc):
+        doc = {**doc, "_id": ObjectId()}
+        self.docs[doc["_id"]] = doc
+        return _InsertResult(doc["_id"])
+
+    def find_one(self, query, projection=None):
+        self.reads.append([query["_id"]])
+        return self.docs.get(query["_id"])
+
+    def find(self, query, projection=None):
+        wanted = query["_id"]["$in"]
+        self.reads.append(list(wanted))
+        # Mongo returns $in matches in index order, not request order
+        return [self.docs[i] for i in sorted(wanted) if i in self.docs]
+
+
+@pytest.fixture
+def coll(monkeypatch):
+    coll = _Submissions()
+    monkeypatch.setattr(main, "submissions_collection", coll)
+    monkeypatch.setattr(main, "leaderboard_collection", None)
+    monkeypatch.setattr(main, "submission_cache", TTLCache(maxsize=100, ttl=3600))
+    return coll
+
+
+def _stored(coll, name):
+    return str(coll.insert_one({"name": name, "email": f"{name.lower()}@x.id", "score": 7, "outcomes": []}).inserted_id)
+
+
+def test_single_lookup_is_read_through(coll):
+    client = TestClient(main.app)
+    sid = _stored(coll, "Ani")
+    for _ in range(3):
+        r = client.get(f"/quiz/submission/{sid}")
+        assert r.status_code == 200
+        assert r.json()["name"] == "Ani" and "outcomes" not in r.json()
+    assert len(coll.reads) == 1
+    assert client.get(f"/quiz/submission/{ObjectId()}").status_code == 404
+    assert client.get("/quiz/submission/bukan-id").status_code == 400
+
+
+def test_submit_fills_the_cache(coll):
+    client = TestClient(main.app)
+    r = client.post("/quiz/submit", json={"name": "Budi", "email": "budi@x.id", "answer": 5, "totalQuestions": 10})
+    sid = r.json()["inserted_id"]
+    assert client.get(f"/quiz/submission/{sid}").json()["name"] == "Budi"
+    assert coll.reads == []
+
+
+def test_batch_keeps_request_order_and_reports_missing_ids(coll):
+    client = TestClient(main.app)
+    a, b, c = (_stored(coll, n) for n in ("Ani", "Budi", "Citra"))
+    client.get(f"/quiz/submission/{b}")  # cached
+    coll.reads.clear()
+    unknown = str(ObjectId())
+    r = client.post("/quiz/submissions/batch", json={"ids": [c, "bukan-id", b, a, unknown, c]})
+    assert r.status_code == 200
+    assert [s["name"] for s in r.json()["submissions"]] == ["Citra", "Budi", "Ani"]
+    assert r.json()["missing"] == ["bukan-id", unknown]
+    # one query for the ids that were not cached
+    assert coll.reads == [[ObjectId(c), ObjectId(a), ObjectId(unknown)]]
+
+    coll.reads.clear()
+    assert [s["name"] for s in client.post("/quiz/submissions/batch", json={"ids": [a, c]}).json()["submissions"]] == ["Ani", "Citra"]
+    assert coll.reads == []
+
+
+def test_batch_size_is_capped(coll):
+    ids = [str(ObjectId()) for _ in range(main.SUBMISSION_BATCH_MAX + 1)]
+    assert TestClient(main.app).post("/quiz/submissions/batch", json={"ids": ids}).status_code == 400
+
+
+def test_batch_without_database(coll, monkeypatch):
+    monkeypatch.setattr(main, "submissions_collection", None)
+    client = TestClient(main.app)
+    assert client.post("/quiz/submissions/batch", json={"ids": [str(ObjectId())]}).status_code == 503
+    assert client.post("/quiz/submissions/batch", json={"ids": ["bukan-id"]}).json() == {"submissions": [], "missing": ["bukan-id"]}
@@ -0,0 +1,55 @@
+import random
+
+import question_bank
+from text_similarity import cluster_near_duplicates, estimate_jaccard, minhash_signature, normalize_text
+
+
+def test_identical_and_reworded_questions_share_a_cluster():
+    texts = [
+        "Siapa yang membacakan teks Proklamasi pada 17 Agustus 1945?",
+        "Siapakah yang membacakan teks proklamasi pada 17 Agustus 1945 ?",      # same canonical text
+        "Siapa yang membacakan teks Proklamasi pada tanggal 17 Agustus 1945?",  # near duplicate
+        "Kapan Sumpah Pemuda diikrarkan?",
+    ]
+    assert cluster_near_duplicates(texts, threshold=0.6) == [0, 0, 0, 1]
+
+
+def test_numbers_numerals_and_negations_keep_questions_apart():
+    texts = [
+        "Kapan Agresi Militer Belanda I dimulai oleh pasukan Belanda?",
+        "Kapan Agresi Militer Belanda II dimulai oleh pasukan Belanda?",
+        "Perjanjian apa yang ditandatangani pada tahun 1946 di Linggarjati?",
+        "Perjanjian apa yang ditandatangani pada tahun 1948 di Linggarjati?",
+        "Tokoh mana yang hadir dalam sidang pertama BPUPKI tahun 1945?",
+        "Tokoh mana yang tidak hadir dalam sidang pertama BPUPKI tahun 1945?",
+    ]
+    assert cluster_near_duplicates(texts, threshold=0.5) == [0, 1, 2, 3, 4, 5]
+
+
+def test_clusters_are_transitive():
+    # a~b and b~c are close enough, a and c are not: union-find still puts all three together
+    a = "pahlawan nasional dari aceh yang memimpin perang melawan belanda bernama cut nyak dien"
+    b = "pahlawan nasional dari aceh yang memimpin perang melawan belanda adalah cut nyak dien"
+    c = "pahlawan wanita dari aceh yang memimpin perang melawan belanda adalah cut nyak dien"
+    sig = {t: minhash_signature(normalize_text(t)) for t in (a, b, c)}
+    threshold = min(estimate_jaccard(sig[a], sig[b]), estimate_jaccard(sig[b], sig[c]))
+    assert estimate_jaccard(sig[a], sig[c]) < threshold
+    assert cluster_near_duplicates([a, c, b], threshold) == [0, 0, 0]
+
+
+def _level(items):
+    return question_bank._view([(text, ["A", "B", "C", "D"], answer) for text, answer in items])
+
+
+def test_sampler_takes_one_question_per_cluster(monkeypatch):
+    items = [("Siapa yang membacakan teks Proklamasi pada 17 Agustus 1945?", n % 4) for n in range(8)]
+    items += [("Kapan Sumpah Pemuda diikrarkan?", 1), ("Di mana Proklamasi dibacakan?", 2)]
+    bank = question_bank.QuestionBank("/nonexistent", fallback=[], compiled_path=None)
+    monkeypatch.setattr(bank, "_levels", {"mudah": _level(items)})
+    random.seed(7)
+    for _ in range(20):
+        texts = [p.question.text for p in bank.sample("mudah", 10)]
+        assert len(texts) == 3 == len(set(texts))
+    # exclude skips the whole cluster of an excluded text
+    texts = {p.question.text for p in bank.sample("mudah", 10, exclude={items[0][0]})}
+    assert texts == {"Kapan Sumpah Pemuda diikrarkan?", "Di mana Proklamasi dibacakan?"}
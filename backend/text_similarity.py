@@ -0,0 +1,193 @@
+"""Text normalization and MinHash/LSH helpers for near-duplicate detection of short Indonesian texts."""
+import hashlib
+import re
+import struct
+import unicodedata
+
+# Filler and function words that do not change what a short history question is asking.
+# "indonesia" is included on purpose: every question in this app is about Indonesian history,
+# so "siapa proklamator?" and "siapa proklamator indonesia" should map to the same key.
+# Negations ("tidak", "bukan", "belum", "tanpa") are never stopwords: they flip what a question asks.
+STOPWORDS = frozenset("""
+a ada adalah agar akan anda atau bahwa beri berikan bisa coba dalam dan dari deh di dong gak harus
+hai halo ialah ini itu jelaskan juga kah kak kakak kamu ke kepada lah mau mohon nah nya oleh pada pak
+para saja saya sebutkan sih tahu tentang terhadap tolong tuh untuk ya yang
+indonesia
+""".split())
+
+_NON_WORD = re.compile(r"[^\w\s]+", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+# question particles on question words only: "siapakah" -> "siapa", "bisakah" -> "bisa" (but "sekolah" stays)
+_PARTICLE = re.compile(r"^(siapa|apa|bagaimana|kapan|mengapa|kenapa|dimana|mana|berapa|bisa|tahu|benar|bukan|ada)(kah|lah)$")
+# numbers, roman numerals ("agresi militer belanda i" vs "ii") and negations tell otherwise similar texts apart
+_MARKERS = re.compile(r"\b(?:\d+|[ivxl]+|tidak|bukan|belum|tanpa|jangan)\b")
+
+# MinHash parameters: 64 permutations split into 16 LSH bands of 4 rows.
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def _permutations(n):
+    # deterministic (a, b) pairs so signatures are stable across processes and restarts
+    perms = []
+    for i in range(n):
+        d = hashlib.blake2b(f"minhash-perm-{i}".encode(), digest_size=16).digest()
+        a, b = struct.unpack("<QQ", d)
+        perms.append(((a % (_MERSENNE_PRIME - 1)) + 1, b % _MERSENNE_PRIME))
+    return perms
+
+
+_PERMS = _permutations(NUM_PERM)
+
+
+def normalize_text(text):
+    """Lowercase, strip accents, punctuation and question particles, drop stopwords, collapse whitespace."""
+    if not text:
+        return ""
+    s = unicodedata.normalize("NFKD", str(text))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).lower()
+    s = _NON_WORD.sub(" ", s).replace("_", " ")
+    tokens = [_PARTICLE.sub(r"\1", t) for t in _SPACES.split(s) if t]
+    tokens = [t for t in tokens if t not in STOPWORDS]
+    return " ".join(tokens)
+
+
+def markers(normalized):
+    """Numbers, roman numerals and negations of a normalized text, in order.
+
+    Near-duplicates must agree on them exactly: "tahun 1945" / "tahun 1949", "agresi militer i" / "ii" and
+    "siapa tidak hadir" / "siapa hadir" look alike to MinHash but ask different questions.
+    """
+    return _MARKERS.findall(normalized)
+
+
+def shingles(normalized, size=SHINGLE_SIZE):
+    """Character shingles of a normalized string (the whole string when it is shorter than `size`)."""
+    if not normalized:
+        return set()
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def minhash_signature(normalized):
+    """MinHash signature (tuple of NUM_PERM ints) of the shingle set of a normalized string."""
+    hashes = [
+        struct.unpack("<I", hashlib.blake2b(sh.encode("utf-8"), digest_size=4).digest())[0]
+        for sh in shingles(normalized)
+    ]
+    if not hashes:
+        return tuple([_MAX_HASH] * NUM_PERM)
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMS
+    )
+
+
+def estimate_jaccard(sig_a, sig_b):
+    if not sig_a or not sig_b:
+        return 0.0
+    same = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+    return same / float(len(sig_a))
+
+
+def lsh_band_keys(signature):
+    """Band keys of a signature; two texts become candidates when they share at least one band."""
+    return [
+        (band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])
+        for band in range(LSH_BANDS)
+    ]
+
+
+class LSHIndex:
+    """Banded MinHash index mapping band keys to sets of item keys. Not thread-safe on its own."""
+
+    def __init__(self):
+        self._bands = {}
+        self._signatures = {}
+
+    def add(self, key, signature):
+        self._signatures[key] = signature
+        for bk in lsh_band_keys(signature):
+            self._bands.setdefault(bk, set()).add(key)
+
+    def remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for bk in lsh_band_keys(signature):
+            members = self._bands.get(bk)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del self._bands[bk]
+
+    def query(self, signature, threshold):
+        """Return (key, similarity) of the most similar indexed item at or above `threshold`, else None."""
+        candidates = set()
+        for bk in lsh_band_keys(signature):
+            members = self._bands.get(bk)
+            if members:
+                candidates.update(members)
+        best = None
+        for key in candidates:
+            sim = estimate_jaccard(signature, self._signatures.get(key))
+            if sim >= threshold and (best is None or sim > best[1]):
+                best = (key, sim)
+        return best
+
+    def clear(self):
+        self._bands.clear()
+        self._signatures.clear()
+
+    def __len__(self):
+        return len(self._signatures)
+
+
+def cluster_near_duplicates(texts, threshold=0.8):
+    """Cluster id (0..k-1, in order of first appearance) for each text; near-duplicates share an id.
+
+    Texts are in one cluster when their normalized forms are equal, or when LSH makes them candidates, their
+    estimated Jaccard similarity is >= `threshold` and they have the same markers() (so "tahun 1945" and
+    "tahun 1949" stay apart). Clusters are transitive (union-find).
+    """
+    keys = [normalize_text(t) for t in texts]
+    parent = list(range(len(keys)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    first_with_key = {}
+    signatures = {}
+    buckets = {}
+    for i, key in enumerate(keys):
+        if key in first_with_key:
+            union(i, first_with_key[key])
+            continue
+        first_with_key[key] = i
+        signatures[i] = sig = minhash_signature(key)
+        own = markers(key)
+        candidates = set()
+        for bk in lsh_band_keys(sig):
+            members = buckets.setdefault(bk, [])
+            candidates.update(members)
+            members.append(i)
+        for j in candidates:
+            if estimate_jaccard(sig, signatures[j]) >= threshold and markers(keys[j]) == own:
+                union(i, j)
+
+    ids = {}
+    return [ids.setdefault(find(i), len(ids)) for i in range(len(keys))]
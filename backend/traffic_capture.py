@@ -0,0 +1,202 @@
+"""Capture sanitized request/response pairs as compact NDJSON for deterministic replay (see bench/replay.py).
+
+Enabled by setting CAPTURE_FILE. One line per request:
+
+    {"t": 1755400012.503, "m": "POST", "p": "/quiz/submit", "q": "", "b": {...}, "s": 200, "d": 41.7, "shape": {...}}
+
+t = request start (unix seconds; replay uses offsets from the first record), b = sanitized JSON request body (null when absent/too large),
+s = status, d = server-side duration in ms, shape = structure of the JSON response (types, not values).
+
+Emails are replaced with keyed pseudonyms (pseudonyms.py; the same address always maps to the same placeholder, so
+per-user behaviour such as leaderboard updates replays faithfully), names are pseudonymised and secrets
+(api keys, Mailry sender ids, attachments) are dropped. Headers are never recorded.
+Writing happens on a background thread; when the queue is full, records are dropped rather than slowing requests.
+"""
+import functools
+import gzip
+import json
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode
+
+from pseudonyms import pseudonym
+
+CAPTURE_FILE = os.getenv("CAPTURE_FILE")
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "1"))
+CAPTURE_PATH_PREFIXES = tuple(p for p in os.getenv("CAPTURE_PATH_PREFIXES", "/quiz,/chat").split(",") if p)
+CAPTURE_MAX_BODY_BYTES = int(os.getenv("CAPTURE_MAX_BODY_BYTES", str(64 * 1024)))
+# response bodies are only buffered up to this size to compute their shape
+_MAX_SHAPE_BYTES = 512 * 1024
+
+_EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_DROP_KEYS = frozenset(("api_key", "apikey", "authorization", "token", "emailid", "email_id", "attachments", "cc"))
+_NAME_KEYS = frozenset(("name", "nama"))
+
+
+def pseudonymize_email(email):
+    return f"user-{pseudonym(email)}@example.invalid"
+
+
+def sanitize(value, key=None):
+    """Recursively redact emails, names and secrets from a decoded JSON value."""
+    if isinstance(value, dict):
+        return {k: sanitize(v, k) for k, v in value.items() if str(k).lower() not in _DROP_KEYS}
+    if isinstance(value, list):
+        return [sanitize(v) for v in value]
+    if isinstance(value, str):
+        if key is not None and str(key).lower() in _NAME_KEYS and value:
+            return f"Peserta-{pseudonym(value, 6)}"
+        return _EMAIL.sub(lambda m: pseudonymize_email(m.group(0)), value)
+    return value
+
+
+def sanitize_query(query_string):
+    pairs = [(k, v) for k, v in parse_qsl(query_string, keep_blank_values=True) if k.lower() not in _DROP_KEYS]
+    return urlencode([(k, sanitize(v, k)) for k, v in pairs])
+
+
+def response_shape(value):
+    """Structure of a JSON value: dict keys with value shapes, first list element, scalar type names."""
+    if isinstance(value, dict):
+        return {k: response_shape(v) for k, v in sorted(value.items())}
+    if isinstance(value, list):
+        return [response_shape(value[0])] if value else []
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "bool"
+    if isinstance(value, (int, float)):
+        return "number"
+    return "str"
+
+
+def _decode_body(body, content_encoding):
+    """Undo gzip / brotli (pre-compressed responses reach the capture already encoded)."""
+    if content_encoding == b"gzip":
+        return gzip.decompress(body)
+    if content_encoding == b"br":
+        import brotli
+        return brotli.decompress(body)
+    return body
+
+
+class CaptureWriter:
+    """Appends records (dicts, or callables returning one) to an NDJSON file from a daemon thread."""
+
+    def __init__(self, path, max_queue=10000):
+        self.path = path
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="traffic-capture", daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                record = self._queue.get()
+                try:
+                    if callable(record):
+                        record = record()
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+                    if self._queue.empty():
+                        f.flush()
+                except Exception as e:
+                    logging.error("traffic_capture: write failed: %s", e)
+
+
+class TrafficCaptureMiddleware:
+    """Pure ASGI middleware recording sanitized traffic for matching paths."""
+
+    def __init__(self, app, writer, sample_rate=CAPTURE_SAMPLE_RATE, path_prefixes=CAPTURE_PATH_PREFIXES):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.path_prefixes = path_prefixes
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path") or ""
+        if (scope["type"] != "http" or not path.startswith(self.path_prefixes)
+                or (self.sample_rate < 1 and random.random() >= self.sample_rate)):
+            return await self.app(scope, receive, send)
+
+        started_at = time.time()
+        started = time.monotonic()
+        req_chunks = []
+        req_size = [0]
+        resp_chunks = []
+        resp_size = [0]
+        status = [500]
+        content_type = [b""]
+        content_encoding = [None]
+
+        async def _receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body") or b""
+                req_size[0] += len(body)
+                if req_size[0] <= CAPTURE_MAX_BODY_BYTES:
+                    req_chunks.append(body)
+            return message
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                for name, value in message.get("headers") or []:
+                    if name == b"content-type":
+                        content_type[0] = value
+                    elif name == b"content-encoding":
+                        content_encoding[0] = value
+            elif message["type"] == "http.response.body":
+                body = message.get("body") or b""
+                resp_size[0] += len(body)
+                if resp_size[0] <= _MAX_SHAPE_BYTES:
+                    resp_chunks.append(body)
+            await send(message)
+
+        try:
+            await self.app(scope, _receive, _send)
+        finally:
+            duration_ms = (time.monotonic() - started) * 1000.0
+            # decoding, sanitizing and shaping happen on the writer thread, not on the event loop
+            self.writer.put(functools.partial(self._record, scope, started_at, status[0], duration_ms, req_chunks,
+                                              req_size[0], resp_chunks, resp_size[0], content_type[0], content_encoding[0]))
+
+    def _record(self, scope, started_at, status, duration_ms, req_chunks, req_size, resp_chunks, resp_size, content_type,
+                content_encoding=None):
+        body = None
+        if req_chunks and req_size <= CAPTURE_MAX_BODY_BYTES:
+            try:
+                body = sanitize(json.loads(b"".join(req_chunks)))
+            except Exception:
+                body = None
+        shape = None
+        if resp_size <= _MAX_SHAPE_BYTES and content_type.startswith(b"application/json"):
+            try:
+                shape = response_shape(json.loads(_decode_body(b"".join(resp_chunks), content_encoding)))
+            except Exception:
+                shape = None
+        elif content_type.startswith(b"application/x-ndjson"):
+            shape = "ndjson"
+        return {
+            "t": round(started_at, 4),
+            "m": scope.get("method"),
+            "p": scope.get("path"),
+            "q": sanitize_query((scope.get("query_string") or b"").decode("latin-1")),
+            "b": body,
+            "s": status,
+            "d": round(duration_ms, 2),
+            "shape": shape,
+        }
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small thread-safe LRU cache with per-entry expiry.
+
+    - `maxsize` bounds the number of entries; the least recently used entry is evicted first.
+    - `ttl` is the lifetime in seconds of an entry (None = never expires).
+    - `touch_on_get=True` refreshes the expiry on every read (idle expiry instead of absolute expiry).
+    - `on_evict(key, value)` is called (outside the lock) for entries dropped by LRU, expiry or `pop`/`clear`
+      (not when a key is overwritten by `set`).
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, touch_on_get=False, on_evict=None):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self.touch_on_get = touch_on_get
+        self.on_evict = on_evict
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def _expiry(self):
+        return (time.monotonic() + self.ttl) if self.ttl else None
+
+    def _notify(self, dropped):
+        if not self.on_evict:
+            return
+        for k, v in dropped:
+            try:
+                self.on_evict(k, v)
+            except Exception:
+                pass
+
+    def get(self, key, default=None):
+        dropped = []
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                dropped.append((key, value))
+                value = default
+            else:
+                self._data.move_to_end(key)
+                if self.touch_on_get:
+                    self._data[key] = (self._expiry(), value)
+        self._notify(dropped)
+        return value
+
+    def set(self, key, value):
+        dropped = []
+        with self._lock:
+            # replacing an existing key is not an eviction, so it does not trigger on_evict
+            self._data.pop(key, None)
+            self._data[key] = (self._expiry(), value)
+            while len(self._data) > self.maxsize:
+                k, (_, v) = self._data.popitem(last=False)
+                dropped.append((k, v))
+        self._notify(dropped)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None:
+            return default
+        self._notify([(key, item[1])])
+        return item[1]
+
+    def pop_oldest(self):
+        """Remove and return the least recently used (key, value), or None when empty."""
+        with self._lock:
+            if not self._data:
+                return None
+            k, (_, v) = self._data.popitem(last=False)
+        self._notify([(k, v)])
+        return k, v
+
+    def clear(self):
+        with self._lock:
+            dropped = [(k, v) for k, (_, v) in self._data.items()]
+            self._data.clear()
+        self._notify(dropped)
+        return len(dropped)
+
+    def purge_expired(self):
+        """Drop every expired entry; returns the number of entries removed."""
+        now = time.monotonic()
+        with self._lock:
+            dropped = [(k, v) for k, (exp, v) in self._data.items() if exp is not None and exp <= now]
+            for k, _ in dropped:
+                del self._data[k]
+        self._notify(dropped)
+        return len(dropped)
+
+    def items(self):
+        """Snapshot of live (key, value) pairs, most recently used last."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (exp, v) in self._data.items() if exp is None or exp > now]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
@@ -12,6 +12,11 @@ export default function ChatPage() {
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
   const [toast, setToast] = useState<string | null>(null);
+  // server-side conversation context; the backend returns the id to send with the next question
+  const sessionId = useRef<string | null>(null);
+  useEffect(() => {
+    try { sessionId.current = sessionStorage.getItem('quiz_chat_session'); } catch (e) {}
+  }, []);
   const listRef = useRef<HTMLDivElement|null>(null);
 
   useEffect(() => {
@@ -35,7 +40,7 @@ export default function ChatPage() {
     setLoading(true);
     try {
       const base = process.env.NEXT_PUBLIC_API_BASE ? process.env.NEXT_PUBLIC_API_BASE.replace(/\/$/, '') : 'http://localhost:8001';
-      const res = await fetch(`${base}/chat`, { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({ question: userMsg.text }) });
+      const res = await fetch(`${base}/chat`, { method: 'POST', headers: {'Content-Type':'application/json'}, body: JSON.stringify({ question: userMsg.text, session_id: sessionId.current }) });
       if (!res.ok) {
         setToast('Server mengembalikan error. Coba lagi nanti.');
         setMessages(prev => [...prev, { role: 'assistant', text: friendlyFallback }]);
@@ -44,6 +49,10 @@ export default function ChatPage() {
       let j: any = null;
       try { j = await res.json(); } catch (e) { /* ignore */ }
       const answer = j && j.answer ? j.answer : friendlyFallback;
+      if (j && j.session_id) {
+        sessionId.current = j.session_id;
+        try { sessionStorage.setItem('quiz_chat_session', j.session_id); } catch (e) {}
+      }
       setMessages(prev => [...prev, { role: 'assistant', text: answer }]);
     } catch (e) {
       setToast('Gagal menghubungi server. Pastikan backend berjalan.');
@@ -55,7 +64,8 @@ export default function ChatPage() {
 
   const clear = () => {
     setMessages([]);
-    try { sessionStorage.removeItem('quiz_chat'); } catch (e) {}
+    sessionId.current = null;
+    try { sessionStorage.removeItem('quiz_chat'); sessionStorage.removeItem('quiz_chat_session'); } catch (e) {}
   }
 
   return (
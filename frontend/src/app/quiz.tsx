@@ -1,9 +1,10 @@
 "use client";
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { useSearchParams } from "next/navigation";
 import { Flag, Clock, Star, RotateCcw, CheckCircle, XCircle, Book } from "lucide-react";
 
 interface Question {
+	id?: string; // present on questions from the bank
 	question: string;
 	choices: string[];
 	answer: number;
@@ -22,6 +23,8 @@ export default function QuizPage() {
 	const searchParams = useSearchParams();
 	const [questions, setQuestions] = useState<Question[] | null>(null);
 	const [loading, setLoading] = useState(false);
+	// true while questions are still arriving from /quiz/questions/stream
+	const [streaming, setStreaming] = useState(false);
 	const [timeMinutes, setTimeMinutes] = useState<number | null>(null);
 	const [timeLeft, setTimeLeft] = useState<number | null>(null); // seconds
 	const [answers, setAnswers] = useState<number[]>([]);
@@ -33,6 +36,9 @@ export default function QuizPage() {
 			const [explanations, setExplanations] = useState<Record<number,string>>({});
 			const [loadingExps, setLoadingExps] = useState<Record<number, boolean>>({});
 			const [fetchingAllExps, setFetchingAllExps] = useState(false);
+	// milliseconds spent on each question, for the per-question outcomes sent with the result
+	const questionTimes = useRef<number[]>([]);
+	const stepStarted = useRef<{ step: number; at: number } | null>(null);
 
 	const name = (searchParams?.get("name") as string) || "";
 	const email = (searchParams?.get("email") as string) || "";
@@ -50,12 +56,83 @@ export default function QuizPage() {
 		return a;
 	}
 
+	// shuffle choices so the correct option isn't always first
+	function shuffleChoices(q: Question): Question {
+		if (!q.choices || q.choices.length <= 1) return q;
+		// keep original correct value
+		const correctValue = q.choices[q.answer];
+		const shuffled = shuffleArray(q.choices);
+		const newIndex = shuffled.findIndex(c => c === correctValue);
+		return { ...q, choices: shuffled, answer: newIndex };
+	}
+
+	function startTimer(minutes: unknown) {
+		if (!minutes) return;
+		setTimeMinutes(Number(minutes));
+		setTimeLeft(Number(minutes) * 60);
+	}
+
+	// /quiz/questions/stream sends NDJSON: {"type":"meta"}, one {"type":"question"} per soal, then {"type":"done"}.
+	// The quiz opens on the first question while the rest arrive; returns false if nothing usable came.
+	async function streamQuestions(base: string): Promise<boolean> {
+		const res = await fetch(`${base}/quiz/questions/stream`, {
+			method: "POST",
+			headers: { "Content-Type": "application/json" },
+			body: JSON.stringify({ name, email, difficulty })
+		});
+		if (!res.ok || !res.body) return false;
+		const reader = res.body.getReader();
+		const decoder = new TextDecoder();
+		let buffered = "";
+		let received = 0;
+		let done = false;
+		const handleLine = (line: string) => {
+			if (!line.trim()) return;
+			const msg = JSON.parse(line);
+			if (msg.type === "meta") {
+				startTimer(msg.time_minutes);
+			} else if (msg.type === "question") {
+				const q = shuffleChoices({ id: msg.id, question: msg.question, choices: msg.choices, answer: msg.answer });
+				received += 1;
+				setQuestions(prev => [...(prev || []), q]);
+				setAnswers(prev => [...prev, -1]);
+				setLoading(false);
+			} else if (msg.type === "done") {
+				done = true;
+			}
+		};
+		while (true) {
+			const { value, done: eof } = await reader.read();
+			if (eof) break;
+			buffered += decoder.decode(value, { stream: true });
+			const lines = buffered.split("\n");
+			buffered = lines.pop() || "";
+			lines.forEach(handleLine);
+		}
+		handleLine(buffered);
+		return received > 0 && done;
+	}
+
 	async function fetchQuestions() {
 		setLoading(true);
 		// Use env base or default to localhost:8001
 		const envBase = (process.env.NEXT_PUBLIC_API_BASE || "").trim();
 		const base = envBase ? envBase.replace(/\/$/, "") : "http://localhost:8001";
-		// Ganti ke endpoint backend FastAPI
+		setStreaming(true);
+		let streamed = false;
+		try {
+			streamed = await streamQuestions(base);
+		} catch (e) {
+			streamed = false;
+		}
+		setStreaming(false);
+		if (streamed) return;
+
+		// stream unavailable or cut off: start over with the whole set in one response
+		setQuestions(null);
+		setAnswers([]);
+		setStep(0);
+		setLoading(true);
 		const res = await fetch(`${base}/quiz/questions`, {
 			method: "POST",
 			headers: { "Content-Type": "application/json" },
@@ -63,22 +140,10 @@ export default function QuizPage() {
 		});
 		const data = await res.json();
 		// backend may return { total_questions, time_minutes, questions }
-		// normalize questions and shuffle choices per question so correct option isn't always first
-		const qsRaw: Question[] = data.questions || [];
-		const qs = qsRaw.map((q: Question) => {
-			if (!q.choices || q.choices.length <= 1) return q;
-			// keep original correct value
-			const correctValue = q.choices[q.answer];
-			const shuffled = shuffleArray(q.choices);
-			const newIndex = shuffled.findIndex(c => c === correctValue);
-			return { ...q, choices: shuffled, answer: newIndex };
-		});
+		const qs = ((data.questions || []) as Question[]).map(shuffleChoices);
 		setQuestions(qs);
 		setAnswers(Array(qs.length).fill(-1));
-		if (data.time_minutes) {
-			setTimeMinutes(Number(data.time_minutes));
-			setTimeLeft(Number(data.time_minutes) * 60);
-		}
+		startTimer(data.time_minutes);
 		setLoading(false);
 	}
 
@@ -87,6 +152,20 @@ export default function QuizPage() {
 		// eslint-disable-next-line
 	}, []);
 
+	// add the time spent on the previous question whenever the visible question changes
+	function closeStepTimer(nextStep: number | null) {
+		const now = Date.now();
+		const prev = stepStarted.current;
+		if (prev) questionTimes.current[prev.step] = (questionTimes.current[prev.step] || 0) + (now - prev.at);
+		stepStarted.current = nextStep === null ? null : { step: nextStep, at: now };
+	}
+
+	useEffect(() => {
+		if (!questions) return;
+		closeStepTimer(step);
+	// eslint-disable-next-line react-hooks/exhaustive-deps
+	}, [step, questions]);
+
 	// Timer effect
 	useEffect(() => {
 		if (timeLeft === null) return;
@@ -120,6 +199,15 @@ export default function QuizPage() {
 	const submitResult = async (scoreNum: number, totalNum: number, percentNum: number, timeSpentSec: number) => {
 		const envBase = (process.env.NEXT_PUBLIC_API_BASE || "").trim();
 		const base = envBase ? envBase.replace(/\/$/, "") : "http://localhost:8001";
+		closeStepTimer(null);
+		const outcomes = (questions || []).map((q, i) => ({
+			id: q.id,
+			question: q.id ? undefined : q.question,
+			// the choice text: choices were shuffled here, so the index is meaningless to the backend
+			choice: answers[i] >= 0 ? q.choices[answers[i]] : null,
+			correct: Number(answers[i]) === Number(q.answer),
+			ms: Math.round(questionTimes.current[i] || 0),
+		}));
 		const payload = {
 			name,
 			email,
@@ -130,6 +218,7 @@ export default function QuizPage() {
 			percentage: percentNum,
 			timeSpent: timeSpentSec,
 			difficulty: difficulty,
+			outcomes,
 		};
 		const res = await fetch(`${base}/quiz/submit`, {
 			method: "POST",
@@ -222,7 +311,7 @@ export default function QuizPage() {
 		// keep showing quiz; after submit `submitted` toggles to true and we show explanations
 
 	const q = questions[step];
-	const canSubmit = answers[step] !== -1;
+	const canSubmit = answers[step] !== -1 && !streaming;
 	return (
 		<main className="min-h-screen p-4 sm:p-6 md:p-10">
 			<div className="max-w-3xl mx-auto space-y-8">